@@ -0,0 +1,54 @@
+"""
+BM25 micro-benchmark on a synthetic Zipfian corpus: index build time, single-query
+`top_k` latency and per-query cost of `top_k_batch`.
+
+Usage:
+    python -m benchmarks.bench_bm25 --docs 100000 --words 200 --k 20
+"""
+import argparse
+import time
+from pathlib import Path
+
+from benchmarks.common import latency_summary, synthetic_documents, synthetic_queries, write_results
+from src.core.bm25 import BM25Index, tokenize
+
+
+def run(n_docs: int, words: int, k: int, n_queries: int = 200, batch_size: int = 32, seed: int = 0):
+    docs = synthetic_documents(n_docs, words, seed=seed)
+    queries = [tokenize(q) for q in synthetic_queries(n_queries, seed=seed + 1)]
+
+    start = time.perf_counter()
+    bm25 = BM25Index.from_corpus(tokenize(doc["content"]) for doc in docs)
+    build_s = time.perf_counter() - start
+
+    single = []
+    for query in queries:
+        start = time.perf_counter()
+        bm25.top_k(query, k)
+        single.append(time.perf_counter() - start)
+
+    batched = []
+    for i in range(0, len(queries), batch_size):
+        batch = queries[i:i + batch_size]
+        start = time.perf_counter()
+        bm25.top_k_batch(batch, k)
+        batched.extend([(time.perf_counter() - start) / len(batch)] * len(batch))
+
+    result = {"docs": n_docs, "build_s": round(build_s, 3), "top_k": latency_summary(single),
+              f"top_k_batch_{batch_size}_per_query": latency_summary(batched)}
+    print(f"docs={n_docs} build={build_s:.2f}s top_k p50={result['top_k']['p50_ms']:.3f} ms "
+          f"p99={result['top_k']['p99_ms']:.3f} ms batched p50/query="
+          f"{result[f'top_k_batch_{batch_size}_per_query']['p50_ms']:.3f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BM25 build/query benchmark")
+    parser.add_argument("--docs", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this path")
+    args = parser.parse_args()
+    result = run(args.docs, args.words, args.k, args.queries)
+    write_results(args.output, "bm25", vars(args), result)
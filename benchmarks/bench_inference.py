@@ -0,0 +1,127 @@
+"""
+Parity and speed of the ONNX int8 inference backend against the PyTorch one, for the
+embedding model and the Cross-Encoder (INFERENCE_BACKEND in src/config.py).
+
+Parity: cosine similarity between PyTorch and int8 embeddings of the same texts, and
+agreement of Cross-Encoder rankings (top-1 and Spearman correlation per query).
+Speed: single-query latency (the /search path) and batch throughput (ingestion).
+Texts come from the ingested corpus (data/indices) when present, else from the synthetic corpus.
+Downloads the models on first run; needs `pip install 'sentence-transformers[onnx]'`.
+
+Usage:
+    python -m benchmarks.bench_inference --texts 512 --threads 4 --output onnx.json
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.common import latency_summary, synthetic_documents, write_results
+from src.config import (
+    CROSS_ENCODER_MODEL_NAME,
+    EMBEDDING_MODEL_NAME,
+    METADATA_FILE,
+    METADATA_STORE_FILE,
+    ONNX_INTRA_OP_THREADS,
+    ONNX_QUANTIZATION,
+    RERANK_CANDIDATES,
+)
+from src.core.inference import load_cross_encoder, load_embedding_model
+from src.core.metadata_store import MetadataStore, iter_metadata
+
+
+def sample_texts(n: int) -> List[str]:
+    texts = []
+    if METADATA_STORE_FILE.exists():
+        texts = [doc["content"] for doc in MetadataStore(METADATA_STORE_FILE) if doc]
+    elif METADATA_FILE.exists():
+        texts = [doc["content"] for doc in iter_metadata(METADATA_FILE) if doc]
+    if texts:
+        return (texts * (n // len(texts) + 1))[:n]
+    return [doc["content"] for doc in synthetic_documents(n, words=120)]
+
+
+def time_encode(model, texts: List[str], batch_size: int) -> Dict:
+    single = []
+    for text in texts[:100]:
+        start = time.perf_counter()
+        model.encode([text], convert_to_numpy=True, show_progress_bar=False)
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+    return {"single_query": latency_summary(single), "batch_texts_per_s": round(len(texts) / elapsed, 1)}
+
+
+def time_rerank(model, pairs_per_query: List[List[List[str]]]) -> Dict:
+    timings = []
+    for pairs in pairs_per_query:
+        start = time.perf_counter()
+        model.predict(pairs, show_progress_bar=False)
+        timings.append(time.perf_counter() - start)
+    return {f"predict_{RERANK_CANDIDATES}_pairs": latency_summary(timings)}
+
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    rank_a, rank_b = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def run(n_texts: int, quantization: str, threads, batch_size: int = 64) -> Dict:
+    texts = sample_texts(n_texts)
+    queries = [" ".join(text.split()[:6]) for text in texts[:50]]
+    pairs_per_query = [[[q, texts[(i * 7 + j) % len(texts)]] for j in range(RERANK_CANDIDATES)]
+                       for i, q in enumerate(queries)]
+
+    models = {
+        "torch": (load_embedding_model(EMBEDDING_MODEL_NAME, "torch"),
+                  load_cross_encoder(CROSS_ENCODER_MODEL_NAME, "torch")),
+        "onnx_int8": (load_embedding_model(EMBEDDING_MODEL_NAME, "onnx_int8", quantization, threads),
+                      load_cross_encoder(CROSS_ENCODER_MODEL_NAME, "onnx_int8", quantization, threads)),
+    }
+
+    results = {"speed": {}}
+    for backend, (embedder, cross_encoder) in models.items():
+        results["speed"][backend] = {"embedder": time_encode(embedder, texts, batch_size),
+                                     "cross_encoder": time_rerank(cross_encoder, pairs_per_query)}
+
+    reference = models["torch"][0].encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    quantized = models["onnx_int8"][0].encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    cosines = np.sum(reference * quantized, axis=1)
+    top1, correlations = [], []
+    for pairs in pairs_per_query:
+        a = np.asarray(models["torch"][1].predict(pairs, show_progress_bar=False))
+        b = np.asarray(models["onnx_int8"][1].predict(pairs, show_progress_bar=False))
+        top1.append(int(np.argmax(a) == np.argmax(b)))
+        correlations.append(spearman(a, b))
+    results["parity"] = {
+        "embedding_cosine_mean": round(float(cosines.mean()), 5),
+        "embedding_cosine_min": round(float(cosines.min()), 5),
+        "rerank_top1_agreement": round(float(np.mean(top1)), 4),
+        "rerank_spearman_mean": round(float(np.mean(correlations)), 4),
+    }
+
+    for backend, speed in results["speed"].items():
+        emb, ce = speed["embedder"], speed["cross_encoder"][f"predict_{RERANK_CANDIDATES}_pairs"]
+        print(f"{backend:<10} embed p50={emb['single_query']['p50_ms']:.2f} ms  "
+              f"batch={emb['batch_texts_per_s']:.0f} texts/s  rerank p50={ce['p50_ms']:.2f} ms")
+    parity = results["parity"]
+    print(f"parity     cosine mean={parity['embedding_cosine_mean']:.5f} min={parity['embedding_cosine_min']:.5f}  "
+          f"rerank top-1 agreement={parity['rerank_top1_agreement']:.1%} "
+          f"spearman={parity['rerank_spearman_mean']:.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--quantization", default=ONNX_QUANTIZATION,
+                        choices=["arm64", "avx2", "avx512", "avx512_vnni"])
+    parser.add_argument("--threads", type=int, default=ONNX_INTRA_OP_THREADS)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this path")
+    args = parser.parse_args()
+    write_results(args.output, "inference", vars(args),
+                  run(args.texts, args.quantization, args.threads, args.batch_size))
@@ -0,0 +1,47 @@
+"""
+Ingestion benchmark: streams a synthetic corpus through `run_pipeline` with the stub
+embedder, once against an empty embedding cache (cold) and once more with every chunk
+cached (warm). Set --embed-ms-per-text to simulate model cost.
+
+Usage:
+    python -m benchmarks.bench_ingest --docs 50000 --batch-size 256
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import StubEmbedder, synthetic_documents, write_results
+from src.config import INGEST_BATCH_SIZE
+from src.core.cache_manager import CacheManager
+from src.core.ingest_pipeline import ThroughputReporter, run_pipeline
+
+
+def run(n_docs: int, words: int, batch_size: int, embed_ms_per_text: float = 0.0, seed: int = 0):
+    docs = synthetic_documents(n_docs, words, seed=seed)
+    chunks = [dict(doc, chunk_id=0) for doc in docs]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for phase in ("cold", "warm"):
+            cache = CacheManager(cache_dir=tmp)
+            progress = ThroughputReporter(interval=float("inf"))
+            counts = run_pipeline(iter(chunks), cache, lambda: StubEmbedder(cost_ms_per_text=embed_ms_per_text),
+                                  tmp / "embeddings.npy", tmp / "metadata.bin", batch_size)
+            progress.update(counts["chunks"])
+            row = {"phase": phase, "chunks": counts["chunks"], "embedded": counts["embedded"],
+                   "cached": counts["cached"], "chunks_per_s": round(progress.rate(), 1)}
+            rows.append(row)
+            print(f"{phase:<5} {row['chunks_per_s']:10.1f} chunks/s  embedded={row['embedded']} cached={row['cached']}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion pipeline throughput benchmark")
+    parser.add_argument("--docs", type=int, default=20_000)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--embed-ms-per-text", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this path")
+    args = parser.parse_args()
+    results = run(args.docs, args.words, args.batch_size, args.embed_ms_per_text)
+    write_results(args.output, "ingest", vars(args), results)
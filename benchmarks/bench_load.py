@@ -0,0 +1,159 @@
+"""
+Concurrent load test of the search path with Zipfian query popularity.
+
+By default runs fully offline: a SearchEngine with stub models (simulated model latency)
+over a synthetic corpus, served through SearchBatcher exactly like POST /search.
+With --url, the same load is sent over HTTP to a running API instead.
+Reports QPS, p50/p95/p99 latency and the query cache hit ratio.
+
+Usage:
+    python -m benchmarks.bench_load --docs 20000 --requests 5000 --concurrency 16 --zipf 1.0
+    python -m benchmarks.bench_load --url http://localhost:8000 --requests 2000 --concurrency 8
+"""
+import argparse
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.common import (
+    StubCrossEncoder,
+    StubEmbedder,
+    latency_summary,
+    synthetic_documents,
+    synthetic_queries,
+    write_index_files,
+    write_results,
+    zipf_stream,
+)
+from src.config import SEARCH_BATCH_MAX_SIZE, SEARCH_BATCH_MAX_WAIT_MS
+from src.core.batcher import SearchBatcher
+from src.core.query_cache import SemanticQueryCache
+from src.core.search_engine import SearchEngine
+
+
+def drive(search: Callable[[str], None], stream: List[str], concurrency: int) -> Dict:
+    """
+    Sends every query of `stream` from `concurrency` client threads; returns latencies and QPS.
+    """
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    position = iter(range(len(stream)))
+
+    def client():
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                search(stream[i])
+            except Exception:
+                with lock:
+                    errors += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    wall = time.perf_counter() - start
+    return {"qps": round(len(latencies) / wall, 2), "wall_s": round(wall, 3), "errors": errors,
+            "latency": latency_summary(latencies)}
+
+
+def hit_ratio(before: Dict, after: Dict) -> float:
+    hits = after["hits"] - before["hits"]
+    lookups = hits + after["misses"] - before["misses"]
+    return round(hits / lookups, 4) if lookups else 0.0
+
+
+def run_offline(args, stream: List[str]) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        print(f"Writing a synthetic index of {args.docs} chunks...")
+        write_index_files(tmp / "indices", synthetic_documents(args.docs, args.words), StubEmbedder())
+        cache = SemanticQueryCache(cache_path=tmp / "query_cache.log", legacy_path=None)
+        engine = SearchEngine(
+            embedder=StubEmbedder(cost_ms=args.embed_ms, cost_ms_per_text=args.embed_ms_per_text),
+            cross_encoder=StubCrossEncoder(cost_ms=args.rerank_ms, cost_ms_per_pair=args.rerank_ms_per_pair),
+            query_cache=cache, index_dir=tmp / "indices", compact_min_changes=None)
+        batcher = SearchBatcher(engine, args.batch_size, args.batch_wait_ms) if args.batch_size > 1 else None
+
+        def search(query: str):
+            if batcher is not None:
+                batcher.submit(query, k=args.k).result()
+            else:
+                engine.search(query, k=args.k)
+
+        before = cache.stats()
+        result = drive(search, stream, args.concurrency)
+        result["hit_ratio"] = hit_ratio(before, cache.stats())
+        if batcher is not None:
+            result["mean_batch_size"] = round(batcher.stats()["mean_batch_size"], 2)
+            batcher.close()
+        cache.close()
+        engine.documents.close()
+        return result
+
+
+def run_http(args, stream: List[str]) -> Dict:
+    import requests
+
+    session = requests.Session()
+    api = args.url.rstrip("/") + "/api/v1"
+
+    def search(query: str):
+        response = session.post(f"{api}/search", json={"query": query, "k": args.k}, timeout=60)
+        response.raise_for_status()
+
+    before = session.get(f"{api}/stats", timeout=10).json()["query_cache"]
+    result = drive(search, stream, args.concurrency)
+    result["hit_ratio"] = hit_ratio(before, session.get(f"{api}/stats", timeout=10).json()["query_cache"])
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Load-test a running API instead of an in-process engine")
+    parser.add_argument("--docs", type=int, default=10_000)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--distinct-queries", type=int, default=500)
+    parser.add_argument("--zipf", type=float, default=1.0, help="Popularity skew of the query stream")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=SEARCH_BATCH_MAX_SIZE, help="1 disables batching")
+    parser.add_argument("--batch-wait-ms", type=float, default=SEARCH_BATCH_MAX_WAIT_MS)
+    parser.add_argument("--embed-ms", type=float, default=2.0, help="Simulated embedder time per call")
+    parser.add_argument("--embed-ms-per-text", type=float, default=0.2)
+    parser.add_argument("--rerank-ms", type=float, default=5.0, help="Simulated Cross-Encoder time per call")
+    parser.add_argument("--rerank-ms-per-pair", type=float, default=0.5)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this path")
+    return parser
+
+
+def run(args) -> Dict:
+    stream = zipf_stream(synthetic_queries(args.distinct_queries), args.requests, args.zipf)
+    result = run_http(args, stream) if args.url else run_offline(args, stream)
+    latency = result["latency"]
+    print(f"{result['qps']:.1f} QPS  p50={latency['p50_ms']:.2f} ms  p95={latency['p95_ms']:.2f} ms  "
+          f"p99={latency['p99_ms']:.2f} ms  hit ratio={result['hit_ratio']:.1%}  errors={result['errors']}")
+    return result
+
+
+def main():
+    args = build_parser().parse_args()
+    write_results(args.output, "load", vars(args), run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares serial and process-pool cleaning/chunking in TextLoader.iter_chunks.
+Generates a synthetic raw corpus (HTML tags, irregular whitespace) in a temporary
+directory unless --data-dir points at real files.
+
+Usage:
+    python -m benchmarks.bench_loading --files 20000 --words 400 --workers 1 2 4 8
+    python -m benchmarks.bench_loading --data-dir data/raw
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.config import INGEST_SHARD_SIZE
+from src.core.preprocessing import TextLoader
+
+
+def write_synthetic_corpus(directory: Path, n_files: int, words: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vocab = [f"term{i}" for i in range(5000)]
+    separators = [" ", "  ", "\n", "\t", " <br> ", "\n\n"]
+    for i in range(n_files):
+        n = int(rng.integers(words // 2, words * 2))
+        tokens = rng.choice(vocab, n)
+        seps = rng.choice(separators, n)
+        (directory / f"doc_{i:07d}.txt").write_text("".join(t + s for t, s in zip(tokens, seps)))
+
+
+def run(loader: TextLoader, workers: int, shard_size: int):
+    start = time.perf_counter()
+    chunks = list(loader.iter_chunks(workers=workers, shard_size=shard_size))
+    return time.perf_counter() - start, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", type=Path, default=None)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--shard-size", type=int, default=INGEST_SHARD_SIZE)
+    parser.add_argument("--output", type=Path, default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = Path(tmp)
+            print(f"Writing {args.files} synthetic files...")
+            write_synthetic_corpus(data_dir, args.files, args.words)
+        loader = TextLoader(data_dir)
+
+        baseline_time, baseline = run(loader, 1, args.shard_size)
+        results = [{"workers": 1, "seconds": baseline_time, "chunks": len(baseline),
+                    "chunks_per_s": len(baseline) / baseline_time, "speedup": 1.0}]
+        print(f"workers=1   {baseline_time:8.2f}s  {len(baseline) / baseline_time:10.0f} chunks/s")
+        for workers in sorted(set(args.workers) - {1}):
+            elapsed, chunks = run(loader, workers, args.shard_size)
+            if chunks != baseline:
+                raise AssertionError(f"workers={workers} produced different chunks than the serial path")
+            results.append({"workers": workers, "seconds": elapsed, "chunks": len(chunks),
+                            "chunks_per_s": len(chunks) / elapsed, "speedup": baseline_time / elapsed})
+            print(f"workers={workers:<3d} {elapsed:8.2f}s  {len(chunks) / elapsed:10.0f} chunks/s  "
+                  f"x{baseline_time / elapsed:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measures SemanticQueryCache.check latency as the number of cached queries grows.
+
+Usage:
+    python -m benchmarks.bench_query_cache --sizes 1000 10000 100000 --backend numpy
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import write_results
+from src.config import EMBEDDING_DIMENSION
+from src.core.query_cache import SemanticQueryCache
+
+
+def legacy_check(entries, query_embedding, threshold):
+    """
+    The original per-entry Python loop, kept here as a baseline.
+    """
+    best_score = -1
+    best_results = None
+    for entry in entries:
+        cached = np.array(entry["embedding"])
+        score = np.dot(query_embedding, cached) / (np.linalg.norm(query_embedding) * np.linalg.norm(cached))
+        if score > best_score:
+            best_score = score
+            best_results = entry["results"]
+    return best_results if best_score >= threshold else None
+
+
+def time_calls(fn, queries, repeats):
+    timings = []
+    for _ in range(repeats):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+
+def run(sizes, backend, n_queries=50, repeats=3, legacy_limit=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    queries = rng.standard_normal((n_queries, EMBEDDING_DIMENSION)).astype(np.float32)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            cache = SemanticQueryCache(cache_path=Path(tmp) / f"bench_{size}.log", backend=backend,
+                                       max_entries=None, max_bytes=None, legacy_path=None)
+            vectors = rng.standard_normal((size, EMBEDDING_DIMENSION)).astype(np.float32)
+            for i, vec in enumerate(vectors):
+                cache.add(f"q{i}", vec, [])
+
+            ms = time_calls(cache.check, queries, repeats)
+            row = {"size": size, "p50_ms": np.percentile(ms, 50), "p99_ms": np.percentile(ms, 99)}
+            if size <= legacy_limit:
+                legacy_entries = [{"embedding": vec.tolist(), "results": []} for vec in vectors]
+                legacy_ms = time_calls(lambda q: legacy_check(legacy_entries, q, cache.threshold), queries[:5], 1)
+                row["legacy_p50_ms"] = np.percentile(legacy_ms, 50)
+            cache.close()
+            rows.append(row)
+            print(f"size={size:>8}  p50={row['p50_ms']:.3f} ms  p99={row['p99_ms']:.3f} ms"
+                  + (f"  legacy p50={row['legacy_p50_ms']:.1f} ms" if "legacy_p50_ms" in row else ""))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query cache lookup latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backend", choices=["numpy", "faiss"], default="numpy")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this path")
+    args = parser.parse_args()
+    write_results(args.output, "query_cache", vars(args), run(args.sizes, args.backend, n_queries=args.queries))
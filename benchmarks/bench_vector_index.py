@@ -0,0 +1,94 @@
+"""
+Compares approximate vector index types against the exact flat index.
+Reports recall@k (overlap with the flat top-k) and p50/p99 single-query latency for a sweep
+of nprobe / efSearch values, so an operating point can be picked for VECTOR_INDEX_TYPE.
+
+Usage:
+    python -m benchmarks.bench_vector_index --vectors 200000 --k 20
+    python -m benchmarks.bench_vector_index --embeddings data/indices/embeddings.npy
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from src.config import EMBEDDING_DIMENSION
+from src.core.vector_index import build_vector_index, search
+
+SWEEPS = {
+    "flat": [None],
+    "ivf_flat": [1, 4, 16, 64],
+    "ivf_pq": [1, 4, 16, 64],
+    "hnsw": [16, 32, 64, 128],
+}
+
+
+def synthetic_embeddings(n: int, dim: int, n_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Clustered unit vectors, closer to real sentence embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(embeddings: np.ndarray, queries: np.ndarray, k: int, types):
+    flat = build_vector_index(embeddings, "flat")
+    _, truth = flat.search(queries, k)
+    rows = []
+    for index_type in types:
+        start = time.perf_counter()
+        index = build_vector_index(embeddings, index_type)
+        build_s = time.perf_counter() - start
+        for knob in SWEEPS[index_type]:
+            kwargs = {"ef_search": knob} if index_type == "hnsw" else {"nprobe": knob}
+            latencies = []
+            found = []
+            for q in queries:
+                t0 = time.perf_counter()
+                _, I = search(index, q.reshape(1, -1), k, **kwargs)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                found.append(I[0])
+            row = {
+                "index_type": index_type,
+                "knob": knob,
+                "build_s": round(build_s, 2),
+                f"recall@{k}": round(recall_at_k(np.array(found), truth), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            }
+            rows.append(row)
+            print(f"{index_type:<9} knob={str(knob):<5} recall@{k}={row[f'recall@{k}']:.4f} "
+                  f"p50={row['p50_ms']:.3f} ms p99={row['p99_ms']:.3f} ms build={row['build_s']} s")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector index recall/latency benchmark")
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--embeddings", help="Use an existing embeddings.npy instead of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--types", nargs="+", default=list(SWEEPS))
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        data = np.load(args.embeddings).astype(np.float32)
+        faiss.normalize_L2(data)
+    else:
+        data = synthetic_embeddings(args.vectors + args.queries, EMBEDDING_DIMENSION)
+    corpus, query_set = data[args.queries:], data[:args.queries]
+    results = run(corpus, query_set, args.k, args.types)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,168 @@
+"""
+Shared pieces of the offline benchmark suite: a synthetic corpus generator, deterministic
+stub models (no network, no GPU), Zipfian query streams and JSON result files.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from src.config import EMBEDDING_DIMENSION
+from src.core.document_store import content_hash, write_generation
+from src.core.ingest_pipeline import NpyAppendWriter, batched
+from src.core.metadata_store import MetadataStoreWriter
+
+
+class StubEmbedder:
+    """
+    Deterministic bag-of-words embedder: every token maps to a fixed pseudo-random vector
+    and a text embeds to the normalized sum. Texts sharing words get similar vectors, so
+    vector search and the semantic cache behave like they would with a real model.
+    `cost_ms` simulates model time per call plus per text.
+    """
+    def __init__(self, dim: int = EMBEDDING_DIMENSION, cost_ms: float = 0.0, cost_ms_per_text: float = 0.0):
+        self.dim = dim
+        self.cost_ms = cost_ms
+        self.cost_ms_per_text = cost_ms_per_text
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._vectors.get(token)
+        if vector is None:
+            vector = np.random.default_rng(zlib.crc32(token.encode())).standard_normal(self.dim).astype(np.float32)
+            self._vectors[token] = vector
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        if self.cost_ms or self.cost_ms_per_text:
+            time.sleep((self.cost_ms + self.cost_ms_per_text * len(texts)) / 1000)
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                embeddings[row] += self._token_vector(token)
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+
+class StubCrossEncoder:
+    """
+    Scores a (query, document) pair by query-term overlap. `cost_ms_per_pair` simulates model time.
+    """
+    def __init__(self, cost_ms: float = 0.0, cost_ms_per_pair: float = 0.0):
+        self.cost_ms = cost_ms
+        self.cost_ms_per_pair = cost_ms_per_pair
+
+    def predict(self, pairs) -> np.ndarray:
+        if self.cost_ms or self.cost_ms_per_pair:
+            time.sleep((self.cost_ms + self.cost_ms_per_pair * len(pairs)) / 1000)
+        scores = []
+        for query, doc in pairs:
+            terms = set(query.lower().split())
+            scores.append(len(terms & set(doc.lower().split())) / max(1, len(terms)))
+        return np.array(scores, dtype=np.float32)
+
+
+def zipf_probabilities(n: int, s: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return weights / weights.sum()
+
+
+def synthetic_documents(n_docs: int, words: int = 200, vocab_size: int = 20_000, zipf_s: float = 1.1,
+                        seed: int = 0) -> List[Dict]:
+    """
+    Chunk dicts ({"filename", "path", "content"}) whose words follow a Zipf distribution,
+    like natural text. Chunk lengths vary between words/2 and words*3/2.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)])
+    probabilities = zipf_probabilities(vocab_size, zipf_s)
+    lengths = rng.integers(words // 2, words * 3 // 2 + 1, n_docs)
+    tokens = vocab[rng.choice(vocab_size, int(lengths.sum()), p=probabilities)]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [{"filename": f"doc_{i:07d}.txt", "path": f"synthetic/doc_{i:07d}.txt",
+             "content": " ".join(tokens[bounds[i]:bounds[i + 1]])} for i in range(n_docs)]
+
+
+def synthetic_queries(n_distinct: int, vocab_size: int = 20_000, terms: int = 4, seed: int = 1) -> List[str]:
+    """
+    Distinct queries of mid-frequency terms (the most frequent words behave like stop words).
+    """
+    rng = np.random.default_rng(seed)
+    low, high = min(50, vocab_size - 1), min(5000, vocab_size)
+    queries = set()
+    while len(queries) < n_distinct:
+        queries.add(" ".join(f"w{t}" for t in rng.integers(low, high, terms)))
+    return sorted(queries)
+
+
+def zipf_stream(queries: List[str], n: int, s: float = 1.0, seed: int = 2) -> List[str]:
+    """
+    `n` draws from `queries` where the i-th query is picked with probability ~ 1/i^s,
+    the popularity skew typically seen in search logs.
+    """
+    rng = np.random.default_rng(seed)
+    return [queries[i] for i in rng.choice(len(queries), n, p=zipf_probabilities(len(queries), s))]
+
+
+def write_index_files(index_dir: Path, docs: List[Dict], embedder, batch_size: int = 256):
+    """
+    Writes metadata.bin, embeddings.npy and corpus.json the way ingest.py does.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    vectors = NpyAppendWriter(index_dir / "embeddings.npy")
+    metadata = MetadataStoreWriter(index_dir / "metadata.bin")
+    for batch in batched(docs, batch_size):
+        vectors.append(embedder.embed_documents([doc["content"] for doc in batch]))
+        for doc in batch:
+            metadata.write(dict(doc, hash=content_hash(doc["content"])))
+    vectors.close()
+    metadata.close()
+    write_generation("synthetic", index_dir / "corpus.json")
+
+
+def latency_summary(seconds: List[float]) -> Dict:
+    ms = np.array(seconds) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 4) if len(ms) else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 4) if len(ms) else None,
+        "p95_ms": round(float(np.percentile(ms, 95)), 4) if len(ms) else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 4) if len(ms) else None,
+    }
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "faiss": faiss.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path: Optional[Path], name: str, params: Dict, results) -> Dict:
+    """
+    Wraps results with their parameters and environment; writes them as JSON if `path` is set.
+    """
+    report = {"benchmark": name, "environment": environment(), "params": params, "results": results}
+    if path is not None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Results written to {path}")
+    return report
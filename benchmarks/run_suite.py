@@ -0,0 +1,111 @@
+"""
+Runs the offline benchmark suite (no network, no GPU) and stores one JSON report:
+query cache lookups, BM25, FAISS, ingestion and a concurrent Zipfian load test.
+Compare two reports to spot regressions between runs.
+
+Usage:
+    python -m benchmarks.run_suite --scale small
+    python -m benchmarks.run_suite --scale medium --output benchmarks/results/after.json \\
+        --compare benchmarks/results/before.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+from benchmarks import bench_bm25, bench_ingest, bench_load, bench_query_cache, bench_vector_index
+from benchmarks.common import write_results
+from src.config import EMBEDDING_DIMENSION
+
+SCALES = {
+    "small": {"docs": 2_000, "vectors": 20_000, "cache_sizes": [1_000, 10_000], "requests": 1_000},
+    "medium": {"docs": 20_000, "vectors": 100_000, "cache_sizes": [1_000, 10_000, 100_000], "requests": 5_000},
+    "large": {"docs": 100_000, "vectors": 1_000_000, "cache_sizes": [10_000, 100_000, 500_000], "requests": 20_000},
+}
+
+# Metric name suffixes where a higher value is better; for everything else timed, lower is better
+HIGHER_IS_BETTER = ("qps", "chunks_per_s", "hit_ratio", "speedup")
+LOWER_IS_BETTER = ("_ms", "_s")
+
+
+def run(scale: Dict) -> Dict:
+    results = {}
+    print("== Query cache ==")
+    results["query_cache"] = bench_query_cache.run(scale["cache_sizes"], "numpy")
+    print("== BM25 ==")
+    results["bm25"] = bench_bm25.run(scale["docs"], 200, 20)
+    print("== Vector index ==")
+    data = bench_vector_index.synthetic_embeddings(scale["vectors"] + 200, EMBEDDING_DIMENSION)
+    results["vector_index"] = bench_vector_index.run(data[200:], data[:200], 20, ["flat", "ivf_flat", "hnsw"])
+    print("== Ingestion ==")
+    results["ingest"] = bench_ingest.run(scale["docs"], 200, 256)
+    print("== Load ==")
+    load_args = bench_load.build_parser().parse_args(["--docs", str(scale["docs"]), "--requests", str(scale["requests"])])
+    results["load"] = bench_load.run(load_args)
+    return results
+
+
+def flatten(value, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """
+    Yields ("path.to.metric", number) for every numeric leaf. List items are keyed by their
+    identifying field (size, phase, index_type/knob) so runs line up even if order changes.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = i
+            if isinstance(item, dict):
+                ids = [str(item[key]) for key in ("size", "phase", "index_type", "knob", "workers") if key in item]
+                label = "/".join(ids) if ids else i
+            yield from flatten(item, f"{prefix}[{label}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float) -> int:
+    """
+    Prints metrics that moved by more than `tolerance` (relative); returns the number of regressions.
+    """
+    before = dict(flatten(baseline["results"]))
+    regressions = 0
+    for name, value in flatten(current["results"]):
+        leaf = name.rsplit(".", 1)[-1]
+        if name not in before or before[name] == 0:
+            continue
+        if leaf.endswith(HIGHER_IS_BETTER):
+            change = (value - before[name]) / abs(before[name])
+        elif leaf.endswith(LOWER_IS_BETTER):
+            change = (before[name] - value) / abs(before[name])
+        else:
+            continue
+        if abs(change) > tolerance:
+            verdict = "better" if change > 0 else "REGRESSION"
+            regressions += change < 0
+            print(f"{verdict:<10} {name}: {before[name]:.4g} -> {value:.4g} ({change:+.1%})")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Report path (default: benchmarks/results/<scale>_<timestamp>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change reported by --compare")
+    args = parser.parse_args()
+
+    output = args.output or Path("benchmarks/results") / f"{args.scale}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    report = write_results(output, "suite", {"scale": args.scale, **SCALES[args.scale]}, run(SCALES[args.scale]))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, json.loads(json.dumps(report, default=str)), args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
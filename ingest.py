@@ -1,89 +1,53 @@
-import sys
+import uuid
 import numpy as np
 from src.core.preprocessing import TextLoader
 from src.core.embedder import Embedder
 from src.core.cache_manager import CacheManager
-from src.config import INDICES_DIR
+from src.core.bm25 import BM25Index, tokenize
+from src.core.document_store import write_generation
+from src.core.index_snapshot import write_snapshot
+from src.core.ingest_pipeline import run_pipeline
+from src.core.metadata_store import MetadataStore
+from src.core.shards import write_shards
+from src.core.vector_index import build_vector_index
+from src.config import METADATA_STORE_FILE, EMBEDDINGS_FILE, VECTOR_INDEX_TYPE, INGEST_BATCH_SIZE, SEARCH_SHARDS
 
 def main():
-    # 1. Load Documents
+    # 1. Stream Documents: files -> clean -> chunk
     loader = TextLoader()
-    documents = loader.load_files()
-    
-    if not documents:
-        print("No documents found. Exiting.")
-        return
 
-    # 2. Initialize Cache and Embedder
+    # 2. Initialize Cache; the Embedder is only loaded if some chunk is not cached
     cache_manager = CacheManager()
-    
-    # 3. Check Cache
-    print("Checking cache...")
-    
-    # We need to adapt how we interact with CacheManager because we now have chunks.
-    # We will use a unique identifier for each chunk as the "filename" in the cache.
-    
-    docs_to_embed = []
-    final_embeddings = [None] * len(documents)
-    indices_to_embed = []
 
-    for i, doc in enumerate(documents):
-        # Create a unique ID for the chunk
-        chunk_unique_id = f"{doc['filename']}_chunk_{doc['chunk_id']}"
-        
-        # Check cache using the unique ID
-        emb = cache_manager.get_embedding(chunk_unique_id, doc["content"])
-        
-        if emb is not None:
-            final_embeddings[i] = emb
-        else:
-            docs_to_embed.append(doc)
-            indices_to_embed.append(i)
-    
-    if docs_to_embed:
-        print(f"Found {len(docs_to_embed)} new or modified chunks.")
-        embedder = Embedder()
-        
-        # 4. Embed New Documents
-        texts = [doc["content"] for doc in docs_to_embed]
-        new_embeddings = embedder.embed_documents(texts)
-        
-        # 5. Update Cache and Final Embeddings List
-        for i, idx in enumerate(indices_to_embed):
-            doc = docs_to_embed[i]
-            emb = new_embeddings[i]
-            
-            chunk_unique_id = f"{doc['filename']}_chunk_{doc['chunk_id']}"
-            cache_manager.update_entry(chunk_unique_id, doc["content"], emb)
-            
-            final_embeddings[idx] = emb
-            
-        cache_manager.save_cache()
-    else:
-        print("All chunks are already cached. No new embeddings needed.")
+    # 3. Cache lookup -> batched embedding -> incremental writes of embeddings and metadata
+    print(f"Ingesting in batches of {INGEST_BATCH_SIZE} chunks...")
+    counts = run_pipeline(loader.iter_chunks(), cache_manager, Embedder, EMBEDDINGS_FILE, METADATA_STORE_FILE)
 
-    # Ensure all embeddings are present and valid
-    # Filter out any Nones if something went wrong (though logic above should handle it)
-    valid_embeddings = [e for e in final_embeddings if e is not None]
-    
-    if len(valid_embeddings) != len(documents):
-        print("Error: Mismatch in number of embeddings and documents.")
+    if not counts["chunks"]:
+        print("No documents found. Exiting.")
         return
+    if counts["embedded"]:
+        print(f"Embedded {counts['embedded']} new or modified chunks.")
+    else:
+        print("All chunks are already cached. No new embeddings needed.")
+    print(f"Embeddings saved to {EMBEDDINGS_FILE}")
+    print(f"Metadata saved to {METADATA_STORE_FILE}")
+    # New corpus generation: live document changes logged against the previous corpus no longer apply
+    write_generation(uuid.uuid4().hex)
 
-    # Convert to numpy array for FAISS (Phase 3)
-    embeddings_array = np.array(valid_embeddings).astype('float32')
-    print(f"Total Embeddings Shape: {embeddings_array.shape}")
-    
-    # Save embeddings array for FAISS indexing later
-    np.save(INDICES_DIR / "embeddings.npy", embeddings_array)
-    print(f"Embeddings saved to {INDICES_DIR / 'embeddings.npy'}")
+    # Persist FAISS + BM25 so SearchEngine can open them instead of rebuilding on startup.
+    # IVF/PQ index types (VECTOR_INDEX_TYPE) are trained here, once, not in every worker.
+    # Both builds stream: vectors are added in blocks from the memory-mapped embeddings and
+    # BM25 postings are packed into arrays every BM25_BUILD_BATCH_DOCS chunks.
+    print(f"Building {VECTOR_INDEX_TYPE} vector index...")
+    index = build_vector_index(np.load(EMBEDDINGS_FILE, mmap_mode="r"))
+    bm25 = BM25Index.from_corpus(tokenize(doc["content"]) for doc in MetadataStore(METADATA_STORE_FILE))
+    write_snapshot(index, bm25, [METADATA_STORE_FILE, EMBEDDINGS_FILE])
 
-    # Save metadata to ensure alignment
-    import json
-    metadata = [{"filename": doc["filename"], "path": doc["path"], "content": doc["content"]} for doc in documents]
-    with open(INDICES_DIR / "metadata.json", "w") as f:
-        json.dump(metadata, f)
-    print(f"Metadata saved to {INDICES_DIR / 'metadata.json'}")
+    # Sharded mode: per-shard indices, BM25-scored with the whole corpus's statistics
+    if SEARCH_SHARDS:
+        print(f"Partitioning into {SEARCH_SHARDS} shards...")
+        write_shards(METADATA_STORE_FILE, EMBEDDINGS_FILE, bm25, SEARCH_SHARDS)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from src.config import API_WORKERS, API_QUEUE_SIZE, API_REQUEST_TIMEOUT_MS
+from src.core.batcher import DeadlineExceeded
+
+
+class Overloaded(Exception):
+    """
+    Every worker is busy and the admission queue is full; the request was not accepted.
+    """
+
+
+class ExecutionLayer:
+    """
+    Runs blocking engine calls off the event loop with bounded admission.
+
+    At most `workers` calls run at once and `queue_size` more may wait; a request arriving
+    beyond that is rejected immediately with `Overloaded` instead of queueing without limit.
+    Each admitted request carries a deadline (`timeout_ms`, None = no deadline): if it is
+    still queued when the deadline passes it is dropped without running, and the caller
+    stops waiting for it either way with `DeadlineExceeded`. Writes are run with
+    `deadline=False`: once accepted they are allowed to finish.
+
+    Threads rather than processes: the engine's indices, caches and models are shared
+    in-process state, and FAISS, NumPy and the models release the GIL while they compute.
+    """
+    def __init__(self, workers: int = API_WORKERS, queue_size: int = API_QUEUE_SIZE,
+                 timeout_ms: Optional[float] = API_REQUEST_TIMEOUT_MS):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout_ms = timeout_ms
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="api-worker")
+        self._lock = threading.Lock()
+        self._in_flight = 0 # Admitted and not yet finished (running + queued)
+        self._counts = {"admitted": 0, "completed": 0, "rejected": 0, "expired": 0, "timed_out": 0}
+
+    def _deadline(self, timeout_ms: Optional[float], deadline: bool = True) -> Optional[float]:
+        if not deadline:
+            return None
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        return None if timeout_ms is None else time.monotonic() + timeout_ms / 1000.0
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                self._counts["rejected"] += 1
+                raise Overloaded(f"{self._in_flight} requests in flight (limit {self.workers + self.queue_size})")
+            self._in_flight += 1
+            self._counts["admitted"] += 1
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled():
+                return
+            error = future.exception()
+            if isinstance(error, DeadlineExceeded):
+                self._counts["expired"] += 1
+            elif error is None:
+                self._counts["completed"] += 1
+
+    @staticmethod
+    def _call(deadline: Optional[float], fn: Callable, args, kwargs):
+        if deadline is not None and time.monotonic() > deadline:
+            raise DeadlineExceeded("Request deadline passed while queued")
+        return fn(*args, **kwargs)
+
+    async def _wait(self, future: Future, deadline: Optional[float]):
+        future.add_done_callback(self._release)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # The work may still finish in the background; its slot is freed only then
+            with self._lock:
+                self._counts["timed_out"] += 1
+            raise DeadlineExceeded("Request did not finish before its deadline")
+
+    async def run(self, fn: Callable, *args, timeout_ms: Optional[float] = None, deadline: bool = True, **kwargs):
+        """
+        Runs `fn(*args, **kwargs)` on the worker pool and awaits its result.
+        Raises `Overloaded` if the request cannot be admitted and `DeadlineExceeded` past its deadline.
+        """
+        self._admit()
+        deadline = self._deadline(timeout_ms, deadline)
+        try:
+            future = self._pool.submit(self._call, deadline, fn, args, kwargs)
+        except RuntimeError:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        return await self._wait(future, deadline)
+
+    async def run_batched(self, batcher, query: str, timeout_ms: Optional[float] = None, **params):
+        """
+        Like `run`, but the search is served by a `SearchBatcher` (shared model calls)
+        under the same admission limit; the batcher drops it if its deadline passes first.
+        """
+        self._admit()
+        deadline = self._deadline(timeout_ms)
+        return await self._wait(batcher.submit(query, deadline=deadline, **params), deadline)
+
+    def stats(self) -> Dict:
+        """
+        Pool size, current load and how many requests were rejected, expired in the queue or timed out.
+        """
+        with self._lock:
+            return {"workers": self.workers, "queue_size": self.queue_size, "timeout_ms": self.timeout_ms,
+                    "in_flight": self._in_flight, **self._counts}
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -1,7 +1,17 @@
-from fastapi import FastAPI
-from src.api.routes import router as search_router
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from src.api.routes import router as search_router, create_services
+from src.core.metrics import render_engine_metrics
 
-app = FastAPI(title="SemanticCache API", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models and indices load when the server starts, not when this module is imported
+    app.state.services = create_services()
+    yield
+    app.state.services.close()
+
+app = FastAPI(title="SemanticCache API", version="1.0", lifespan=lifespan)
 
 app.include_router(search_router, prefix="/api/v1")
 
@@ -9,6 +19,15 @@ app.include_router(search_router, prefix="/api/v1")
 async def root():
     return {"message": "Welcome to SemanticCache API"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """
+    Prometheus scrape endpoint: per-stage search latency histograms (see METRICS_ENABLED),
+    query cache hit ratio and size, and index size.
+    """
+    engine = request.app.state.services.engine
+    return PlainTextResponse(render_engine_metrics(engine), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("src.api.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,29 +1,178 @@
-from fastapi import APIRouter, HTTPException
-from src.api.schemas import SearchRequest, SearchResponse
-from src.core.search_engine import SearchEngine
+import time
+from functools import partial
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from src.api.schemas import (
+    SearchRequest,
+    SearchResponse,
+    BatchSearchRequest,
+    BatchSearchResponse,
+    DocumentRequest,
+    DocumentUpdateRequest,
+    DocumentChangeResponse,
+)
+from src.api.execution import ExecutionLayer, Overloaded
+from src.config import (SEARCH_BATCHING_ENABLED, SEARCH_BATCH_MAX_QUERIES, API_RETRY_AFTER_SECONDS, API_RESULT_FIELDS,
+                        API_BATCH_TIMEOUT_MS_PER_QUERY)
+from src.core.batcher import DeadlineExceeded, SearchBatcher
+from src.core.search_engine import DocumentExists, DocumentNotFound, DocumentsReadOnly, SearchEngine
 
 router = APIRouter()
 
-# Initialize SearchEngine once (singleton-ish)
-# In a real app, use dependency injection or lifespan events
-search_engine = SearchEngine()
 
-@router.post("/search", response_model=SearchResponse)
-async def search(request: SearchRequest):
+class Services:
+    """
+    Everything the routes need, built once by the app lifespan (see `create_services`).
+    """
+    def __init__(self, engine, batcher: Optional[SearchBatcher], executor: ExecutionLayer):
+        self.engine = engine
+        self.batcher = batcher
+        self.executor = executor
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        self.executor.close()
+
+
+def create_services(engine=None) -> Services:
+    """
+    Loads the engine (models, indices, caches) unless one is given.
+    Concurrent /search requests are coalesced so the models see one batch instead of many single queries.
+    """
+    engine = engine or SearchEngine()
+    batcher = SearchBatcher(engine) if SEARCH_BATCHING_ENABLED else None
+    return Services(engine, batcher, ExecutionLayer())
+
+
+def get_services(request: Request) -> Services:
+    return request.app.state.services
+
+
+async def _execute(awaitable):
+    """
+    Awaits an execution-layer call, turning load shedding into HTTP responses:
+    429 when the admission queue is full, 503 when the deadline passed first.
+    """
+    headers = {"Retry-After": str(API_RETRY_AFTER_SECONDS)}
+    try:
+        return await awaitable
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
+
+def _result_fields(request) -> list:
+    return list(request.fields) if request.fields is not None else list(API_RESULT_FIELDS)
+
+# Unselected result fields are left out of the response rather than sent as null
+@router.post("/search", response_model=SearchResponse, response_model_exclude_unset=True)
+async def search(request: SearchRequest, services: Services = Depends(get_services)):
     try:
-        results = search_engine.search(request.query, k=request.k, alpha=request.alpha)
+        params = dict(k=request.k, alpha=request.alpha, nprobe=request.nprobe, ef_search=request.ef_search,
+                      fields=_result_fields(request), snippet_length=request.snippet_length)
+        if services.batcher is not None:
+            results = await _execute(services.executor.run_batched(
+                services.batcher, request.query, timeout_ms=request.timeout_ms, **params))
+        else:
+            results = await _execute(services.executor.run(
+                services.engine.search, request.query, timeout_ms=request.timeout_ms, **params))
         return {"results": results}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _batch_timeout_ms(request: BatchSearchRequest, executor: ExecutionLayer) -> Optional[float]:
+    """
+    A batch's deadline: `timeout_ms` if given, else the default search deadline plus
+    API_BATCH_TIMEOUT_MS_PER_QUERY per query (None when searches have no default deadline).
+    """
+    if request.timeout_ms is not None:
+        return request.timeout_ms
+    if executor.timeout_ms is None:
+        return None
+    return executor.timeout_ms + API_BATCH_TIMEOUT_MS_PER_QUERY * len(request.queries)
+
+@router.post("/search/batch", response_model=BatchSearchResponse, response_model_exclude_unset=True)
+async def search_batch(request: BatchSearchRequest, services: Services = Depends(get_services)):
+    """
+    Runs many queries in one call (offline evaluation, backfills).
+    Results are returned in request order with a per-query cache-hit flag.
+    The engine stops between query chunks once the batch's deadline has passed.
+    """
+    if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch")
+    timeout_ms = _batch_timeout_ms(request, services.executor)
+    deadline = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000.0
+    try:
+        results = await _execute(services.executor.run(
+            partial(services.engine.search_batch, deadline=deadline), request.queries, k=request.k,
+            alpha=request.alpha, rerank=request.rerank, nprobe=request.nprobe, ef_search=request.ef_search,
+            fields=_result_fields(request), snippet_length=request.snippet_length, timeout_ms=timeout_ms))
+        return {"results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/documents", response_model=DocumentChangeResponse, status_code=201)
+async def add_document(request: DocumentRequest, services: Services = Depends(get_services)):
+    """
+    Chunks, embeds and indexes a new document; it is searchable once this returns.
+    """
+    try:
+        added = await _execute(services.executor.run(
+            services.engine.add_document, request.filename, request.content, request.path, deadline=False))
+    except (DocumentExists, DocumentsReadOnly) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"filename": request.filename, "added": added}
+
+@router.put("/documents/{filename}", response_model=DocumentChangeResponse)
+async def update_document(filename: str, request: DocumentUpdateRequest,
+                          services: Services = Depends(get_services)):
+    """
+    Replaces a document's content. Cached results containing its old chunks are invalidated.
+    """
+    try:
+        change = await _execute(services.executor.run(
+            services.engine.update_document, filename, request.content, request.path, deadline=False))
+    except DocumentNotFound:
+        raise HTTPException(status_code=404, detail=f"Document {filename} not found")
+    except DocumentsReadOnly as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"filename": filename, **change}
+
+@router.delete("/documents/{filename}", response_model=DocumentChangeResponse)
+async def delete_document(filename: str, services: Services = Depends(get_services)):
+    try:
+        removed = await _execute(services.executor.run(services.engine.delete_document, filename, deadline=False))
+    except DocumentNotFound:
+        raise HTTPException(status_code=404, detail=f"Document {filename} not found")
+    except DocumentsReadOnly as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"filename": filename, "removed": removed}
+
+@router.post("/documents/compact")
+async def compact_documents(services: Services = Depends(get_services)):
+    """
+    Folds live changes into new index files now instead of waiting for LIVE_COMPACT_MIN_CHANGES.
+    """
+    try:
+        await _execute(services.executor.run(services.engine.compact, deadline=False))
+    except DocumentsReadOnly as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return services.engine.live_stats()
+
 @router.get("/health")
-async def health_check():
+async def health_check(services: Services = Depends(get_services)):
     """
     Health check endpoint returning index stats.
     """
     try:
-        doc_count = len(search_engine.documents) if search_engine.documents else 0
-        index_size = search_engine.index.ntotal if search_engine.index else 0
+        engine = services.engine
+        doc_count = len(engine.documents) if engine.documents else 0
+        index_size = engine.index.ntotal if engine.index else 0
         return {
             "status": "healthy",
             "documents_indexed": doc_count,
@@ -32,3 +181,20 @@ async def health_check():
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stats")
+async def stats(services: Services = Depends(get_services)):
+    """
+    Cache counters (hits, misses, evictions, size) used to size the query cache,
+    the batch-size histogram of the request batcher, pending live document changes,
+    re-ranking work (pairs scored, reused and pruned), the embedder's query-embedding memo
+    and the API worker pool's load (in flight, rejected, expired, timed out).
+    """
+    engine = services.engine
+    stats = {"query_cache": engine.query_cache.stats(), "documents": engine.live_stats(),
+             "rerank": engine.rerank_stats(), "executor": services.executor.stats()}
+    if hasattr(engine.embedder, "memo_stats"):
+        stats["embedder"] = engine.embedder.memo_stats()
+    if services.batcher is not None:
+        stats["batcher"] = services.batcher.stats()
+    return stats
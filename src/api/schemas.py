@@ -1,19 +1,66 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from src.config import API_MAX_K, API_MAX_TIMEOUT_MS, API_MAX_BATCH_TIMEOUT_MS
+
+# Selectable result fields (see RESULT_FIELDS in the search engine); id and score are always returned
+ResultField = Literal["filename", "path", "content", "vector_score", "bm25_score",
+                      "overlap_score", "matched_keywords", "explanation"]
 
 class SearchRequest(BaseModel):
     query: str
-    k: int = 5
-    alpha: float = 0.5
+    k: int = Field(5, ge=1, le=API_MAX_K)
+    alpha: float = Field(0.5, ge=0.0, le=1.0)
+    nprobe: Optional[int] = Field(None, ge=1) # IVF lists to probe (ivf_flat / ivf_pq indices)
+    ef_search: Optional[int] = Field(None, ge=1) # HNSW search breadth (hnsw index)
+    timeout_ms: Optional[int] = Field(None, ge=1, le=API_MAX_TIMEOUT_MS) # Deadline (default API_REQUEST_TIMEOUT_MS)
+    fields: Optional[List[ResultField]] = None # Result fields to return (default API_RESULT_FIELDS)
+    snippet_length: Optional[int] = Field(None, ge=1) # Max words of content per result (None = whole chunk)
 
 class SearchResult(BaseModel):
+    # Only the requested fields are present in a response
     id: int
     score: float
-    filename: str
-    content: str
-    vector_score: float
-    bm25_score: float
-    overlap_score: float
+    filename: Optional[str] = None
+    path: Optional[str] = None
+    content: Optional[str] = None
+    vector_score: Optional[float] = None
+    bm25_score: Optional[float] = None
+    overlap_score: Optional[float] = None
+    matched_keywords: Optional[List[str]] = None
+    explanation: Optional[str] = None
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = Field(5, ge=1, le=API_MAX_K)
+    alpha: float = Field(0.5, ge=0.0, le=1.0)
+    rerank: bool = True
+    nprobe: Optional[int] = Field(None, ge=1)
+    ef_search: Optional[int] = Field(None, ge=1)
+    timeout_ms: Optional[int] = Field(None, ge=1, le=API_MAX_BATCH_TIMEOUT_MS) # Default scales with the query count
+    fields: Optional[List[ResultField]] = None
+    snippet_length: Optional[int] = Field(None, ge=1)
+
+class BatchSearchItem(BaseModel):
+    query: str
+    results: List[SearchResult]
+    cache_hit: bool
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchItem]
+
+class DocumentRequest(BaseModel):
+    filename: str
+    content: str
+    path: Optional[str] = None
+
+class DocumentUpdateRequest(BaseModel):
+    content: str
+    path: Optional[str] = None
+
+class DocumentChangeResponse(BaseModel):
+    filename: str
+    added: List[int] = [] # Chunk ids now searchable
+    removed: List[int] = [] # Chunk ids no longer returned
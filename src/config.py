@@ -9,16 +9,111 @@ DATA_DIR = PROJECT_ROOT / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 CACHE_DIR = DATA_DIR / "cache"
 INDICES_DIR = DATA_DIR / "indices"
+MODELS_DIR = DATA_DIR / "models" # Locally exported (e.g. quantized ONNX) model copies
 
 # Ensure directories exist
 RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 INDICES_DIR.mkdir(parents=True, exist_ok=True)
 
+# Index files written by ingest.py
+METADATA_STORE_FILE = INDICES_DIR / "metadata.bin" # Chunk metadata, memory-mapped and read by row
+METADATA_FILE = INDICES_DIR / "metadata.json" # Older JSON metadata; converted to METADATA_STORE_FILE on load
+EMBEDDINGS_FILE = INDICES_DIR / "embeddings.npy"
+CORPUS_FILE = INDICES_DIR / "corpus.json" # Corpus generation; changes on every ingest.py run
+DOCUMENT_LOG_FILE = INDICES_DIR / "documents.log" # Live document changes since the last ingest/compaction
+
 # Model Configuration
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 EMBEDDING_DIMENSION = 384
+EMBEDDING_MEMO_ENABLED = True # Search engine's Embedder keeps an LRU of recent query embeddings
+EMBEDDING_MEMO_MAX_ENTRIES = 10_000
+EMBEDDING_PROGRESS_BAR_MIN_TEXTS = 256 # Smaller batches (e.g. single queries) encode without a progress bar
+CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Inference Backend
+INFERENCE_BACKEND = "torch" # "torch" (PyTorch) or "onnx_int8" (ONNX Runtime, int8 dynamic quantization; CPU)
+ONNX_QUANTIZATION = "avx512_vnni" # Target ISA of the int8 export: "arm64", "avx2", "avx512" or "avx512_vnni"
+ONNX_INTRA_OP_THREADS = None # ONNX Runtime intra-op threads per model (None = one per physical core)
+
+# Search Configuration
+RERANK_CANDIDATES = 20 # Hybrid candidates re-scored by the Cross-Encoder
+RERANK_SCORE_CACHE_SIZE = 50_000 # (query, chunk id) Cross-Encoder scores kept for reuse; 0 disables
+RERANK_ADAPTIVE = False # Lossy: skip re-scoring candidates whose hybrid score trails the best one (may change rankings)
+RERANK_ADAPTIVE_MIN_RATIO = 0.5 # Candidates below this fraction of the best hybrid score are not re-scored
+RERANK_BATCH_SIZE = 5 # Adaptive depth grows in steps of this many candidates (never below k)
+SEARCH_BATCHING_ENABLED = True # Coalesce concurrent /search requests into shared model calls
+SEARCH_BATCH_MAX_SIZE = 32 # Max requests per batch
+SEARCH_BATCH_MAX_WAIT_MS = 5 # Max time the first request of a batch waits for others to join
+SEARCH_BATCH_CHUNK_SIZE = 256 # Queries processed together by /search/batch
+SEARCH_BATCH_MAX_QUERIES = 10_000 # Max queries accepted by one /search/batch call
+
+# API Execution Configuration
+API_WORKERS = 4 # Threads running blocking engine calls for the API (unbatched /search, /search/batch, documents)
+API_QUEUE_SIZE = 64 # Requests admitted beyond the running ones; more are shed with 429
+API_REQUEST_TIMEOUT_MS = 10_000 # Default search deadline; queued past it = dropped, unfinished = 503 (None = no deadline)
+API_MAX_K = 100 # Largest k a search request may ask for
+API_MAX_TIMEOUT_MS = 60_000 # Largest per-request timeout_ms
+API_BATCH_TIMEOUT_MS_PER_QUERY = 200 # /search/batch default deadline: API_REQUEST_TIMEOUT_MS plus this much per query
+API_MAX_BATCH_TIMEOUT_MS = 3_600_000 # Largest timeout_ms a /search/batch request may ask for
+API_RETRY_AFTER_SECONDS = 1 # Retry-After sent with 429/503 responses
+API_RESULT_FIELDS = ("filename", "content", "vector_score", "bm25_score", "overlap_score") # Returned (with id and score) when a request selects no fields
+
+# Metrics Configuration
+METRICS_ENABLED = True # Per-stage search latency histograms, exposed at /metrics; off = no timers at all
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0) # Seconds
+
+# Vector Index Configuration
+VECTOR_INDEX_TYPE = "flat" # "flat" (exact), "ivf_flat", "ivf_pq" or "hnsw"
+VECTOR_INDEX_TRAIN_SAMPLE = 100_000 # Max vectors used to train IVF/PQ quantizers in ingest.py
+VECTOR_INDEX_ADD_BATCH = 65_536 # Vectors normalized and added per step, so a memory-mapped matrix is never copied whole
+IVF_NLIST = 1024 # Number of IVF lists (clamped to what the corpus can train)
+IVF_NPROBE = 16 # Default lists probed per query; overridable per request
+IVF_PQ_M = 48 # PQ sub-quantizers (must divide EMBEDDING_DIMENSION)
+IVF_PQ_NBITS = 8 # Bits per PQ code
+HNSW_M = 32 # HNSW graph degree
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64 # Default efSearch; overridable per request
+
+# Sharding Configuration
+SHARDS_DIR = INDICES_DIR / "shards" # Per-shard vector + BM25 indices written by ingest.py
+SEARCH_SHARDS = 0 # Shards written by ingest.py and served by as many local processes (0 = unsharded)
+
+# Live Update Configuration
+LIVE_COMPACT_MIN_CHANGES = 1000 # Logged chunk changes that trigger a background compaction (None = manual only)
+
+# Ingestion Configuration
+INGEST_BATCH_SIZE = 256 # Chunks embedded and written per batch; bounds ingest.py peak memory
+INGEST_PROGRESS_INTERVAL_SECONDS = 5 # How often ingest.py reports throughput (chunks/s)
+INGEST_WORKERS = 1 # Processes cleaning and chunking raw files (1 = serial, None = one per CPU)
+INGEST_SHARD_SIZE = 64 # Files cleaned and chunked per worker task (one returned chunk batch)
+BM25_BUILD_BATCH_DOCS = 50_000 # Documents whose postings are collected in Python dicts before being packed into arrays
+
+# Embedding Cache Configuration (ingestion)
+EMBEDDING_CACHE_BACKEND = "binary" # "binary" (memory-mapped matrix + sorted hash index) or "json" (legacy)
+EMBEDDING_CACHE_DTYPE = "float32" # Storage dtype for the binary backend; "float16" halves disk and page-cache use
 
 # Query Cache Configuration
-QUERY_CACHE_FILE = CACHE_DIR / "query_cache.json"
+QUERY_CACHE_FILE = CACHE_DIR / "query_cache.json" # Legacy JSON store, migrated into the log on first load
+QUERY_CACHE_LOG_FILE = CACHE_DIR / "query_cache.log" # Append-only binary log (embeddings + compact result records)
 QUERY_CACHE_THRESHOLD = 0.85 # Similarity threshold for semantic cache hit
+QUERY_CACHE_EXACT_TIER = True # Answer repeated query text (case/whitespace folded) before embedding it
+QUERY_CACHE_BACKEND = "numpy" # "numpy" (pre-normalized matrix, one matmul) or "faiss" (IndexFlatIP over cached queries)
+QUERY_CACHE_INITIAL_CAPACITY = 1024 # Rows preallocated for cached query embeddings (grows by doubling)
+QUERY_CACHE_MAX_ENTRIES = 100_000 # Max cached queries (None = unbounded)
+QUERY_CACHE_MAX_BYTES = 512 * 1024 * 1024 # Approximate memory budget for cached entries (None = unbounded)
+QUERY_CACHE_EVICTION_POLICY = "lru" # "lru", "lfu", "ttl" (oldest first) or "cost" (keeps entries whose search was expensive)
+QUERY_CACHE_TTL_SECONDS = None # Entries older than this are treated as misses and dropped (None = never expire)
+QUERY_CACHE_COMPACT_MIN_RECORDS = 1000 # Dead log records tolerated before a background compaction
+QUERY_CACHE_COMPACT_RATIO = 1.0 # ...and only once dead records exceed this multiple of live entries
+QUERY_CACHE_STORE = "log" # "log" (private append-only log) or "shared" (SQLite file shared by all API worker processes)
+QUERY_CACHE_SHARED_FILE = CACHE_DIR / "query_cache.sqlite" # Shared store used when QUERY_CACHE_STORE = "shared"
+QUERY_CACHE_SYNC_INTERVAL_MS = 20 # Max staleness of a worker's view of entries other workers added or removed
+QUERY_CACHE_SHARED_TOMBSTONE_SECONDS = 300 # Deleted entries are purged from the shared store after this long
+
+# Index Snapshot Configuration
+SNAPSHOT_DIR = INDICES_DIR / "snapshots" # Versioned FAISS + BM25 snapshots written by ingest.py
+SNAPSHOT_FORMAT_VERSION = 2 # Bump whenever snapshot contents change; older snapshots are ignored
+SNAPSHOT_MMAP = True # Memory-map snapshot files instead of reading them into RAM
+SNAPSHOT_KEEP = 2 # Number of snapshot versions kept on disk
+SNAPSHOT_VERIFY_SOURCES = False # Rehash source files at startup even when their size and mtime match the recorded stamp
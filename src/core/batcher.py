@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+from src.config import SEARCH_BATCH_MAX_SIZE, SEARCH_BATCH_MAX_WAIT_MS
+
+
+class DeadlineExceeded(Exception):
+    """
+    A request's deadline passed before it could be served; it was dropped without running.
+    """
+
+
+class SearchBatcher:
+    """
+    Collects concurrent search requests and runs them through `SearchEngine.search_many`,
+    so queries share one embedding call and one Cross-Encoder call.
+
+    A batch is dispatched once it holds `max_batch_size` requests or `max_wait_ms` has
+    passed since its first request arrived. An idle batcher adds no delay beyond that wait.
+    """
+    def __init__(self, engine, max_batch_size: int = SEARCH_BATCH_MAX_SIZE,
+                 max_wait_ms: float = SEARCH_BATCH_MAX_WAIT_MS):
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[Dict, Future, Optional[float]]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._expired = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="search-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, deadline: Optional[float] = None, **params) -> Future:
+        """
+        Queues one search; the returned future resolves to its result list.
+        `deadline` is a `time.monotonic()` timestamp after which the search is no longer worth running.
+        """
+        future: Future = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("SearchBatcher is closed"))
+            return future
+        self._queue.put((dict(params, query=query), future, deadline))
+        return future
+
+    def _collect(self) -> List[Tuple[Dict, Future, Optional[float]]]:
+        item = self._queue.get()
+        if item is None:
+            return []
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None) # Let the run loop see the shutdown after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            batch = self._admit(batch)
+            if not batch:
+                continue
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+            try:
+                results = self.engine.search_many([request for request, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _admit(self, batch: List[Tuple[Dict, Future, Optional[float]]]) -> List[Tuple[Dict, Future]]:
+        """
+        Drops cancelled requests and fails expired ones; returns the rest as (request, future).
+        """
+        now = time.monotonic()
+        admitted = []
+        for request, future, deadline in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if deadline is not None and now > deadline:
+                future.set_exception(DeadlineExceeded("Search deadline passed while queued"))
+                with self._lock:
+                    self._expired += 1
+                continue
+            admitted.append((request, future))
+        return admitted
+
+    def stats(self) -> Dict:
+        """
+        Batch-size histogram ({size: number of batches}) and totals.
+        """
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "batches": batches,
+                "requests": self._requests,
+                "expired": self._expired,
+                "mean_batch_size": self._requests / batches if batches else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,515 @@
+import json
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.config import BM25_BUILD_BATCH_DOCS
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenizer shared by indexing and querying: lowercase, split on single spaces.
+    """
+    return text.lower().split(" ")
+
+
+class SortedVocab:
+    """
+    Term dictionary stored as a UTF-8 arena of sorted terms plus an offsets array.
+    Both arrays can be memory-mapped; lookups are a binary search, so opening the
+    vocabulary does not require building a Python dict of every term.
+    """
+    def __init__(self, arena: np.ndarray, offsets: np.ndarray):
+        self.arena = arena
+        self.offsets = offsets
+
+    @classmethod
+    def from_terms(cls, sorted_terms: List[str]) -> "SortedVocab":
+        encoded = [t.encode("utf-8") for t in sorted_terms]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(t) for t in encoded])
+        arena = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+        return cls(arena, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def term(self, term_id: int) -> str:
+        return self.arena[self.offsets[term_id]:self.offsets[term_id + 1]].tobytes().decode("utf-8")
+
+    def lookup(self, term: str) -> Optional[int]:
+        target = term.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self.arena[self.offsets[mid]:self.offsets[mid + 1]].tobytes()
+            if current < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self.arena[self.offsets[lo]:self.offsets[lo + 1]].tobytes() == target:
+            return lo
+        return None
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a precomputed inverted index (CSR postings keyed by term id).
+
+    Scores match `rank_bm25.BM25Okapi` with the same parameters, including its
+    epsilon floor for negative idf values, but only postings of the query terms are
+    touched. `top_k` additionally uses per-term score upper bounds (MaxScore) to stop
+    admitting new documents once they can no longer reach the top k.
+    All arrays can be saved to and memory-mapped from a directory.
+    """
+    _ARRAYS = ("vocab_arena", "vocab_offsets", "indptr", "doc_ids", "tfs", "doc_len", "idf", "max_impact")
+
+    def __init__(self, vocab: SortedVocab, indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_len: np.ndarray, idf: np.ndarray, avgdl: float,
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+                 max_impact: Optional[np.ndarray] = None, n_docs: Optional[int] = None):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.idf = idf
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.n_docs = n_docs if n_docs is not None else len(doc_len) # Present documents (excludes absent ids)
+        self.max_impact = max_impact if max_impact is not None else self._compute_max_impact()
+
+    @property
+    def corpus_size(self) -> int:
+        """
+        Size of the doc id space (absent ids included).
+        """
+        return len(self.doc_len)
+
+    @classmethod
+    def from_corpus(cls, tokenized_corpus: Iterable[Optional[List[str]]], k1: float = 1.5, b: float = 0.75,
+                    epsilon: float = 0.25, batch_size: int = BM25_BUILD_BATCH_DOCS) -> "BM25Index":
+        """
+        Builds the index; doc ids are positions in `tokenized_corpus`.
+        `None` entries mark absent ids (e.g. deleted documents): they keep their id but do
+        not count towards the corpus statistics.
+        The corpus is consumed in batches of `batch_size` documents whose postings are packed
+        into arrays (see `_pack_postings`) and merged at the end, so only one batch at a time
+        is held in Python objects.
+        """
+        blocks = []
+        doc_len = []
+        n_docs = 0
+        postings: Dict[str, List] = {}
+        for doc_id, tokens in enumerate(tokenized_corpus):
+            if tokens is not None:
+                n_docs += 1
+                frequencies: Dict[str, int] = {}
+                for token in tokens:
+                    frequencies[token] = frequencies.get(token, 0) + 1
+                for token, freq in frequencies.items():
+                    postings.setdefault(token, []).append((doc_id, freq))
+            doc_len.append(0 if tokens is None else len(tokens))
+            if (doc_id + 1) % batch_size == 0:
+                blocks.append(cls._pack_postings(postings))
+                postings = {}
+        blocks.append(cls._pack_postings(postings))
+
+        # Blocks cover increasing doc ids, so appending them term by term keeps postings sorted
+        terms = sorted(set().union(*(block[0] for block in blocks)), key=lambda t: t.encode("utf-8"))
+        term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        block_term_ids = [np.array([term_ids[t] for t in block[0]], dtype=np.int64) for block in blocks]
+        doc_freqs = np.zeros(len(terms), dtype=np.int64)
+        for ids, (_, counts, _, _) in zip(block_term_ids, blocks):
+            doc_freqs[ids] += counts
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(doc_freqs)
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        tfs = np.empty(indptr[-1], dtype=np.float32)
+        cursor = indptr[:-1].copy()
+        for ids, (_, counts, block_doc_ids, block_tfs) in zip(block_term_ids, blocks):
+            starts = np.cumsum(counts) - counts
+            # Destination of each posting: its term's cursor plus its rank within the term
+            dest = np.repeat(cursor[ids] - starts, counts) + np.arange(len(block_doc_ids))
+            doc_ids[dest] = block_doc_ids
+            tfs[dest] = block_tfs
+            cursor[ids] += counts
+
+        doc_len = np.array(doc_len, dtype=np.float32)
+        avgdl = float(doc_len.sum(dtype=np.float64) / n_docs) if n_docs else 0.0
+        idf = cls._compute_idf(doc_freqs, n_docs, epsilon)
+        return cls(SortedVocab.from_terms(terms), indptr, doc_ids, tfs, doc_len, idf, avgdl, k1, b, epsilon,
+                   n_docs=n_docs)
+
+    @staticmethod
+    def _pack_postings(postings: Dict[str, List]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        One batch's term -> [(doc id, tf)] postings as (terms, postings per term, doc ids, tfs),
+        with the doc ids and tfs of each term stored contiguously in `terms` order.
+        """
+        terms = list(postings)
+        counts = np.array([len(postings[t]) for t in terms], dtype=np.int64)
+        pairs = np.array([pair for t in terms for pair in postings[t]], dtype=np.int64).reshape(-1, 2)
+        return terms, counts, pairs[:, 0].astype(np.int32), pairs[:, 1].astype(np.float32)
+
+    @staticmethod
+    def _compute_idf(doc_freqs: np.ndarray, corpus_size: int, epsilon: float) -> np.ndarray:
+        doc_freqs = doc_freqs.astype(np.float64)
+        idf = np.log(corpus_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * (idf.sum() / len(idf))
+        return idf
+
+    def _compute_max_impact(self) -> np.ndarray:
+        """
+        Highest score contribution of each term over its postings (MaxScore upper bounds).
+        """
+        if len(self.doc_ids) == 0:
+            return np.zeros(len(self.idf))
+        term_of_posting = np.repeat(np.arange(len(self.idf)), np.diff(self.indptr))
+        tf = self.tfs.astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[self.doc_ids].astype(np.float64) / self.avgdl)
+        partial = self.idf[term_of_posting] * (tf * (self.k1 + 1) / (tf + norm))
+        return np.maximum.reduceat(partial, self.indptr[:-1])
+
+    def _term_scores(self, term_id: int, idf: Optional[float] = None, avgdl: Optional[float] = None):
+        """
+        Returns (doc_ids, partial scores) for one term's postings.
+        `idf` and `avgdl` override the index's own statistics (see `top_k`).
+        """
+        idf = self.idf[term_id] if idf is None else idf
+        avgdl = self.avgdl if avgdl is None else avgdl
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        docs = self.doc_ids[start:end]
+        tf = self.tfs[start:end].astype(np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs].astype(np.float64) / avgdl)
+        return docs, idf * (tf * (self.k1 + 1) / (tf + norm))
+
+    def _cached_term_scores(self, term_id: int, term_cache: Optional[Dict], idf: Optional[float] = None,
+                            avgdl: Optional[float] = None):
+        if term_cache is None:
+            return self._term_scores(term_id, idf, avgdl)
+        if term_id not in term_cache:
+            term_cache[term_id] = self._term_scores(term_id)
+        return term_cache[term_id]
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """
+        Scores every document for a tokenized query (same output as BM25Okapi.get_scores).
+        """
+        scores = np.zeros(self.corpus_size)
+        for term in query:
+            term_id = self.vocab.lookup(term)
+            if term_id is None:
+                continue
+            docs, partial = self._term_scores(term_id)
+            scores[docs] += partial
+        return scores
+
+    def _term_scores_for(self, term_id: int, docs: np.ndarray, idf: Optional[float] = None,
+                         avgdl: Optional[float] = None) -> np.ndarray:
+        """
+        Partial scores of one term for the given sorted doc ids (0 where the term is absent).
+        Postings are sorted by doc id, so this is a binary search per candidate.
+        """
+        idf = self.idf[term_id] if idf is None else idf
+        avgdl = self.avgdl if avgdl is None else avgdl
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        postings = self.doc_ids[start:end]
+        pos = np.searchsorted(postings, docs)
+        found = pos < len(postings)
+        found[found] = postings[pos[found]] == docs[found]
+        scores = np.zeros(len(docs))
+        if found.any():
+            tf = self.tfs[start:end][pos[found]].astype(np.float64)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs[found]].astype(np.float64) / avgdl)
+            scores[found] = idf * (tf * (self.k1 + 1) / (tf + norm))
+        return scores
+
+    def _impact_bound(self, term_id: int, idf: float, avgdl: float) -> float:
+        """
+        Upper bound of one term's contribution when scored with `idf` and `avgdl` instead
+        of the index's statistics. A larger avgdl raises the tf part by at most the ratio of
+        the two averages, and the tf part never exceeds k1 + 1.
+        """
+        if self.idf[term_id] > 0:
+            tf_bound = float(self.max_impact[term_id]) / float(self.idf[term_id]) * max(1.0, avgdl / self.avgdl)
+            return idf * min(self.k1 + 1, tf_bound)
+        return idf * (self.k1 + 1)
+
+    def top_k(self, query: List[str], k: int, term_cache: Optional[Dict] = None,
+              idf: Optional[Dict[int, float]] = None, avgdl: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (doc_ids, scores) of the `k` highest-scoring documents, best first.
+        `term_cache` (term id -> postings scores) lets several queries share posting work.
+        `idf` (term id -> idf of the query's terms) and `avgdl` score with other corpus
+        statistics than the index's own, e.g. those of `LiveBM25`; they cannot be combined
+        with `term_cache`.
+
+        Only documents containing at least one query term are considered. Terms are
+        processed from the highest to the lowest upper bound; once the k-th best partial
+        score exceeds the sum of upper bounds of the remaining terms, unseen documents
+        cannot enter the top k, so remaining terms are only scored for current candidates.
+        """
+        weights: Dict[int, int] = {}
+        for term in query:
+            term_id = self.vocab.lookup(term)
+            if term_id is not None:
+                weights[term_id] = weights.get(term_id, 0) + 1 # Repeated terms count repeatedly, as in BM25Okapi
+        if not weights or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        if idf is None and avgdl is None:
+            term_idf = {t: None for t in weights}
+            impact = {t: float(self.max_impact[t]) for t in weights}
+            prunable = all(self.idf[t] >= 0 for t in weights)
+        else:
+            term_cache = None
+            avgdl = self.avgdl if avgdl is None else avgdl
+            term_idf = {t: float(self.idf[t]) if idf is None else idf[t] for t in weights}
+            impact = {t: self._impact_bound(t, term_idf[t], avgdl) for t in weights}
+            prunable = all(v >= 0 for v in term_idf.values())
+        terms = sorted(weights, key=lambda t: weights[t] * impact[t], reverse=True)
+        bounds = [weights[t] * impact[t] for t in terms]
+        # Upper bounds only hold when no contribution can be negative
+        remaining = sum(bounds)
+        # Long posting lists are cheaper to accumulate into a dense buffer than to merge
+        postings = sum(int(self.indptr[t + 1] - self.indptr[t]) for t in terms)
+        dense = np.zeros(self.corpus_size) if postings * 16 > self.corpus_size else None
+
+        docs = np.zeros(0, dtype=np.int64)
+        scores = np.zeros(0)
+        candidates_only = False
+        for term_id, bound in zip(terms, bounds):
+            remaining -= bound
+            if candidates_only:
+                if len(docs) * 8 < self.indptr[term_id + 1] - self.indptr[term_id]:
+                    scores += weights[term_id] * self._term_scores_for(term_id, docs, term_idf[term_id], avgdl)
+                else:
+                    # Too many candidates for per-candidate binary searches: scatter the postings
+                    term_docs, partial = self._cached_term_scores(term_id, term_cache, term_idf[term_id], avgdl)
+                    scratch = np.zeros(self.corpus_size)
+                    scratch[term_docs] = partial
+                    scores += weights[term_id] * scratch[docs]
+                continue
+
+            term_docs, partial = self._cached_term_scores(term_id, term_cache, term_idf[term_id], avgdl)
+            if dense is not None:
+                dense[term_docs] += weights[term_id] * partial
+                # Any k candidates give a lower bound on the final k-th best score
+                seen = dense[term_docs]
+            else:
+                docs, inverse = np.unique(np.concatenate([docs, term_docs]), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate([scores, weights[term_id] * partial]),
+                                     minlength=len(docs))
+                seen = scores
+
+            if prunable and len(seen) >= k:
+                threshold = np.partition(seen, len(seen) - k)[len(seen) - k]
+                if threshold > remaining:
+                    candidates_only = True
+                    if dense is not None:
+                        docs = np.flatnonzero(dense)
+                        scores = dense[docs]
+                        dense = None
+                    keep = scores + remaining >= threshold
+                    docs, scores = docs[keep], scores[keep]
+
+        if dense is not None:
+            docs = np.flatnonzero(dense)
+            scores = dense[docs]
+        if len(docs) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return docs[order], scores[order]
+
+    def top_k_batch(self, queries: List[List[str]], k) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        `top_k` for several tokenized queries. Postings of terms shared between queries
+        are decoded and scored once for the whole batch. `k` is an int or one value per query.
+        """
+        ks = [k] * len(queries) if isinstance(k, int) else list(k)
+        term_cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        return [self.top_k(query, query_k, term_cache) for query, query_k in zip(queries, ks)]
+
+    def with_global_stats(self, corpus: "BM25Index") -> "BM25Index":
+        """
+        This index (one shard of `corpus`) scored with the whole corpus's statistics: each
+        term's idf (epsilon floor included) and the average document length. Shard scores
+        then equal the unsharded index's scores for the same documents.
+        """
+        term_ids = [corpus.vocab.lookup(self.vocab.term(t)) for t in range(len(self.vocab))]
+        if any(t is None for t in term_ids):
+            raise ValueError("Shard vocabulary is not a subset of the corpus vocabulary")
+        idf = np.asarray(corpus.idf, dtype=np.float64)[np.array(term_ids, dtype=np.int64)]
+        return BM25Index(self.vocab, self.indptr, self.doc_ids, self.tfs, self.doc_len, idf, corpus.avgdl,
+                         self.k1, self.b, self.epsilon, n_docs=self.n_docs)
+
+    def save(self, directory: Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "vocab_arena": self.vocab.arena, "vocab_offsets": self.vocab.offsets,
+            "indptr": self.indptr, "doc_ids": self.doc_ids, "tfs": self.tfs,
+            "doc_len": self.doc_len, "idf": self.idf, "max_impact": self.max_impact,
+        }
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", np.asarray(array))
+        params = {"avgdl": self.avgdl, "k1": self.k1, "b": self.b, "epsilon": self.epsilon, "n_docs": self.n_docs}
+        with open(directory / "params.json", "w") as f:
+            json.dump(params, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "BM25Index":
+        directory = Path(directory)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in cls._ARRAYS}
+        with open(directory / "params.json", "r") as f:
+            params = json.load(f)
+        vocab = SortedVocab(arrays["vocab_arena"], arrays["vocab_offsets"])
+        return cls(vocab, arrays["indptr"], arrays["doc_ids"], arrays["tfs"], arrays["doc_len"],
+                   arrays["idf"], params["avgdl"], params["k1"], params["b"], params["epsilon"],
+                   max_impact=arrays["max_impact"], n_docs=params.get("n_docs"))
+
+
+class LiveBM25:
+    """
+    Incrementally maintained BM25: an immutable `BM25Index` (main) plus an in-memory delta
+    of postings for documents added since it was built, and tombstones for main documents
+    that were deleted. Corpus statistics (document count, average length, document
+    frequencies) are kept up to date across both, so scores match a rebuilt index except
+    for the epsilon floor of negative idf values, which stays at the main index's value.
+
+    Queries always use `BM25Index.top_k` (MaxScore pruning) for the main index; with
+    pending changes it scores with the live statistics and returns enough extra documents
+    to drop tombstoned ones, and the few delta documents are scored separately and merged.
+    """
+    def __init__(self, main: BM25Index):
+        self.main = main
+        self.delta_postings: Dict[str, Dict[int, int]] = {}
+        self.delta_len: Dict[int, int] = {}
+        self.tombstones: Dict[int, float] = {} # Deleted main doc id -> its length
+        self.tombstone_df: Dict[int, int] = {} # Main term id -> deleted docs containing it
+        self._size = main.corpus_size
+        self._lock = threading.Lock()
+        self._idf_floor: Optional[float] = None
+
+    @property
+    def corpus_size(self) -> int:
+        return self._size
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.delta_len or self.tombstones)
+
+    def add(self, doc_id: int, tokens: List[str]):
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        with self._lock:
+            for token, freq in frequencies.items():
+                self.delta_postings.setdefault(token, {})[doc_id] = freq
+            self.delta_len[doc_id] = len(tokens)
+            self._size = max(self._size, doc_id + 1)
+
+    def remove(self, doc_id: int, tokens: List[str]):
+        """
+        Removes a document; `tokens` must be the tokens it was indexed with.
+        """
+        with self._lock:
+            if doc_id in self.delta_len:
+                del self.delta_len[doc_id]
+                for token in set(tokens):
+                    postings = self.delta_postings.get(token)
+                    if postings is not None:
+                        postings.pop(doc_id, None)
+                        if not postings:
+                            del self.delta_postings[token]
+                return
+            if doc_id >= self.main.corpus_size or doc_id in self.tombstones:
+                return
+            self.tombstones[doc_id] = float(self.main.doc_len[doc_id])
+            for token in set(tokens):
+                term_id = self.main.vocab.lookup(token)
+                if term_id is not None:
+                    self.tombstone_df[term_id] = self.tombstone_df.get(term_id, 0) + 1
+
+    def _stats(self) -> Tuple[int, float]:
+        n_docs = self.main.n_docs - len(self.tombstones) + len(self.delta_len)
+        total = self.main.avgdl * self.main.n_docs - sum(self.tombstones.values()) + sum(self.delta_len.values())
+        return n_docs, (total / n_docs if n_docs else 0.0)
+
+    def _floor(self) -> float:
+        if self._idf_floor is None:
+            doc_freqs = np.diff(self.main.indptr).astype(np.float64)
+            raw = np.log(self.main.n_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+            self._idf_floor = self.main.epsilon * float(raw.mean()) if len(raw) else 0.0
+        return self._idf_floor
+
+    def top_k(self, query: List[str], k: int, term_cache: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.has_changes:
+            return self.main.top_k(query, k, term_cache)
+        weights: Dict[str, int] = {}
+        for term in query:
+            weights[term] = weights.get(term, 0) + 1
+
+        main, k1, b = self.main, self.main.k1, self.main.b
+        with self._lock:
+            n_docs, avgdl = self._stats()
+            if not n_docs or k <= 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0)
+            # Live idf of every query term, over the main index (minus tombstones) and the delta
+            main_idf: Dict[int, float] = {}
+            delta_idf: Dict[str, float] = {}
+            for term in weights:
+                term_id = main.vocab.lookup(term)
+                delta = self.delta_postings.get(term, {})
+                df = len(delta)
+                if term_id is not None:
+                    df += int(main.indptr[term_id + 1] - main.indptr[term_id]) - self.tombstone_df.get(term_id, 0)
+                if df == 0:
+                    continue
+                idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+                if idf < 0:
+                    idf = self._floor()
+                if term_id is not None:
+                    main_idf[term_id] = float(idf)
+                if delta:
+                    delta_idf[term] = float(idf)
+
+            # Main documents: pruned top-k with the live statistics, deep enough to drop tombstones
+            main_query = [term for term in query if main.vocab.lookup(term) in main_idf]
+            docs, scores = main.top_k(main_query, k + len(self.tombstones), idf=main_idf, avgdl=avgdl)
+            if self.tombstones:
+                live = ~np.isin(docs, np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones)))
+                docs, scores = docs[live], scores[live]
+
+            # Delta documents (ids disjoint from the main index): scored exhaustively, there are few
+            delta_docs, delta_scores = [], []
+            for term, idf in delta_idf.items():
+                delta = self.delta_postings[term]
+                term_docs = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+                tf = np.fromiter(delta.values(), dtype=np.float64, count=len(delta))
+                lengths = np.fromiter((self.delta_len[d] for d in delta), dtype=np.float64, count=len(delta))
+                norm = k1 * (1 - b + b * lengths / avgdl)
+                delta_docs.append(term_docs)
+                delta_scores.append(weights[term] * idf * (tf * (k1 + 1) / (tf + norm)))
+        if delta_docs:
+            added, inverse = np.unique(np.concatenate(delta_docs), return_inverse=True)
+            added_scores = np.bincount(inverse, weights=np.concatenate(delta_scores), minlength=len(added))
+            docs = np.concatenate([np.asarray(docs, dtype=np.int64), added])
+            scores = np.concatenate([scores, added_scores])
+        if len(docs) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return docs[order], scores[order]
+
+    def top_k_batch(self, queries: List[List[str]], k) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not self.has_changes:
+            return self.main.top_k_batch(queries, k)
+        ks = [k] * len(queries) if isinstance(k, int) else list(k)
+        return [self.top_k(query, query_k) for query, query_k in zip(queries, ks)]
@@ -0,0 +1,362 @@
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# File header: magic, format version, embedding dimension
+_FILE_HEADER = struct.Struct("<4sHI")
+_MAGIC = b"QCLG"
+_VERSION = 1
+# Record header: op, key, embedding byte length, payload byte length, crc32(embedding + payload)
+_RECORD_HEADER = struct.Struct("<BqIII")
+
+OP_ADD = 1
+OP_DELETE = 2
+
+LogRecord = Tuple[int, int, Optional[np.ndarray], Optional[Dict]]
+
+
+def encode_record(op: int, key: int, embedding: Optional[np.ndarray] = None,
+                  payload: Optional[Dict] = None) -> bytes:
+    emb_bytes = b"" if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+    payload_bytes = b"" if payload is None else json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    crc = zlib.crc32(emb_bytes + payload_bytes)
+    return _RECORD_HEADER.pack(op, key, len(emb_bytes), len(payload_bytes), crc) + emb_bytes + payload_bytes
+
+
+def decode_record(record: bytes) -> LogRecord:
+    """
+    Inverse of `encode_record`. Raises ValueError if the record is truncated or corrupt.
+    """
+    op, key, emb_len, payload_len, crc = _RECORD_HEADER.unpack_from(record)
+    body = record[_RECORD_HEADER.size:]
+    if len(body) != emb_len + payload_len or zlib.crc32(body) != crc:
+        raise ValueError("Corrupt cache record")
+    embedding = np.frombuffer(body[:emb_len], dtype=np.float32) if emb_len else None
+    payload = json.loads(body[emb_len:].decode("utf-8")) if payload_len else None
+    return op, key, embedding, payload
+
+
+class AppendOnlyLog:
+    """
+    Append-only binary log of cache records (float32 embeddings + compact JSON payloads).
+
+    Appends are handed to a background writer thread so callers never block on disk I/O.
+    Compaction rewrites the live records to a temporary file and atomically swaps it in.
+    On open, a torn or corrupt tail (e.g. after a crash mid-write) is detected via the
+    per-record CRC and truncated, keeping every record written before it.
+    """
+    shared = False # Only this process writes the log
+
+    def __init__(self, path: Path, dim: int, name: str = "Query cache log"):
+        self.path = Path(path)
+        self.dim = dim
+        self.name = name
+        self.records_written = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ----- Recovery -----
+
+    def replay(self) -> Iterable[LogRecord]:
+        """
+        Yields (op, key, embedding, payload) for every intact record and truncates
+        anything after the last intact record.
+        """
+        if not self.path.exists():
+            return
+        good_offset = 0
+        with open(self.path, "rb") as f:
+            header = f.read(_FILE_HEADER.size)
+            if len(header) == _FILE_HEADER.size:
+                magic, version, dim = _FILE_HEADER.unpack(header)
+                if magic != _MAGIC or version != _VERSION or dim != self.dim:
+                    print(f"{self.name} {self.path} has an incompatible header. Starting fresh.")
+                    f.close()
+                    self.path.unlink()
+                    return
+                good_offset = f.tell()
+                while True:
+                    record_header = f.read(_RECORD_HEADER.size)
+                    if len(record_header) < _RECORD_HEADER.size:
+                        break
+                    op, key, emb_len, payload_len, crc = _RECORD_HEADER.unpack(record_header)
+                    body = f.read(emb_len + payload_len)
+                    if len(body) < emb_len + payload_len or zlib.crc32(body) != crc:
+                        break
+                    embedding = np.frombuffer(body[:emb_len], dtype=np.float32) if emb_len else None
+                    payload = json.loads(body[emb_len:].decode("utf-8")) if payload_len else None
+                    good_offset = f.tell()
+                    self.records_written += 1
+                    yield op, key, embedding, payload
+        if good_offset < self.path.stat().st_size:
+            print(f"{self.name} {self.path} had a torn tail. Truncating to {good_offset} bytes.")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_offset)
+
+    # ----- Writes -----
+
+    def _open_for_append(self):
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "ab")
+        if new_file:
+            self._file.write(_FILE_HEADER.pack(_MAGIC, _VERSION, self.dim))
+            self._file.flush()
+
+    def start(self):
+        """
+        Opens the log for appending and starts the background writer.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._open_for_append()
+        self._thread = threading.Thread(target=self._run, name=self.name.lower().replace(" ", "-"), daemon=True)
+        self._thread.start()
+
+    def append(self, record: bytes):
+        self._queue.put(("append", record))
+
+    def compact(self, snapshot: Callable[[], List[bytes]]):
+        """
+        Schedules a rewrite of the log containing only the records returned by `snapshot`.
+        `snapshot` is called on the writer thread after every earlier append has landed.
+        """
+        self._queue.put(("compact", snapshot))
+
+    def flush(self):
+        """
+        Blocks until every queued write has reached the file.
+        """
+        self._queue.join()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(("stop", None))
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            kind, item = self._queue.get()
+            try:
+                if kind == "append":
+                    self._file.write(item)
+                    self.records_written += 1
+                    # Batch flushes: only flush once the queue has drained
+                    if self._queue.empty():
+                        self._file.flush()
+                elif kind == "compact":
+                    self._file.flush()
+                    self._rewrite(item())
+                elif kind == "stop":
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._file.close()
+                    return
+            except Exception as e:
+                print(f"{self.name} write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _rewrite(self, records: List[bytes]):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_FILE_HEADER.pack(_MAGIC, _VERSION, self.dim))
+            for record in records:
+                f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self.records_written = len(records)
+        self._open_for_append()
+
+
+class SharedLog:
+    """
+    Cache records in a SQLite database (WAL mode) shared by every process serving the
+    same cache, e.g. uvicorn/gunicorn workers, so each one benefits from the others' misses.
+
+    Same interface as `AppendOnlyLog` (appends go through a background writer), plus
+    `poll()`, which returns the records other processes wrote since the last call.
+    Records are stored exactly as `encode_record` produces them. Keys must be unique
+    across processes. Compaction cannot rewrite the database from one process's view,
+    so it instead removes entries deleted more than `tombstone_seconds` ago, together
+    with their tombstones. A process that has not polled since then reloads everything.
+    It also drops the oldest stored entries beyond `max_entries`. Processes evict from
+    memory on their own (their hit statistics differ), so this is what bounds the store.
+    """
+    shared = True
+
+    def __init__(self, path: Path, dim: int, name: str = "Shared query cache", tombstone_seconds: float = 300.0,
+                 max_entries: Optional[int] = None):
+        self.path = Path(path)
+        self.dim = dim
+        self.name = name
+        self.tombstone_seconds = tombstone_seconds
+        self.max_entries = max_entries
+        self.records_written = 0
+        self.origin = secrets.token_hex(8) # Identifies this process's own records
+        self._position = 0 # Highest sequence number already applied
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._reader = self._connect()
+        with self._reader:
+            self._reader.execute("CREATE TABLE IF NOT EXISTS records (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                 "op INTEGER, key INTEGER, origin TEXT, written_at REAL, record BLOB)")
+            self._reader.execute("CREATE INDEX IF NOT EXISTS records_key ON records (key, seq)")
+            self._reader.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+            self._reader.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?), ('swept_through', 0)", (dim,))
+        stored_dim = self._meta("dim")
+        if stored_dim != dim:
+            raise ValueError(f"{self.name} {self.path} holds {stored_dim}-dimensional embeddings, expected {dim}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _meta(self, name: str):
+        return self._reader.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    def _read_since(self, position: int, skip_own: bool) -> List[LogRecord]:
+        records = []
+        rows = self._reader.execute("SELECT seq, origin, record FROM records WHERE seq > ? ORDER BY seq", (position,))
+        for seq, origin, record in rows:
+            self._position = seq
+            if skip_own and origin == self.origin:
+                continue
+            try:
+                records.append(decode_record(record))
+            except ValueError:
+                print(f"{self.name} {self.path}: skipping corrupt record {seq}")
+        return records
+
+    # ----- Recovery -----
+
+    def replay(self) -> Iterable[LogRecord]:
+        """
+        Yields every stored record in write order.
+        """
+        self._position = 0
+        records = self._read_since(0, skip_own=False)
+        self.records_written = len(records)
+        yield from records
+
+    def poll(self) -> Tuple[List[LogRecord], bool]:
+        """
+        Returns (records written by other processes since the last call, reset).
+        `reset` means records this process never saw were compacted away: the returned
+        records are then the complete contents and in-memory state must be rebuilt from them.
+        """
+        if self._meta("swept_through") > self._position:
+            return list(self.replay()), True
+        records = self._read_since(self._position, skip_own=True)
+        self.records_written += len(records)
+        return records, False
+
+    # ----- Writes -----
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name.lower().replace(" ", "-"), daemon=True)
+        self._thread.start()
+
+    def append(self, record: bytes):
+        self._queue.put(("append", record))
+
+    def compact(self, snapshot: Callable[[], List[bytes]]):
+        """
+        Schedules removal of old tombstones and the records they delete.
+        `snapshot` is ignored: other processes' entries must survive.
+        """
+        self._queue.put(("compact", None))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(("stop", None))
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        writer = self._connect()
+        while True:
+            items = [self._queue.get()]
+            # Drain whatever else is queued so consecutive appends share one transaction
+            while len(items) < 1024:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = []
+            stop = False
+            try:
+                for kind, item in items:
+                    if kind == "append":
+                        records.append(item)
+                        continue
+                    if records:
+                        self._insert(writer, records)
+                        records = []
+                    if kind == "compact":
+                        self._sweep(writer)
+                    elif kind == "stop":
+                        stop = True
+                if records:
+                    self._insert(writer, records)
+            except Exception as e:
+                print(f"{self.name} write failed: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                writer.close()
+                return
+
+    def _insert(self, writer: sqlite3.Connection, records: List[bytes]):
+        now = time.time()
+        rows = [(*_RECORD_HEADER.unpack_from(r)[:2], self.origin, now, r) for r in records]
+        with writer:
+            writer.execute("BEGIN IMMEDIATE")
+            writer.executemany("INSERT INTO records (op, key, origin, written_at, record) VALUES (?, ?, ?, ?, ?)", rows)
+        self.records_written += len(rows)
+
+    def _sweep(self, writer: sqlite3.Connection):
+        cutoff_time = time.time() - self.tombstone_seconds
+        with writer:
+            writer.execute("BEGIN IMMEDIATE")
+            cutoff = writer.execute("SELECT MAX(seq) FROM records WHERE written_at <= ?", (cutoff_time,)).fetchone()[0]
+            if cutoff is not None:
+                # Every record of a key up to its last tombstone before the cutoff is dead
+                writer.execute(
+                    "DELETE FROM records WHERE seq <= (SELECT MAX(d.seq) FROM records d "
+                    "WHERE d.key = records.key AND d.op = ? AND d.seq <= ?)", (OP_DELETE, cutoff))
+                writer.execute("UPDATE meta SET value = MAX(value, ?) WHERE name = 'swept_through'", (cutoff,))
+            if self.max_entries is not None:
+                self._trim(writer)
+        self.records_written = writer.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _trim(self, writer: sqlite3.Connection):
+        """
+        Drops the oldest live entries beyond `max_entries`, without tombstones: processes
+        that already loaded them keep them until they evict them, later loads skip them.
+        """
+        live = ("SELECT key FROM records r WHERE op = ? AND NOT EXISTS "
+                "(SELECT 1 FROM records d WHERE d.key = r.key AND d.seq > r.seq)")
+        excess = writer.execute(f"SELECT COUNT(*) FROM ({live})", (OP_ADD,)).fetchone()[0] - self.max_entries
+        if excess > 0:
+            writer.execute(f"DELETE FROM records WHERE key IN ({live} ORDER BY seq LIMIT ?)", (OP_ADD, excess))
@@ -4,28 +4,213 @@ import os
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
-from src.config import CACHE_DIR
+from src.config import CACHE_DIR, EMBEDDING_CACHE_BACKEND, EMBEDDING_CACHE_DTYPE, EMBEDDING_MODEL_NAME
+from src.core.inference import model_fingerprint
+
+# Sorted on "key" so lookups are a binary search over the memory-mapped array
+_INDEX_DTYPE = np.dtype([("key", "S16"), ("hash", "S16"), ("row", "<i8")])
+# Version 2: keys include the model fingerprint (see `CacheManager`)
+_STORE_VERSION = 2
+# Entries of JSON caches written before keys carried a model were all computed with PyTorch
+_LEGACY_MODEL = model_fingerprint(EMBEDDING_MODEL_NAME, "torch")
+
+
+class MmapEmbeddingStore:
+    """
+    Binary embedding cache: a sorted key -> (content hash, row) index plus a memory-mapped
+    float32/float16 matrix. Opening it maps both files instead of parsing them, so load time
+    does not depend on the number of cached embeddings.
+
+    Files (all share `base_path`):
+    - `<base>.meta.json`: dim, dtype, number of rows and the free-row list.
+    - `<base>.index.npy`: structured array of (md5(key), md5(content), row), sorted by key.
+    - `<base>.matrix`: raw row-major matrix with capacity >= rows.
+
+    Rows referenced by the saved index are never overwritten before the next `save`, so a
+    crash between writes and `save` leaves the previous state intact. Updates to such rows
+    are written to a fresh row and the old one is recycled after the next save.
+    """
+    def __init__(self, base_path: Path, dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.base_path = Path(base_path)
+        self.meta_path = self.base_path.with_name(self.base_path.name + ".meta.json")
+        self.index_path = self.base_path.with_name(self.base_path.name + ".index.npy")
+        self.matrix_path = self.base_path.with_name(self.base_path.name + ".matrix")
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self.matrix: Optional[np.memmap] = None
+        self.index = np.zeros(0, dtype=_INDEX_DTYPE)
+        self.overlay: Dict[bytes, Tuple[bytes, int]] = {} # Entries changed since the last save
+        self._free_rows: List[int] = [] # Rows safe to reuse now
+        self._pending_free: List[int] = [] # Rows that become reusable once the index is saved
+        self._load()
+
+    @staticmethod
+    def _key(name: str) -> bytes:
+        return hashlib.md5(name.encode("utf-8")).digest()
+
+    def exists(self) -> bool:
+        return self.meta_path.exists() and self.index_path.exists() and self.matrix_path.exists()
+
+    def _load(self):
+        if not self.exists():
+            return
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("version", 1) != _STORE_VERSION:
+            # Keys of older stores do not say which model computed them; they cannot be reused
+            print(f"Embedding cache {self.base_path} predates model-aware keys. Starting fresh.")
+            return
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.rows = meta["rows"]
+        self._free_rows = list(meta.get("free_rows", []))
+        self.index = np.load(self.index_path, mmap_mode="r")
+        self._map(max(self.rows, 1))
+
+    def _map(self, capacity: int):
+        """
+        (Re)maps the matrix file, growing it to hold at least `capacity` rows.
+        """
+        row_bytes = self.dim * self.dtype.itemsize
+        needed = capacity * row_bytes
+        if not self.matrix_path.exists() or self.matrix_path.stat().st_size < needed:
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(needed)
+        size = self.matrix_path.stat().st_size // row_bytes
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.matrix = np.memmap(self.matrix_path, dtype=self.dtype, mode="r+", shape=(size, self.dim))
+
+    def _lookup(self, key: bytes) -> Optional[Tuple[bytes, int]]:
+        if key in self.overlay:
+            return self.overlay[key]
+        pos = int(np.searchsorted(self.index["key"], key))
+        # "S16" values come back without trailing NUL bytes; pad them to the digest length
+        if pos < len(self.index) and bytes(self.index["key"][pos]).ljust(16, b"\0") == key:
+            return bytes(self.index["hash"][pos]).ljust(16, b"\0"), int(self.index["row"][pos])
+        return None
+
+    def get(self, name: str, content_hash: str) -> Optional[np.ndarray]:
+        found = self._lookup(self._key(name))
+        if found is None or found[0] != bytes.fromhex(content_hash):
+            return None
+        return np.asarray(self.matrix[found[1]], dtype=np.float32)
+
+    def _allocate_row(self) -> int:
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self.rows >= self.matrix.shape[0]:
+            self._map(self.matrix.shape[0] * 2)
+        self.rows += 1
+        return self.rows - 1
+
+    def put(self, name: str, content_hash: str, embedding: np.ndarray):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if self.dim is None:
+            self.dim = embedding.shape[0]
+            self._map(1024)
+        key = self._key(name)
+        existing = self._lookup(key)
+        if key in self.overlay:
+            row = existing[1] # Row written since the last save: safe to update in place
+        else:
+            row = self._allocate_row()
+            if existing is not None:
+                self._pending_free.append(existing[1])
+        self.matrix[row] = embedding
+        self.overlay[key] = (bytes.fromhex(content_hash), row)
+
+    def save(self):
+        if self.matrix is None:
+            return
+        self.matrix.flush()
+        if self.overlay:
+            keys = np.array(list(self.overlay.keys()), dtype="S16")
+            base = np.asarray(self.index)[~np.isin(self.index["key"], keys)]
+            added = np.zeros(len(self.overlay), dtype=_INDEX_DTYPE)
+            added["key"] = keys
+            added["hash"] = [h for h, _ in self.overlay.values()]
+            added["row"] = [r for _, r in self.overlay.values()]
+            merged = np.concatenate([base, added])
+            merged.sort(order="key")
+            tmp_index = self.index_path.with_name(self.index_path.name + ".tmp.npy")
+            np.save(tmp_index, merged)
+            os.replace(tmp_index, self.index_path)
+            self.index = np.load(self.index_path, mmap_mode="r")
+            self.overlay = {}
+        self._free_rows.extend(self._pending_free)
+        self._pending_free = []
+        meta = {"version": _STORE_VERSION, "dim": self.dim, "dtype": self.dtype.name, "rows": self.rows,
+                "free_rows": self._free_rows}
+        tmp_meta = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self.meta_path)
+
+    def __len__(self) -> int:
+        if not self.overlay:
+            return len(self.index)
+        keys = np.array(list(self.overlay.keys()), dtype="S16")
+        return len(self.index) + int((~np.isin(keys, self.index["key"])).sum())
+
 
 class CacheManager:
-    def __init__(self, cache_file: str = "embeddings_cache.json"):
-        self.cache_path = CACHE_DIR / cache_file
-        self.cache = self._load_cache()
+    """
+    Chunk embeddings keyed by (model fingerprint, chunk name), validated by a content hash.
+    The fingerprint (see `model_fingerprint`) names the model and inference backend, so
+    switching either re-embeds instead of mixing vectors from different models.
+    """
+    def __init__(self, cache_file: str = "embeddings_cache.json", backend: str = EMBEDDING_CACHE_BACKEND,
+                 cache_dir: Path = CACHE_DIR, model: Optional[str] = None):
+        self.cache_path = Path(cache_dir) / cache_file
+        self.backend = backend
+        self.model = model or model_fingerprint(EMBEDDING_MODEL_NAME)
+        if backend == "binary":
+            self.store = MmapEmbeddingStore(self.cache_path.with_suffix(""))
+            self.cache = {}
+            if not self.store.exists() and self.cache_path.exists():
+                self._migrate_json()
+        elif backend == "json":
+            self.store = None
+            self.cache = self._load_cache()
+        else:
+            raise ValueError(f"Unknown embedding cache backend: {backend}")
 
     def _load_cache(self) -> Dict:
         if self.cache_path.exists():
             try:
                 with open(self.cache_path, "r") as f:
-                    return json.load(f)
+                    cache = json.load(f)
+                # Names without a model prefix come from before keys carried one
+                return {name if "\0" in name else f"{_LEGACY_MODEL}\0{name}": entry for name, entry in cache.items()}
             except json.JSONDecodeError:
                 print("Cache file corrupted. Starting fresh.")
                 return {}
         return {}
 
+    def _migrate_json(self):
+        """
+        One-time import of the legacy JSON cache into the binary store.
+        """
+        legacy = self._load_cache()
+        print(f"Migrating {len(legacy)} embeddings from {self.cache_path} to the binary cache...")
+        for name, entry in legacy.items():
+            self.store.put(name, entry["hash"], np.array(entry["embedding"], dtype=np.float32))
+        self.store.save()
+
     def save_cache(self):
+        if self.store is not None:
+            self.store.save()
+            print(f"Cache saved to {self.store.base_path}.*")
+            return
         with open(self.cache_path, "w") as f:
             json.dump(self.cache, f)
         print(f"Cache saved to {self.cache_path}")
 
+    def _name(self, filename: str) -> str:
+        return f"{self.model}\0{filename}"
+
     def compute_hash(self, text: str) -> str:
         return hashlib.md5(text.encode("utf-8")).hexdigest()
 
@@ -34,8 +219,11 @@ class CacheManager:
         Retrieves embedding if file exists and hash matches.
         """
         current_hash = self.compute_hash(text)
-        if filename in self.cache:
-            entry = self.cache[filename]
+        name = self._name(filename)
+        if self.store is not None:
+            return self.store.get(name, current_hash)
+        if name in self.cache:
+            entry = self.cache[name]
             if entry["hash"] == current_hash:
                 return np.array(entry["embedding"])
         return None
@@ -44,7 +232,10 @@ class CacheManager:
         """
         Updates the cache with new hash and embedding.
         """
-        self.cache[filename] = {
+        if self.store is not None:
+            self.store.put(self._name(filename), self.compute_hash(text), embedding)
+            return
+        self.cache[self._name(filename)] = {
             "hash": self.compute_hash(text),
             "embedding": embedding.tolist()
         }
@@ -68,5 +259,5 @@ class CacheManager:
             else:
                 docs_to_embed.append(doc)
                 indices_to_embed.append(i)
-        
+
         return docs_to_embed, cached_embeddings, indices_to_embed
@@ -0,0 +1,325 @@
+import atexit
+import json
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from src.config import METADATA_FILE, METADATA_STORE_FILE, DOCUMENT_LOG_FILE, CORPUS_FILE, EMBEDDING_DIMENSION
+from src.core.cache_log import AppendOnlyLog, encode_record, OP_ADD, OP_DELETE
+from src.core.index_snapshot import file_checksum, stamp_matches
+from src.core.metadata_store import MetadataStore, content_hash, convert_json_metadata, read_source
+
+# First record of every document log: the corpus generation the log applies to
+OP_BASE = 3
+
+# (op, chunk id, embedding, chunk) with chunk = the added chunk, or the removed one for deletes
+Change = Tuple[int, int, Optional[np.ndarray], Optional[Dict]]
+
+
+def read_generation(corpus_path: Path = CORPUS_FILE, metadata_path: Path = METADATA_STORE_FILE) -> str:
+    """
+    Identifies the corpus written by ingest.py. Compaction keeps the generation, a
+    re-ingest replaces it, which tells live-update logs they no longer apply.
+    Corpora ingested before generations existed are identified by their metadata checksum
+    (that of the original metadata.json for stores converted from one).
+    """
+    corpus_path = Path(corpus_path)
+    if corpus_path.exists():
+        with open(corpus_path, "r") as f:
+            return json.load(f)["generation"]
+    if Path(metadata_path).exists():
+        source = read_source(metadata_path)
+        return "checksum:" + (source["checksum"] if source else file_checksum(metadata_path))
+    return "empty"
+
+
+def write_generation(generation: str, corpus_path: Path = CORPUS_FILE):
+    corpus_path = Path(corpus_path)
+    tmp_path = corpus_path.with_name(corpus_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"generation": generation}, f)
+    os.replace(tmp_path, corpus_path)
+
+
+class _Slots:
+    """
+    Every chunk slot at one point in time: base store rows, overridden by `overlay`
+    (chunks added since the base, and `None` for deleted ones).
+    """
+    def __init__(self, base: Optional[MetadataStore], overlay: Dict[int, Optional[Dict]], size: int):
+        self.base = base
+        self.overlay = overlay
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, doc_id: int) -> Optional[Dict]:
+        if doc_id in self.overlay:
+            return self.overlay[doc_id]
+        if self.base is not None and 0 <= doc_id < len(self.base):
+            return self.base[doc_id]
+        return None
+
+    def __iter__(self) -> Iterator[Optional[Dict]]:
+        return (self[doc_id] for doc_id in range(self.size))
+
+
+class DocumentStore:
+    """
+    Chunk metadata addressed by chunk id, which is the chunk's row in the metadata store and
+    `embeddings.npy` (the "base" written by ingest.py or the last compaction). The base is
+    memory-mapped (`MetadataStore`): rows are decoded when they are read, not at startup.
+
+    Chunks added or deleted since then are recorded in an append-only log (new chunk +
+    its embedding, or a tombstone), replayed on startup and kept in memory on top of the
+    base. Ids are never reused: a deleted chunk leaves a tombstone (`None`) in its slot,
+    and an updated document gets new chunk ids. Compaction folds the log into a new base
+    and truncates it.
+
+    A `legacy_path` metadata.json (the format before the store) is converted on first load,
+    and again whenever it changes, unless the store was written by ingest.py or compaction.
+    """
+    def __init__(self, metadata_path: Path = METADATA_STORE_FILE, log_path: Path = DOCUMENT_LOG_FILE,
+                 corpus_path: Path = CORPUS_FILE, dim: int = EMBEDDING_DIMENSION,
+                 legacy_path: Optional[Path] = METADATA_FILE):
+        self.metadata_path = Path(metadata_path)
+        self.corpus_path = Path(corpus_path)
+        if legacy_path is not None:
+            self._migrate(Path(legacy_path))
+        self.base = MetadataStore(self.metadata_path) if self.metadata_path.exists() else None
+        self.base_count = len(self.base) if self.base is not None else 0
+        self.generation = read_generation(self.corpus_path, self.metadata_path)
+
+        self.overlay: Dict[int, Optional[Dict]] = {} # Slots changed since the base: added chunks, None if deleted
+        self._size = self.base_count
+        self.embeddings: Dict[int, np.ndarray] = {} # Embeddings of chunks added since the base
+        self.removed: Dict[int, Dict] = {} # Base chunks deleted since the base, by id
+        self.added: Set[int] = set() # Live chunks added since the base
+        self._ops: List[Change] = [] # Changes since the base, in order
+        self._by_filename: Optional[Dict[str, List[int]]] = None # Built on first use
+        self._live = self.base.live_count() if self.base is not None else 0
+        self._lock = threading.RLock()
+
+        self._log = AppendOnlyLog(log_path, dim, name="Document log")
+        self._replay()
+        self._log.start()
+        atexit.register(self.close)
+        if self._log.records_written == 0:
+            self._log.append(self._base_record())
+
+    def _migrate(self, legacy_path: Path):
+        if not legacy_path.exists():
+            return
+        if self.metadata_path.exists():
+            source = read_source(self.metadata_path)
+            # Written by ingest.py/compaction, or already converted from this exact file
+            # (an unchanged size and mtime are trusted without reading the JSON)
+            if source is None or stamp_matches(legacy_path, source):
+                return
+        convert_json_metadata(legacy_path, self.metadata_path)
+
+    def _base_record(self) -> bytes:
+        return encode_record(OP_BASE, 0, payload={"generation": self.generation})
+
+    def _replay(self):
+        records = self._log.replay()
+        for op, key, embedding, payload in records:
+            if op == OP_BASE:
+                if payload["generation"] != self.generation:
+                    print(f"Document log {self._log.path} belongs to another corpus version. Discarding it.")
+                    records.close()
+                    self._log.path.unlink()
+                    self._log.records_written = 0
+                    return
+            elif op == OP_ADD:
+                self._apply_add(key, payload, embedding)
+            elif op == OP_DELETE:
+                self._apply_delete(key)
+        if self._ops:
+            print(f"Replayed {len(self._ops)} document changes from {self._log.path}")
+
+    def _filenames(self) -> Dict[str, List[int]]:
+        """
+        Live chunk ids by filename: the base's grouping with the overlay applied.
+        """
+        if self._by_filename is None:
+            by_filename = self.base.ids_by_filename() if self.base is not None else {}
+            for doc_id in sorted(self.overlay):
+                doc = self.overlay[doc_id]
+                if doc is not None:
+                    by_filename.setdefault(doc["filename"], []).append(doc_id)
+                elif doc_id in self.removed:
+                    self._unlink_filename(by_filename, self.removed[doc_id]["filename"], doc_id)
+            self._by_filename = by_filename
+        return self._by_filename
+
+    @staticmethod
+    def _unlink_filename(by_filename: Dict[str, List[int]], filename: str, doc_id: int):
+        ids = by_filename.get(filename, [])
+        if doc_id in ids:
+            ids.remove(doc_id)
+        if not ids:
+            by_filename.pop(filename, None)
+
+    def _apply_add(self, doc_id: int, doc: Dict, embedding: np.ndarray):
+        if self.is_live(doc_id):
+            return # Already part of the base (log replayed after an interrupted compaction)
+        self.overlay[doc_id] = doc
+        self._size = max(self._size, doc_id + 1)
+        self.embeddings[doc_id] = np.array(embedding, dtype=np.float32)
+        self.added.add(doc_id)
+        self._live += 1
+        if self._by_filename is not None:
+            self._by_filename.setdefault(doc["filename"], []).append(doc_id)
+        self._ops.append((OP_ADD, doc_id, self.embeddings[doc_id], doc))
+
+    def _apply_delete(self, doc_id: int) -> Optional[Dict]:
+        doc = self[doc_id]
+        if doc is None:
+            return None
+        self.overlay[doc_id] = None
+        self._live -= 1
+        self.embeddings.pop(doc_id, None)
+        if doc_id in self.added:
+            self.added.discard(doc_id)
+        else:
+            self.removed[doc_id] = doc
+        if self._by_filename is not None:
+            self._unlink_filename(self._by_filename, doc["filename"], doc_id)
+        self._ops.append((OP_DELETE, doc_id, None, doc))
+        return doc
+
+    # ----- Reads -----
+
+    def __getitem__(self, doc_id: int) -> Optional[Dict]:
+        """
+        Returns the chunk, or None if it was deleted.
+        """
+        if doc_id in self.overlay:
+            return self.overlay[doc_id]
+        if 0 <= doc_id < self.base_count:
+            return self.base[doc_id]
+        return None
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __iter__(self) -> Iterator[Optional[Dict]]:
+        return iter(_Slots(self.base, self.overlay, self._size))
+
+    def is_live(self, doc_id: int) -> bool:
+        """
+        Whether the chunk exists, without decoding it.
+        """
+        if doc_id in self.overlay:
+            return self.overlay[doc_id] is not None
+        return 0 <= doc_id < self.base_count and self.base.is_live(doc_id)
+
+    def base_document(self, doc_id: int) -> Optional[Dict]:
+        """
+        The chunk as stored in the base files (before logged changes).
+        """
+        if doc_id >= self.base_count:
+            return None
+        return self.removed[doc_id] if doc_id in self.removed else self.base[doc_id]
+
+    def ids_for(self, filename: str) -> List[int]:
+        with self._lock:
+            return list(self._filenames().get(filename, []))
+
+    def chunk_hash(self, doc_id: int) -> Optional[str]:
+        """
+        Content hash of a live chunk (read from the base store without decoding the chunk).
+        """
+        if doc_id in self.overlay:
+            doc = self.overlay[doc_id]
+            return None if doc is None else doc.get("hash") or content_hash(doc["content"])
+        if 0 <= doc_id < self.base_count:
+            return self.base.chunk_hash(doc_id)
+        return None
+
+    def find_chunk(self, chunk_hash: str) -> Optional[int]:
+        """
+        Id of a live chunk with the given content hash, if any (lowest id for duplicate content).
+        """
+        with self._lock:
+            if self.base is not None:
+                for doc_id in self.base.find(chunk_hash):
+                    if self.is_live(doc_id):
+                        return doc_id
+            added = [doc_id for doc_id in self.added if self.chunk_hash(doc_id) == chunk_hash]
+            return min(added) if added else None
+
+    @property
+    def pending_changes(self) -> int:
+        return len(self._ops)
+
+    # ----- Writes -----
+
+    def add(self, doc: Dict, embedding: np.ndarray) -> int:
+        with self._lock:
+            doc_id = self._size
+            self._apply_add(doc_id, doc, embedding)
+            self._log.append(encode_record(OP_ADD, doc_id, self.embeddings[doc_id], doc))
+            return doc_id
+
+    def delete(self, doc_id: int) -> Optional[Dict]:
+        """
+        Tombstones a chunk; returns the deleted chunk (None if it did not exist).
+        """
+        with self._lock:
+            doc = self._apply_delete(doc_id)
+            if doc is not None:
+                self._log.append(encode_record(OP_DELETE, doc_id))
+            return doc
+
+    # ----- Compaction -----
+
+    def begin_compaction(self) -> Tuple[_Slots, Dict[int, np.ndarray], int]:
+        """
+        Freezes the current state: (slots, embeddings added since the base, change marker).
+        """
+        with self._lock:
+            return _Slots(self.base, dict(self.overlay), self._size), dict(self.embeddings), len(self._ops)
+
+    def finish_compaction(self, marker: int, base_count: int) -> List[Change]:
+        """
+        Called once the state frozen by `begin_compaction` has been written as the new base.
+        Reopens the base store, and returns the changes made since then, which still have
+        to be applied on top of it, and rewrites the log to contain only those.
+        """
+        with self._lock:
+            tail = self._ops[marker:]
+            overlay = {}
+            self.embeddings, self.removed, self.added = {}, {}, set()
+            for op, doc_id, embedding, doc in tail:
+                if op == OP_ADD:
+                    overlay[doc_id] = doc
+                    self.embeddings[doc_id] = embedding
+                    self.added.add(doc_id)
+                else:
+                    overlay[doc_id] = None
+                    if doc_id in self.added:
+                        self.added.discard(doc_id)
+                        self.embeddings.pop(doc_id, None)
+                    else:
+                        self.removed[doc_id] = doc
+            # New base first: it agrees with the old overlay, so readers never see a missing chunk
+            self.base = MetadataStore(self.metadata_path)
+            self.base_count = base_count
+            self.overlay = overlay
+            self._ops = list(tail)
+            records = [self._base_record()] + [
+                encode_record(op, doc_id, embedding, doc) if op == OP_ADD else encode_record(op, doc_id)
+                for op, doc_id, embedding, doc in tail
+            ]
+            self._log.compact(lambda: records)
+            return tail
+
+    def flush(self):
+        self._log.flush()
+
+    def close(self):
+        self._log.close()
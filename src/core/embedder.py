@@ -1,22 +1,103 @@
-from typing import List
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from src.config import EMBEDDING_MODEL_NAME
+from src.config import EMBEDDING_MODEL_NAME, EMBEDDING_MEMO_MAX_ENTRIES, EMBEDDING_PROGRESS_BAR_MIN_TEXTS, INFERENCE_BACKEND
+from src.core.inference import load_embedding_model
+
+
+class EmbeddingMemo:
+    """
+    Thread-safe LRU of float32 embeddings keyed by (model name, md5 of the text).
+    """
+    def __init__(self, max_entries: int = EMBEDDING_MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> Tuple[str, bytes]:
+        return model_name, hashlib.md5(text.encode("utf-8")).digest()
+
+    def get(self, key: Tuple[str, bytes]):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: Tuple[str, bytes], vector: np.ndarray):
+        vector = np.array(vector, dtype=np.float32)
+        vector.flags.writeable = False # Shared between callers
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
 
 class Embedder:
-    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
-        print(f"Loading embedding model: {model_name}...")
-        self.model = SentenceTransformer(model_name)
-        print("Model loaded.")
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, memo: bool = False,
+                 memo_max_entries: int = EMBEDDING_MEMO_MAX_ENTRIES, model=None, backend: str = INFERENCE_BACKEND):
+        self.model_name = model_name
+        if model is None:
+            print(f"Loading embedding model: {model_name} ({backend})...")
+            model = load_embedding_model(model_name, backend)
+            print("Model loaded.")
+        self.model = model
+        # Opt-in memo of recent embeddings (query traffic repeats; ingestion has its own cache)
+        self.memo = EmbeddingMemo(memo_max_entries) if memo else None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        show_progress = len(texts) >= EMBEDDING_PROGRESS_BAR_MIN_TEXTS
+        if show_progress:
+            print(f"Generating embeddings for {len(texts)} documents...")
+        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=show_progress)
 
     def embed_documents(self, texts: List[str]) -> np.ndarray:
         """
         Generates embeddings for a list of texts.
         Returns a numpy array of shape (n_texts, embedding_dim).
+        With the memo enabled, only texts not embedded recently go through the model.
         """
         if not texts:
             return np.array([])
-        
-        print(f"Generating embeddings for {len(texts)} documents...")
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-        return embeddings
+        if self.memo is None:
+            return self._encode(texts)
+
+        keys = [EmbeddingMemo.key(self.model_name, text) for text in texts]
+        vectors = [self.memo.get(key) for key in keys]
+        # Each distinct missing text is encoded once, in one model call
+        missing: Dict[Tuple[str, bytes], str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            fresh = dict(zip(missing.keys(), encoded))
+            for key, vector in fresh.items():
+                self.memo.put(key, vector)
+            vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return np.stack(vectors).astype(np.float32)
+
+    def memo_stats(self) -> Dict:
+        if self.memo is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.memo.stats()}
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import faiss
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from src.config import (
+    SNAPSHOT_DIR,
+    SNAPSHOT_FORMAT_VERSION,
+    SNAPSHOT_MMAP,
+    SNAPSHOT_KEEP,
+    SNAPSHOT_VERIFY_SOURCES,
+)
+from src.core.bm25 import BM25Index
+from src.core.vector_index import configure_index, index_type_of
+
+_BLOCK_BYTES = 1024 * 1024
+_CURRENT_FILE = "CURRENT"
+
+
+def file_checksum(path: Path) -> str:
+    """
+    Hash of a whole file (and its size). Reads the file: only taken when files are written
+    (see `file_stamp`) or when a stamp cannot vouch for them.
+    """
+    path = Path(path)
+    digest = hashlib.blake2b(str(path.stat().st_size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(path: Path) -> Dict:
+    """
+    Identifies a file for `stamp_matches`: size, modification time and checksum.
+    Recorded by whoever writes a derived file (snapshot, shards, converted metadata).
+    """
+    stat = Path(path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "checksum": file_checksum(path)}
+
+
+def stamp_matches(path: Path, stamp: Union[Dict, str, None], verify: bool = SNAPSHOT_VERIFY_SOURCES) -> bool:
+    """
+    Whether `path` is still the file `stamp` was taken from. A file with the recorded size
+    and mtime is trusted without reading it, so the check does not grow with the file.
+    Otherwise (e.g. the file was copied), or with `verify`, it is rehashed. Bare checksum
+    strings (stamps from older versions) are always compared by rehashing.
+    """
+    path = Path(path)
+    if stamp is None or not path.exists():
+        return False
+    if isinstance(stamp, str):
+        return file_checksum(path) == stamp
+    stat = path.stat()
+    if "size" in stamp and stat.st_size != stamp["size"]:
+        return False
+    if stat.st_mtime_ns == stamp.get("mtime_ns") and not verify:
+        return True
+    return file_checksum(path) == stamp["checksum"]
+
+
+def write_snapshot(index: faiss.Index, bm25: BM25Index, sources: List[Path],
+                   snapshot_dir: Path = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP) -> Path:
+    """
+    Writes a new snapshot version and atomically points CURRENT at it.
+    Readers that already opened an older version keep using it undisturbed.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    now_us = time.time_ns() // 1000
+    version = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now_us / 1e6)) + f"-{now_us % 1_000_000:06d}"
+    target = snapshot_dir / f"v{version}"
+    tmp_target = snapshot_dir / f".tmp-v{version}"
+    tmp_target.mkdir()
+
+    faiss.write_index(index, str(tmp_target / "index.faiss"))
+    bm25.save(tmp_target / "bm25")
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "version": version,
+        "created_at": time.time(),
+        "index_type": index_type_of(index),
+        "vector_count": int(index.ntotal),
+        "document_count": bm25.corpus_size,
+        "sources": {Path(p).name: file_stamp(p) for p in sources},
+    }
+    with open(tmp_target / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_target, target)
+
+    tmp_current = snapshot_dir / (_CURRENT_FILE + ".tmp")
+    with open(tmp_current, "w") as f:
+        f.write(target.name)
+    os.replace(tmp_current, snapshot_dir / _CURRENT_FILE)
+
+    versions = sorted(p for p in snapshot_dir.glob("v*") if p.is_dir())
+    for old in versions[:-keep]:
+        if old != target:
+            shutil.rmtree(old, ignore_errors=True)
+    print(f"Index snapshot {target.name} written to {snapshot_dir}")
+    return target
+
+
+def current_snapshot(snapshot_dir: Path = SNAPSHOT_DIR) -> Optional[Path]:
+    pointer = Path(snapshot_dir) / _CURRENT_FILE
+    if not pointer.exists():
+        return None
+    target = Path(snapshot_dir) / pointer.read_text().strip()
+    return target if target.is_dir() else None
+
+
+def load_snapshot(sources: List[Path], snapshot_dir: Path = SNAPSHOT_DIR,
+                  mmap: bool = SNAPSHOT_MMAP) -> Optional[Tuple[faiss.Index, BM25Index, Dict]]:
+    """
+    Opens the current snapshot if it exists, has a compatible format and was built from
+    exactly these source files (checked against their stamps, see `stamp_matches`).
+    Returns (vector index, BM25 index, manifest) or None.
+    """
+    target = current_snapshot(snapshot_dir)
+    if target is None:
+        return None
+    with open(target / "manifest.json", "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        print(f"Snapshot {target.name} has format {manifest.get('format_version')}, expected {SNAPSHOT_FORMAT_VERSION}.")
+        return None
+    for source in sources:
+        source = Path(source)
+        if not stamp_matches(source, manifest["sources"].get(source.name)):
+            print(f"Snapshot {target.name} is stale: {source.name} changed since it was written.")
+            return None
+
+    # IO_FLAG_MMAP alone still copies flat vector codes into the heap; with MMAP_IFC (faiss >= 1.9)
+    # they stay in the page cache, shared by every worker process that opens this snapshot
+    flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if mmap else 0
+    index = configure_index(faiss.read_index(str(target / "index.faiss"), flags))
+    bm25 = BM25Index.load(target / "bm25", mmap=mmap)
+    return index, bm25, manifest
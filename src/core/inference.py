@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import Dict, Optional
+from sentence_transformers import CrossEncoder, SentenceTransformer
+from src.config import MODELS_DIR, INFERENCE_BACKEND, ONNX_QUANTIZATION, ONNX_INTRA_OP_THREADS
+
+BACKENDS = ("torch", "onnx_int8")
+
+
+def quantized_model_dir(model_name: str, models_dir: Path = MODELS_DIR) -> Path:
+    return Path(models_dir) / model_name.replace("/", "__")
+
+
+def model_fingerprint(model_name: str, backend: str = INFERENCE_BACKEND, quantization: str = ONNX_QUANTIZATION) -> str:
+    """
+    Identifies the vectors a model produces: the same model on another backend (or int8
+    export) gives slightly different embeddings, so caches must not mix them.
+    """
+    if backend == "torch":
+        return f"{model_name}@torch"
+    return f"{model_name}@{backend}-{quantization}"
+
+
+def _onnx_session_kwargs(threads: Optional[int]) -> Dict:
+    try:
+        import onnxruntime
+    except ImportError:
+        raise ImportError("INFERENCE_BACKEND 'onnx_int8' needs ONNX Runtime and Optimum: "
+                          "pip install 'sentence-transformers[onnx]'")
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return {"provider": "CPUExecutionProvider", "session_options": options}
+
+
+def _load_onnx_int8(model_cls, model_name: str, quantization: str, threads: Optional[int], models_dir: Path):
+    """
+    Loads the int8 ONNX export of a model, exporting it on first use: the model is
+    converted to ONNX, saved under `models_dir`, then dynamically quantized (no
+    calibration data) for the `quantization` instruction set.
+    """
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    session_kwargs = _onnx_session_kwargs(threads)
+    local_dir = quantized_model_dir(model_name, models_dir)
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if not (local_dir / file_name).exists():
+        print(f"Exporting {model_name} to int8 ONNX ({quantization}) in {local_dir}...")
+        model = model_cls(model_name, backend="onnx")
+        model.save_pretrained(str(local_dir))
+        export_dynamic_quantized_onnx_model(model, quantization, str(local_dir))
+    return model_cls(str(local_dir), backend="onnx", model_kwargs={"file_name": file_name, **session_kwargs})
+
+
+def _load(model_cls, model_name: str, backend: str, quantization: str, threads: Optional[int], models_dir: Path):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    if backend == "torch":
+        return model_cls(model_name)
+    return _load_onnx_int8(model_cls, model_name, quantization, threads, models_dir)
+
+
+def load_embedding_model(model_name: str, backend: str = INFERENCE_BACKEND, quantization: str = ONNX_QUANTIZATION,
+                         threads: Optional[int] = ONNX_INTRA_OP_THREADS, models_dir: Path = MODELS_DIR):
+    """
+    SentenceTransformer for `model_name` on the selected inference backend.
+    """
+    return _load(SentenceTransformer, model_name, backend, quantization, threads, models_dir)
+
+
+def load_cross_encoder(model_name: str, backend: str = INFERENCE_BACKEND, quantization: str = ONNX_QUANTIZATION,
+                       threads: Optional[int] = ONNX_INTRA_OP_THREADS, models_dir: Path = MODELS_DIR):
+    """
+    CrossEncoder for `model_name` on the selected inference backend.
+    """
+    return _load(CrossEncoder, model_name, backend, quantization, threads, models_dir)
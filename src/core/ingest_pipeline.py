@@ -0,0 +1,144 @@
+import os
+import struct
+import time
+import numpy as np
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from src.config import INGEST_BATCH_SIZE, INGEST_PROGRESS_INTERVAL_SECONDS
+from src.core.metadata_store import MetadataStoreWriter, content_hash
+
+# Fixed-size .npy header so the row count can be patched in place once all rows are written
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+_NPY_HEADER_BYTES = 128
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def chunk_id(doc: Dict) -> str:
+    """
+    Unique identifier of a chunk, used as its key in the embedding cache.
+    """
+    return f"{doc['filename']}_chunk_{doc['chunk_id']}"
+
+
+class NpyAppendWriter:
+    """
+    Writes a 2D float32 .npy file row batch by row batch.
+    The file is written next to `path` and moved into place by `close`, so readers that
+    memory-mapped the previous file are unaffected and a failed run leaves it intact.
+    """
+    def __init__(self, path: Path, dtype: str = "float32"):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.rows = 0
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(self._header(0, 0))
+
+    def _header(self, rows: int, dim: int) -> bytes:
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                       "shape": (rows, dim)}).encode("latin1")
+        padding = _NPY_HEADER_BYTES - len(_NPY_MAGIC) - 2 - len(header) - 1
+        return _NPY_MAGIC + struct.pack("<H", _NPY_HEADER_BYTES - len(_NPY_MAGIC) - 2) + header + b" " * padding + b"\n"
+
+    def append(self, rows: np.ndarray):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if rows.ndim != 2:
+            raise ValueError(f"Expected a 2D batch of rows, got shape {rows.shape}")
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        elif rows.shape[1] != self.dim:
+            raise ValueError(f"Row dimension {rows.shape[1]} does not match {self.dim}")
+        self._file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header(self.rows, self.dim or 0))
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ThroughputReporter:
+    """
+    Prints progress and throughput (chunks/s) at most every `interval` seconds.
+    """
+    def __init__(self, label: str = "chunks", interval: float = INGEST_PROGRESS_INTERVAL_SECONDS):
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def update(self, n: int):
+        self.count += n
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(f"Processed {self.count} {self.label} ({self.rate():.1f} {self.label}/s)")
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return f"{self.count} {self.label} in {time.perf_counter() - self.start:.1f}s ({self.rate():.1f} {self.label}/s)"
+
+
+def run_pipeline(chunks: Iterable[Dict], cache_manager, embedder_factory: Callable, embeddings_path: Path,
+                 metadata_path: Path, batch_size: int = INGEST_BATCH_SIZE) -> Dict:
+    """
+    chunks -> cache lookup -> batched embed -> incremental embeddings/metadata writes.
+
+    Peak memory is bounded by `batch_size` chunks plus their embeddings; the corpus is
+    never materialized. The embedder is only created once a chunk misses the cache.
+    Returns counts of chunks, cache hits and newly embedded chunks.
+    """
+    embedder = None
+    vectors = NpyAppendWriter(embeddings_path)
+    metadata = MetadataStoreWriter(metadata_path)
+    progress = ThroughputReporter()
+    cached_count = 0
+    try:
+        for batch in batched(chunks, batch_size):
+            embeddings: List[Optional[np.ndarray]] = [
+                cache_manager.get_embedding(chunk_id(doc), doc["content"]) for doc in batch
+            ]
+            missing = [i for i, emb in enumerate(embeddings) if emb is None]
+            cached_count += len(batch) - len(missing)
+            if missing:
+                if embedder is None:
+                    embedder = embedder_factory()
+                new_embeddings = embedder.embed_documents([batch[i]["content"] for i in missing])
+                for i, emb in zip(missing, new_embeddings):
+                    cache_manager.update_entry(chunk_id(batch[i]), batch[i]["content"], emb)
+                    embeddings[i] = emb
+
+            vectors.append(np.stack(embeddings))
+            for doc in batch:
+                metadata.write(dict(doc, hash=content_hash(doc["content"])))
+            progress.update(len(batch))
+    except BaseException:
+        vectors.abort()
+        metadata.abort()
+        raise
+
+    if progress.count:
+        vectors.close()
+        metadata.close()
+        cache_manager.save_cache()
+    else:
+        vectors.abort()
+        metadata.abort()
+    print(f"Ingested {progress.summary()}")
+    return {"chunks": progress.count, "cached": cached_count, "embedded": progress.count - cached_count}
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import numpy as np
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from src.core.bm25 import SortedVocab
+from src.core.index_snapshot import file_stamp
+
+METADATA_FORMAT_VERSION = 1
+_MAGIC = b"SCMD"
+_PREFIX = struct.Struct("<4sIQ") # Magic, format version, header length
+_ALIGN = 64 # Sections start on 64-byte boundaries so every column view is aligned
+_NAME_COLUMNS = ("filename", "path", "original_filename")
+
+
+def content_hash(content: str) -> str:
+    """
+    Hash of a chunk's text, stored with each chunk in the metadata store so caches can tell
+    whether a chunk id still holds the content they saw.
+    """
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def iter_metadata(path: Path) -> Iterator[Dict]:
+    """
+    Reads a JSON metadata file (the format before the metadata store) record by record.
+    Files with one record per line are streamed; other layouts (e.g. a single-line array)
+    fall back to `json.load`.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+        if first.strip() != "[":
+            f.seek(0)
+            yield from json.load(f)
+            return
+        for line in f:
+            line = line.strip().rstrip(",")
+            if line and line != "]":
+                yield json.loads(line)
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class MetadataStoreWriter:
+    """
+    Streams chunk records into a `MetadataStore` file, one row per record (`None` writes a
+    tombstone row). Text goes straight to an arena file as it arrives; only the fixed-width
+    columns and the distinct names are held in memory until `close`.
+    The store is written next to `path` and moved into place by `close`, so readers that
+    memory-mapped the previous file are unaffected and a failed run leaves it intact.
+    """
+    def __init__(self, path: Path, source: Optional[Dict] = None):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.arena_path = self.path.with_name(self.path.name + ".arena.tmp")
+        self.source = source # The file this store was converted from, if any
+        self.count = 0
+        self._arena = open(self.arena_path, "wb")
+        self._offsets = array("q", [0])
+        self._codes = {column: array("i") for column in _NAME_COLUMNS}
+        self._chunk_ids = array("i")
+        self._hashes = array("Q")
+        self._names: Dict[str, int] = {} # Name -> provisional code, in first-seen order
+
+    def _code(self, name: Optional[str]) -> int:
+        if name is None:
+            return -1
+        return self._names.setdefault(name, len(self._names))
+
+    def write(self, record: Optional[Dict]):
+        size = 0
+        if record is None:
+            for column in _NAME_COLUMNS:
+                self._codes[column].append(-1)
+            self._chunk_ids.append(-1)
+            self._hashes.append(0)
+        else:
+            data = record["content"].encode("utf-8")
+            self._arena.write(data)
+            size = len(data)
+            for column in _NAME_COLUMNS:
+                self._codes[column].append(self._code(record.get(column)))
+            self._chunk_ids.append(record.get("chunk_id", -1))
+            self._hashes.append(int(record.get("hash") or content_hash(record["content"]), 16))
+        self._offsets.append(self._offsets[-1] + size)
+        self.count += 1
+
+    def _sections(self) -> Dict[str, np.ndarray]:
+        # Names are stored sorted (binary-searchable); provisional codes are remapped to sorted ranks
+        names = sorted(self._names, key=lambda n: n.encode("utf-8"))
+        remap = np.empty(len(names), dtype=np.int32)
+        remap[[self._names[n] for n in names]] = np.arange(len(names), dtype=np.int32)
+        vocab = SortedVocab.from_terms(names)
+        sections = {"names_arena": vocab.arena, "names_offsets": vocab.offsets,
+                    "offsets": np.frombuffer(self._offsets, dtype=np.int64)}
+        for column in _NAME_COLUMNS:
+            codes = np.frombuffer(self._codes[column], dtype=np.int32).copy()
+            live = codes >= 0
+            codes[live] = remap[codes[live]]
+            sections[column] = codes
+        sections["chunk_id"] = np.frombuffer(self._chunk_ids, dtype=np.int32)
+        sections["hash"] = np.frombuffer(self._hashes, dtype=np.uint64)
+        return sections
+
+    def close(self):
+        self._arena.close()
+        sections = self._sections()
+        layout, offset = {}, 0
+        for name, values in sections.items():
+            layout[name] = {"dtype": values.dtype.str, "shape": list(values.shape), "offset": offset}
+            offset = _aligned(offset + values.nbytes)
+        # The content arena goes last: it is copied from the arena file, not held in memory
+        layout["content"] = {"dtype": "|u1", "shape": [int(self._offsets[-1])], "offset": offset}
+        header = json.dumps({"rows": self.count, "source": self.source, "sections": layout}).encode("utf-8")
+        data_start = _aligned(_PREFIX.size + len(header))
+
+        with open(self.tmp_path, "wb") as f:
+            f.write(_PREFIX.pack(_MAGIC, METADATA_FORMAT_VERSION, len(header)))
+            f.write(header)
+            for name, values in sections.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(values.tobytes())
+            f.seek(data_start + layout["content"]["offset"])
+            with open(self.arena_path, "rb") as arena:
+                shutil.copyfileobj(arena, f)
+        os.replace(self.tmp_path, self.path)
+        self.arena_path.unlink(missing_ok=True)
+
+    def abort(self):
+        self._arena.close()
+        self.arena_path.unlink(missing_ok=True)
+        self.tmp_path.unlink(missing_ok=True)
+
+
+def read_source(path: Path) -> Optional[Dict]:
+    """
+    The `{"name", "size", "mtime_ns", "checksum"}` of the file a store was converted from; None for stores
+    written natively (and for files that are not metadata stores).
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            return None
+        magic, version, header_len = _PREFIX.unpack(prefix)
+        if magic != _MAGIC or version != METADATA_FORMAT_VERSION:
+            return None
+        return json.loads(f.read(header_len)).get("source")
+
+
+class MetadataStore:
+    """
+    Read-only chunk metadata, memory-mapped from one file and addressed by row (= chunk id).
+
+    Chunk text is a UTF-8 arena plus an offsets array; filename, path and original filename
+    are int32 codes into one sorted name table (`SortedVocab`), -1 marking a tombstone;
+    the content hash and the chunk's position in its file are fixed-width columns.
+    Opening a store reads only its header, and a row becomes a dict only when it is fetched.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != _MAGIC or version != METADATA_FORMAT_VERSION:
+                raise ValueError(f"{self.path} is not a version {METADATA_FORMAT_VERSION} metadata store")
+            header = json.loads(f.read(header_len))
+        self.source: Optional[Dict] = header.get("source")
+        self.rows: int = header["rows"]
+
+        data_start = _aligned(_PREFIX.size + header_len)
+        raw = np.memmap(self.path, dtype=np.uint8, mode="r").view(np.ndarray) # Plain views: cheaper row access
+        columns = {}
+        for name, spec in header["sections"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            columns[name] = raw[start:start + int(np.prod(spec["shape"])) * dtype.itemsize].view(dtype)
+        self.names = SortedVocab(columns["names_arena"], columns["names_offsets"])
+        self.offsets = columns["offsets"]
+        self.content_arena = columns["content"]
+        self.codes = {column: columns[column] for column in _NAME_COLUMNS}
+        self.chunk_ids = columns["chunk_id"]
+        self.hashes = columns["hash"]
+        self._decoded: Dict[int, str] = {} # Name code -> name (names repeat across a file's chunks)
+        self._hash_order: Optional[np.ndarray] = None # Rows sorted by hash, built on first `find`
+        self._sorted_hashes: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def name(self, code: int) -> Optional[str]:
+        if code < 0:
+            return None
+        name = self._decoded.get(code)
+        if name is None:
+            name = self._decoded[code] = self.names.term(code)
+        return name
+
+    def is_live(self, row: int) -> bool:
+        return bool(self.codes["filename"][row] >= 0)
+
+    def live_count(self) -> int:
+        return int(np.count_nonzero(self.codes["filename"] >= 0))
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.codes["filename"] >= 0)
+
+    def content(self, row: int) -> str:
+        return self.content_arena[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def chunk_hash(self, row: int) -> Optional[str]:
+        return f"{int(self.hashes[row]):016x}" if self.is_live(row) else None
+
+    def __getitem__(self, row: int) -> Optional[Dict]:
+        """
+        Decodes one row; None for a tombstone.
+        """
+        if not self.is_live(row):
+            return None
+        doc = {"filename": self.name(int(self.codes["filename"][row])),
+               "path": self.name(int(self.codes["path"][row])),
+               "content": self.content(row), "hash": self.chunk_hash(row)}
+        if self.chunk_ids[row] >= 0:
+            doc["chunk_id"] = int(self.chunk_ids[row])
+        original = self.codes["original_filename"][row]
+        if original >= 0:
+            doc["original_filename"] = self.name(int(original))
+        return doc
+
+    def __iter__(self) -> Iterator[Optional[Dict]]:
+        return (self[row] for row in range(self.rows))
+
+    def ids_by_filename(self) -> Dict[str, List[int]]:
+        """
+        Live rows grouped by filename, in row order within each file.
+        """
+        codes = self.codes["filename"]
+        live = np.flatnonzero(codes >= 0)
+        order = live[np.argsort(codes[live], kind="stable")]
+        groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1) if len(order) else []
+        return {self.name(int(codes[group[0]])): group.tolist() for group in groups}
+
+    def find(self, chunk_hash: str) -> List[int]:
+        """
+        Live rows with the given content hash, lowest first.
+        """
+        if self._hash_order is None:
+            self._hash_order = np.argsort(self.hashes, kind="stable")
+            self._sorted_hashes = self.hashes[self._hash_order]
+        target = np.uint64(int(chunk_hash, 16))
+        lo = np.searchsorted(self._sorted_hashes, target, "left")
+        hi = np.searchsorted(self._sorted_hashes, target, "right")
+        return [int(row) for row in self._hash_order[lo:hi] if self.is_live(row)]
+
+
+def convert_json_metadata(json_path: Path, store_path: Path) -> MetadataStore:
+    """
+    Writes a metadata store from a JSON metadata file, recording the JSON's stamp (size, mtime
+    and checksum, see `file_stamp`) as its source.
+    """
+    json_path = Path(json_path)
+    writer = MetadataStoreWriter(store_path, source={"name": json_path.name, **file_stamp(json_path)})
+    try:
+        for record in iter_metadata(json_path):
+            writer.write(record)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    print(f"Converted {writer.count} chunks from {json_path} to {store_path}")
+    return MetadataStore(store_path)
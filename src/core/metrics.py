@@ -0,0 +1,157 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+from src.config import METRICS_ENABLED, METRICS_LATENCY_BUCKETS
+
+# merge: vector + BM25 hits -> candidate records; fusion: hybrid scoring, keyword overlap and result rendering
+SEARCH_STAGES = ("cache_exact", "embed", "cache_semantic", "vector_search", "bm25", "merge", "fusion", "rerank",
+                 "cache_write")
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense (counts per upper bound, sum, count).
+    """
+    def __init__(self, buckets: Sequence[float] = METRICS_LATENCY_BUCKETS):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for bound, n in zip(self.buckets + [float("inf")], counts):
+            running += n
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class StageMetrics:
+    """
+    Latency histograms per search stage. `time(stage)` is a context manager; when the
+    metrics are disabled it does not read the clock at all.
+    """
+    def __init__(self, enabled: bool = METRICS_ENABLED, stages: Sequence[str] = SEARCH_STAGES,
+                 buckets: Sequence[float] = METRICS_LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.stages: Dict[str, Histogram] = {stage: Histogram(buckets) for stage in stages}
+        self.searches = Histogram(buckets) # End-to-end latency of a search batch
+
+    @contextmanager
+    def _timed(self, histogram: Histogram) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    @contextmanager
+    def _untimed(self) -> Iterator[None]:
+        yield
+
+    def time(self, stage: str):
+        if not self.enabled:
+            return self._untimed()
+        return self._timed(self.stages[stage])
+
+    def time_search(self):
+        if not self.enabled:
+            return self._untimed()
+        return self._timed(self.searches)
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "search": self.searches.snapshot(),
+            "stages": {stage: histogram.snapshot() for stage, histogram in self.stages.items()},
+        }
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_prometheus(histograms: Dict[str, List[tuple]], gauges: Dict[str, List[tuple]],
+                      counters: Optional[Dict[str, List[tuple]]] = None,
+                      help_text: Optional[Dict[str, str]] = None) -> str:
+    """
+    Renders metrics in the Prometheus text exposition format (version 0.0.4).
+    `histograms` maps a metric name to [(labels, Histogram.snapshot())];
+    `gauges` and `counters` map a metric name to [(labels, value)].
+    """
+    help_text = help_text or {}
+    lines = []
+
+    def header(name: str, kind: str):
+        if name in help_text:
+            lines.append(f"# HELP {name} {help_text[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for name, series in histograms.items():
+        header(name, "histogram")
+        for labels, snapshot in series:
+            for bound, count in snapshot["buckets"]:
+                bucket_labels = dict(labels, le=_format_value(bound))
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    for kind, metrics in (("gauge", gauges), ("counter", counters or {})):
+        for name, series in metrics.items():
+            header(name, kind)
+            for labels, value in series:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def render_engine_metrics(engine, prefix: str = "semanticcache") -> str:
+    """
+    Prometheus exposition of a SearchEngine: stage latency histograms (if enabled),
+    query cache counters and size, and index size.
+    """
+    histograms = {}
+    if engine.metrics.enabled:
+        snapshot = engine.metrics.snapshot()
+        histograms[f"{prefix}_search_seconds"] = [({}, snapshot["search"])]
+        histograms[f"{prefix}_stage_seconds"] = [({"stage": stage}, h) for stage, h in snapshot["stages"].items()]
+
+    cache = engine.query_cache.stats()
+    gauges = {
+        f"{prefix}_query_cache_entries": [({}, cache["entries"])],
+        f"{prefix}_query_cache_bytes": [({}, cache["bytes"])],
+        f"{prefix}_query_cache_hit_ratio": [({}, cache["hit_ratio"])],
+        f"{prefix}_documents": [({}, len(engine.documents))],
+        f"{prefix}_vector_index_size": [({}, engine.index.ntotal if engine.index is not None else 0)],
+    }
+    counters = {
+        f"{prefix}_query_cache_hits_total": [({"tier": "exact"}, cache["exact_hits"]),
+                                             ({"tier": "semantic"}, cache["semantic_hits"])],
+        f"{prefix}_query_cache_misses_total": [({}, cache["misses"])],
+        f"{prefix}_query_cache_evictions_total": [({}, cache["evictions"])],
+        f"{prefix}_query_cache_invalidations_total": [({}, cache["invalidations"])],
+    }
+    help_text = {
+        f"{prefix}_search_seconds": "End-to-end latency of a search batch.",
+        f"{prefix}_stage_seconds": "Latency of each search stage, per batch.",
+        f"{prefix}_query_cache_hit_ratio": "Query cache hits / lookups since startup.",
+    }
+    return render_prometheus(histograms, gauges, counters, help_text)
@@ -1,10 +1,16 @@
 import os
 import re
-from typing import List, Dict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
-from src.config import RAW_DATA_DIR
+from src.config import RAW_DATA_DIR, INGEST_WORKERS, INGEST_SHARD_SIZE
 from sklearn.datasets import fetch_20newsgroups
 
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
 class TextLoader:
     """
     Handles loading and cleaning of text files from the raw data directory.
@@ -17,9 +23,9 @@ class TextLoader:
         Basic text cleaning: removes extra whitespace, newlines, etc.
         """
         # Remove HTML tags (if any)
-        text = re.sub(r'<[^>]+>', '', text)
+        text = _HTML_TAG_RE.sub('', text)
         # Replace multiple newlines/tabs with a single space
-        text = re.sub(r'\s+', ' ', text)
+        text = _WHITESPACE_RE.sub(' ', text)
         return text.strip()
 
     def chunk_text(self, text: str, window_size: int = 256, overlap: int = 50) -> List[str]:
@@ -37,12 +43,10 @@ class TextLoader:
             chunks.append(chunk)
         return chunks
 
-    def load_files(self) -> List[Dict[str, str]]:
+    def iter_files(self) -> Iterator[Path]:
         """
-        Loads all .txt files from the data directory and chunks them.
-        Returns a list of dictionaries with 'filename', 'content', 'path', 'chunk_id'.
+        Yields the .txt files of the data directory, downloading sample data if there are none.
         """
-        documents = []
         if not self.data_dir.exists():
             print(f"Directory {self.data_dir} does not exist. Creating it...")
             self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -52,24 +56,79 @@ class TextLoader:
             print("No text files found. Downloading 20 Newsgroups dataset for testing...")
             self.download_20newsgroups()
 
-        for file_path in self.data_dir.glob("*.txt"):
+        yield from sorted(self.data_dir.glob("*.txt"))
+
+    def split_file(self, file_path: Path) -> List[str]:
+        """
+        Reads, cleans and chunks one file; returns its chunk texts.
+        """
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            cleaned_content = self.clean_text(f.read())
+        return self.chunk_text(cleaned_content) if cleaned_content else []
+
+    def split_files(self, file_paths: List[Path]) -> List[Tuple[Path, List[str]]]:
+        """
+        Splits a shard of files, in order. Unreadable files are reported and skipped.
+        Only chunk texts are returned, which keeps worker results small to transfer.
+        """
+        shard = []
+        for file_path in file_paths:
             try:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    content = f.read()
-                    cleaned_content = self.clean_text(content)
-                    if cleaned_content:
-                        chunks = self.chunk_text(cleaned_content)
-                        for i, chunk in enumerate(chunks):
-                            documents.append({
-                                "filename": file_path.name,
-                                "content": chunk,
-                                "path": str(file_path),
-                                "chunk_id": i,
-                                "original_filename": file_path.name # Keep track of parent
-                            })
+                shard.append((file_path, self.split_file(file_path)))
             except Exception as e:
                 print(f"Error reading {file_path}: {e}")
-        
+        return shard
+
+    @staticmethod
+    def _to_documents(file_path: Path, chunks: List[str]) -> List[Dict]:
+        return [{
+            "filename": file_path.name,
+            "content": chunk,
+            "path": str(file_path),
+            "chunk_id": i,
+            "original_filename": file_path.name # Keep track of parent
+        } for i, chunk in enumerate(chunks)]
+
+    def chunk_file(self, file_path: Path) -> List[Dict]:
+        """
+        Reads, cleans and chunks one file.
+        Returns its chunk dicts with 'filename', 'content', 'path', 'chunk_id'.
+        """
+        return self._to_documents(file_path, self.split_file(file_path))
+
+    def iter_chunks(self, workers: Optional[int] = INGEST_WORKERS, shard_size: int = INGEST_SHARD_SIZE) -> Iterator[Dict]:
+        """
+        Streams chunk dicts in file order; only a bounded number of files is held in memory.
+        With `workers` > 1 (None = one per CPU), shards of `shard_size` files are cleaned and
+        chunked in a process pool. Shards are yielded in submission order, so the output
+        (and therefore chunk ids and embedding rows) is identical to the serial path.
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1:
+            for file_path in self.iter_files():
+                for path, chunks in self.split_files([file_path]):
+                    yield from self._to_documents(path, chunks)
+            return
+
+        files = self.iter_files()
+        shards = iter(lambda: list(islice(files, shard_size)), [])
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Keep a few shards in flight per worker instead of submitting the whole corpus
+            pending = deque(pool.submit(_chunk_shard, self.data_dir, shard) for shard in islice(shards, 2 * workers))
+            while pending:
+                shard = pending.popleft().result()
+                next_shard = next(shards, None)
+                if next_shard is not None:
+                    pending.append(pool.submit(_chunk_shard, self.data_dir, next_shard))
+                for path, chunks in shard:
+                    yield from self._to_documents(path, chunks)
+
+    def load_files(self) -> List[Dict[str, str]]:
+        """
+        Loads all .txt files from the data directory and chunks them.
+        Returns a list of dictionaries with 'filename', 'content', 'path', 'chunk_id'.
+        """
+        documents = list(self.iter_chunks())
         print(f"Loaded {len(documents)} chunks from {self.data_dir}")
         return documents
 
@@ -101,6 +160,10 @@ class TextLoader:
         except Exception as e:
             print(f"Failed to download dataset: {e}")
 
+def _chunk_shard(data_dir: Path, file_paths: List[Path]) -> List[Tuple[Path, List[str]]]:
+    # Process-pool entry point: must be a picklable module-level function
+    return TextLoader(data_dir).split_files(file_paths)
+
 if __name__ == "__main__":
     # Test the loader
     loader = TextLoader()
@@ -1,72 +1,631 @@
+import atexit
+import heapq
+import itertools
 import json
+import random
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Optional
-from src.config import QUERY_CACHE_FILE, QUERY_CACHE_THRESHOLD
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from src.config import (
+    QUERY_CACHE_FILE,
+    QUERY_CACHE_LOG_FILE,
+    QUERY_CACHE_THRESHOLD,
+    QUERY_CACHE_BACKEND,
+    QUERY_CACHE_INITIAL_CAPACITY,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_MAX_BYTES,
+    QUERY_CACHE_EVICTION_POLICY,
+    QUERY_CACHE_TTL_SECONDS,
+    QUERY_CACHE_COMPACT_MIN_RECORDS,
+    QUERY_CACHE_COMPACT_RATIO,
+    QUERY_CACHE_EXACT_TIER,
+    QUERY_CACHE_STORE,
+    QUERY_CACHE_SHARED_FILE,
+    QUERY_CACHE_SYNC_INTERVAL_MS,
+    QUERY_CACHE_SHARED_TOMBSTONE_SECONDS,
+    EMBEDDING_DIMENSION,
+)
+from src.core.cache_log import AppendOnlyLog, SharedLog, encode_record, OP_ADD, OP_DELETE
+
+EVICTION_POLICIES = ("lru", "lfu", "ttl", "cost")
+CACHE_STORES = ("log", "shared")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Key of the exact-match tier: case-folded, whitespace-collapsed query text.
+    """
+    return " ".join(text.casefold().split())
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Returns a float32 copy of `vectors` (1D or 2D) with every row scaled to unit length.
+    Zero rows are left as zeros so they never produce a hit.
+    """
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _MatrixStore:
+    """
+    Keeps cached query embeddings in a preallocated, pre-normalized float32 matrix.
+    A lookup is a single matrix-vector product over the filled rows.
+    Rows are addressed by stable entry keys; removal moves the last row into the hole.
+    """
+    def __init__(self, dim: int, capacity: int):
+        self.dim = dim
+        self.matrix = np.zeros((max(1, capacity), dim), dtype=np.float32)
+        self.keys = np.zeros(max(1, capacity), dtype=np.int64)
+        self.rows: Dict[int, int] = {}
+        self.size = 0
+
+    def add(self, key: int, vector: np.ndarray):
+        if self.size == self.matrix.shape[0]:
+            grown = np.zeros((self.matrix.shape[0] * 2, self.dim), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+            self.keys = np.resize(self.keys, self.matrix.shape[0])
+        self.matrix[self.size] = vector
+        self.keys[self.size] = key
+        self.rows[key] = self.size
+        self.size += 1
+
+    def remove(self, key: int):
+        row = self.rows.pop(key)
+        last = self.size - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = self.keys[last]
+            self.rows[int(self.keys[row])] = row
+        self.size = last
+
+    def get(self, key: int) -> np.ndarray:
+        return self.matrix[self.rows[key]].copy()
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the best (score, key) for every row in `queries`.
+        """
+        scores = queries @ self.matrix[:self.size].T
+        rows = np.argmax(scores, axis=1)
+        return scores[np.arange(len(queries)), rows], self.keys[rows]
+
+
+class _FaissStore:
+    """
+    Keeps cached query embeddings in a FAISS inner-product index keyed by entry key.
+    Vectors are normalized before insertion, so inner product equals cosine similarity.
+    """
+    def __init__(self, dim: int):
+        import faiss
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    @property
+    def size(self) -> int:
+        return self.index.ntotal
+
+    def add(self, key: int, vector: np.ndarray):
+        self.index.add_with_ids(vector.reshape(1, -1), np.array([key], dtype=np.int64))
+
+    def remove(self, key: int):
+        self.index.remove_ids(np.array([key], dtype=np.int64))
+
+    def get(self, key: int) -> np.ndarray:
+        return self.index.reconstruct(key)
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        D, I = self.index.search(queries, 1)
+        return D[:, 0], I[:, 0]
+
+
+class _EvictionQueue:
+    """
+    Min-heap of eviction priorities with lazy invalidation.
+    Every push supersedes the previous priority of the same key.
+    """
+    def __init__(self):
+        self._heap = []
+        self._current: Dict[int, tuple] = {}
+
+    def push(self, key: int, priority: tuple):
+        self._current[key] = priority
+        heapq.heappush(self._heap, (priority, key))
+        if len(self._heap) > 4 * len(self._current) + 64:
+            self._heap = [(p, k) for k, p in self._current.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, key: int):
+        self._current.pop(key, None)
+
+    def peek(self) -> Optional[Tuple[tuple, int]]:
+        while self._heap:
+            priority, key = self._heap[0]
+            if self._current.get(key) == priority:
+                return priority, key
+            heapq.heappop(self._heap)
+        return None
+
 
 class SemanticQueryCache:
     """
     Caches search results based on semantic similarity of queries.
     If a user asks a question similar to a previous one, return cached results.
+    A first, exact-match tier (`check_text`) answers repeats of the same query text
+    before any embedding is computed; `check` is the semantic tier behind it.
+
+    The cache is bounded by `max_entries` and `max_bytes`; when either limit is exceeded
+    entries are evicted according to `policy`:
+    - "lru": least recently used first.
+    - "lfu": least frequently hit first (ties broken by recency).
+    - "ttl": oldest first; combine with `ttl_seconds` to expire stale entries.
+    - "cost": GreedyDual-Size-Frequency, keeps entries that were expensive to compute
+      relative to their size and that are hit often.
+
+    Entries are persisted to an append-only log (see `AppendOnlyLog`): an add writes one
+    small binary record from a background thread, evictions write a tombstone, and the
+    log is compacted in the background once dead records pile up.
+    With `store="shared"` the records go to a SQLite database instead (see `SharedLog`)
+    that several processes use at once; each one applies the others' adds, evictions and
+    invalidations at most every `sync_interval_ms`, before answering a lookup.
     """
-    def __init__(self, cache_path=QUERY_CACHE_FILE, threshold=QUERY_CACHE_THRESHOLD):
-        self.cache_path = cache_path
+    def __init__(self, cache_path=None, threshold=QUERY_CACHE_THRESHOLD,
+                 backend: str = QUERY_CACHE_BACKEND, dim: int = EMBEDDING_DIMENSION,
+                 capacity: int = QUERY_CACHE_INITIAL_CAPACITY,
+                 max_entries: Optional[int] = QUERY_CACHE_MAX_ENTRIES,
+                 max_bytes: Optional[int] = QUERY_CACHE_MAX_BYTES,
+                 policy: str = QUERY_CACHE_EVICTION_POLICY,
+                 ttl_seconds: Optional[float] = QUERY_CACHE_TTL_SECONDS,
+                 legacy_path: Optional[Path] = QUERY_CACHE_FILE,
+                 compact_min_records: int = QUERY_CACHE_COMPACT_MIN_RECORDS,
+                 compact_ratio: float = QUERY_CACHE_COMPACT_RATIO,
+                 exact_tier: bool = QUERY_CACHE_EXACT_TIER,
+                 store: str = QUERY_CACHE_STORE,
+                 sync_interval_ms: float = QUERY_CACHE_SYNC_INTERVAL_MS):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        if store not in CACHE_STORES:
+            raise ValueError(f"Unknown query cache store: {store}")
+        if cache_path is None:
+            cache_path = QUERY_CACHE_SHARED_FILE if store == "shared" else QUERY_CACHE_LOG_FILE
+        self.cache_path = Path(cache_path)
+        self.store = store
+        # The legacy JSON cache is only migrated into a private log
+        self.legacy_path = legacy_path if store == "log" else None
         self.threshold = threshold
-        self.cache = self._load_cache()
+        self.dim = dim
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.ttl_seconds = ttl_seconds
+        self.compact_min_records = compact_min_records
+        self.compact_ratio = compact_ratio
+        self.exact_tier = exact_tier
+        self.backend = backend
+        self.sync_interval = sync_interval_ms / 1000.0
+
+        self.entries: Dict[int, Dict] = {}
+        self._by_doc: Dict[int, Set[int]] = {} # Chunk id -> keys of entries whose results contain it
+        self._by_text: Dict[str, int] = {} # Normalized query text -> key (exact-match tier)
+        self.total_bytes = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.compactions = 0
+        self._clock = itertools.count()
+        self._inflation = 0.0 # GreedyDual "L" value, raised to the priority of each evicted entry
+        self._queue = _EvictionQueue()
+        self._lock = threading.RLock()
+
+        if store == "shared":
+            self._log = SharedLog(self.cache_path, dim, tombstone_seconds=QUERY_CACHE_SHARED_TOMBSTONE_SECONDS,
+                                  max_entries=max_entries)
+        else:
+            self._log = AppendOnlyLog(self.cache_path, dim)
+        self._migrated = False
+        loaded = self._load_cache()
+        if self._log.shared:
+            # Keys must not collide with those allocated by other processes
+            self._keys = iter(lambda: random.getrandbits(62), None)
+        else:
+            self._keys = itertools.count(max(loaded, default=-1) + 1)
+        self._log_records = self._log.records_written
+        self._last_sync = time.monotonic()
+        self._store = self._new_store(max(capacity, len(loaded)))
+
+        self._log.start()
+        atexit.register(self.close)
+        for key, (embedding, payload) in loaded.items():
+            self._insert(key, embedding, payload)
+        if self._migrated:
+            # Write the imported entries out as the initial log contents
+            self._log.compact(self._snapshot_records)
+            self._log_records = len(self.entries)
+        else:
+            self._maybe_compact()
+
+    def _new_store(self, capacity: int):
+        if self.backend == "faiss":
+            return _FaissStore(self.dim)
+        if self.backend == "numpy":
+            return _MatrixStore(self.dim, capacity)
+        raise ValueError(f"Unknown query cache backend: {self.backend}")
 
-    def _load_cache(self) -> List[Dict]:
-        if self.cache_path.exists():
+    def _load_cache(self) -> Dict[int, Tuple[np.ndarray, Dict]]:
+        """
+        Replays the log into {key: (embedding, payload)}, in insertion order.
+        Falls back to importing the legacy JSON cache when no log exists yet.
+        """
+        loaded: Dict[int, Tuple[np.ndarray, Dict]] = {}
+        if not self.cache_path.exists() and self.legacy_path is not None and Path(self.legacy_path).exists():
             try:
-                with open(self.cache_path, "r") as f:
-                    return json.load(f)
+                with open(self.legacy_path, "r") as f:
+                    legacy = json.load(f)
             except json.JSONDecodeError:
-                return []
-        return []
-
-    def _save_cache(self):
-        with open(self.cache_path, "w") as f:
-            json.dump(self.cache, f)
-
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        # Assumes vectors are already normalized (which they are from the embedder usually)
-        # But to be safe:
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        return np.dot(vec1, vec2) / (norm1 * norm2)
+                legacy = []
+            print(f"Migrating {len(legacy)} entries from {self.legacy_path} to {self.cache_path}")
+            for key, entry in enumerate(legacy):
+                payload = {k: v for k, v in entry.items() if k != "embedding"}
+                loaded[key] = (_normalize_rows(entry["embedding"])[0], payload)
+            self._migrated = True
+            return loaded
+
+        for op, key, embedding, payload in self._log.replay():
+            if op == OP_ADD:
+                loaded.pop(key, None)
+                loaded[key] = (embedding, payload)
+            elif op == OP_DELETE:
+                loaded.pop(key, None)
+        return loaded
+
+    def _snapshot_records(self) -> List[bytes]:
+        """
+        Encodes every live entry as an ADD record. Runs on the log writer thread.
+        """
+        with self._lock:
+            live = [(key, self._store.get(key), self._payload(entry)) for key, entry in self.entries.items()]
+        return [encode_record(OP_ADD, key, embedding, payload) for key, embedding, payload in live]
+
+    def _maybe_compact(self):
+        dead = self._log_records - len(self.entries)
+        if dead > max(self.compact_min_records, self.compact_ratio * len(self.entries)):
+            self._log.compact(self._snapshot_records)
+            self._log_records = len(self.entries)
+            self.compactions += 1
+
+    @staticmethod
+    def _payload(entry: Dict) -> Dict:
+        return {k: v for k, v in entry.items() if not k.startswith("_")}
+
+    def _entry_bytes(self, entry: Dict) -> int:
+        # Embedding as float32 in the store, plus the serialized query and results
+        return self.dim * 4 + len(entry["query"]) + len(json.dumps(entry["results"]))
+
+    def _priority(self, entry: Dict) -> tuple:
+        if self.policy == "lru":
+            return (entry["_last_access"],)
+        if self.policy == "lfu":
+            return (entry["_hits"], entry["_last_access"])
+        if self.policy == "ttl":
+            return (entry["created_at"], entry["_last_access"])
+        # "cost": GreedyDual-Size-Frequency
+        value = (entry["_hits"] + 1) * max(entry.get("cost") or 0.0, 1e-6) / entry["_bytes"]
+        return (self._inflation + value, entry["_last_access"])
+
+    def _is_expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry["created_at"] > self.ttl_seconds
+
+    @staticmethod
+    def _doc_ids(entry: Dict) -> Set[int]:
+        return {r["id"] for r in entry["results"] if isinstance(r, dict) and "id" in r}
+
+    def _remove(self, key: int, log: bool = True):
+        entry = self.entries.pop(key)
+        text = normalize_query(entry["query"])
+        if self._by_text.get(text) == key:
+            del self._by_text[text]
+        for doc_id in self._doc_ids(entry):
+            keys = self._by_doc.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_doc[doc_id]
+        self._store.remove(key)
+        self._queue.discard(key)
+        self.total_bytes -= entry["_bytes"]
+        if log:
+            self._log.append(encode_record(OP_DELETE, key))
+            self._log_records += 1
+
+    def _over_budget(self) -> bool:
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.total_bytes > self.max_bytes
+
+    def _evict(self, protect: Optional[int] = None):
+        """
+        Drops expired entries at the head of the queue, then evicts until within budget.
+        `protect` (the entry being inserted) is never chosen as the victim, otherwise a
+        fresh entry would always lose to entries that already collected hits.
+        """
+        if protect is not None:
+            self._queue.discard(protect)
+        now = time.time()
+        while self.entries:
+            head = self._queue.peek()
+            if head is None:
+                break
+            priority, key = head
+            if self._is_expired(self.entries[key], now):
+                self.expirations += 1
+                self._remove(key)
+            elif self._over_budget():
+                self.evictions += 1
+                if self.policy == "cost":
+                    self._inflation = priority[0]
+                # Victims are chosen from this process's hit statistics, so with a shared
+                # store they are only dropped here; the store trims itself (see `SharedLog`)
+                self._remove(key, log=not self._log.shared)
+            else:
+                break
+        if protect is not None:
+            self._queue.push(protect, self._priority(self.entries[protect]))
+
+    def _insert(self, key: int, embedding: np.ndarray, payload: Dict):
+        """
+        Registers an entry in memory without persisting it.
+        `embedding` must already be normalized.
+        """
+        entry = dict(payload)
+        entry.setdefault("created_at", time.time())
+        entry["_hits"] = 0
+        entry["_last_access"] = next(self._clock)
+        entry["_bytes"] = self._entry_bytes(entry)
+        text = normalize_query(entry["query"])
+        previous = self._by_text.get(text)
+        if previous is not None and previous != key:
+            # One entry per query text (e.g. two workers of a shared store added it concurrently)
+            self._remove(previous, log=False)
+        self.entries[key] = entry
+        self._by_text[text] = key
+        for doc_id in self._doc_ids(entry):
+            self._by_doc.setdefault(doc_id, set()).add(key)
+        self.total_bytes += entry["_bytes"]
+        self._store.add(key, embedding)
+        self._evict(protect=key)
+
+    def _sync(self):
+        """
+        Applies the changes other processes made to a shared store since the last sync.
+        Called with the lock held; a no-op for a private log.
+        """
+        if not self._log.shared or time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = time.monotonic()
+        records, reset = self._log.poll()
+        if reset:
+            # Changes we never saw were compacted away: rebuild from the full contents
+            self.entries.clear()
+            self._by_doc.clear()
+            self._by_text.clear()
+            self._queue = _EvictionQueue()
+            self._store = self._new_store(len(records))
+            self.total_bytes = 0
+            self._log_records = 0
+        for op, key, embedding, payload in records:
+            if key in self.entries:
+                self._remove(key, log=False)
+            if op == OP_ADD:
+                self._insert(key, embedding, payload)
+        self._log_records += len(records)
+
+    def _touch(self, key: int, entry: Dict):
+        entry["_hits"] += 1
+        entry["_last_access"] = next(self._clock)
+        self._queue.push(key, self._priority(entry))
+
+    def check_text(self, query_text: str) -> Optional[List[Dict]]:
+        """
+        Exact-match tier: returns cached results for the same query text (up to case and
+        whitespace) without needing an embedding. A miss is not counted as a cache miss,
+        since the semantic tier is consulted next.
+        """
+        entry = self.lookup_text(query_text)
+        return entry["results"] if entry is not None else None
+
+    def lookup_text(self, query_text: str, accept: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        """
+        `check_text` returning the whole entry ({"query", "results", "meta", ...}).
+        An entry rejected by `accept` (e.g. computed for a smaller k) is not a hit.
+        """
+        if not self.exact_tier:
+            return None
+        with self._lock:
+            self._sync()
+            key = self._by_text.get(normalize_query(query_text))
+            if key is None:
+                return None
+            entry = self.entries[key]
+            if self._is_expired(entry, time.time()):
+                self._remove(key)
+                self.expirations += 1
+                return None
+            if accept is not None and not accept(entry):
+                return None
+            self._touch(key, entry)
+            self.exact_hits += 1
+            return entry
 
     def check(self, query_embedding: np.ndarray) -> Optional[List[Dict]]:
         """
         Checks if a semantically similar query exists in the cache.
         Returns the cached results if found, else None.
         """
-        best_score = -1
-        best_results = None
-        
-        for entry in self.cache:
-            cached_embedding = np.array(entry["embedding"])
-            score = self._cosine_similarity(query_embedding, cached_embedding)
-            
-            if score > best_score:
-                best_score = score
-                best_results = entry["results"]
-
-        if best_score >= self.threshold:
-            print(f"⚡ Semantic Cache HIT! (Score: {best_score:.4f})")
-            return best_results
-        
+        return self.check_batch(query_embedding)[0]
+
+    def check_batch(self, query_embeddings: np.ndarray) -> List[Optional[List[Dict]]]:
+        """
+        `check` for every row of `query_embeddings` with a single similarity search.
+        """
+        return [entry["results"] if entry is not None else None for entry in self.lookup_batch(query_embeddings)]
+
+    def lookup_batch(self, query_embeddings: np.ndarray,
+                     accept: Optional[List[Callable[[Dict], bool]]] = None) -> List[Optional[Dict]]:
+        """
+        `check_batch` returning whole entries; `accept[i]` can reject the entry found for row i.
+        """
+        queries = _normalize_rows(query_embeddings)
+        with self._lock:
+            self._sync()
+            if self._store.size == 0:
+                self.misses += len(queries)
+                return [None] * len(queries)
+
+            scores, keys = self._store.search(queries)
+            now = time.time()
+            return [self._hit(float(score), int(key), now, accept[i] if accept else None)
+                    for i, (score, key) in enumerate(zip(scores, keys))]
+
+    def _hit(self, best_score: float, key: int, now: float,
+             accept: Optional[Callable[[Dict], bool]] = None) -> Optional[Dict]:
+        # The entry can be gone if an earlier query of the same batch found it expired
+        entry = self.entries.get(key)
+        if best_score >= self.threshold and entry is not None:
+            if self._is_expired(entry, now):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if accept is None or accept(entry):
+                self._touch(key, entry)
+                self.semantic_hits += 1
+                print(f"⚡ Semantic Cache HIT! (Score: {best_score:.4f})")
+                return entry
+
+        self.misses += 1
         return None
 
-    def add(self, query_text: str, query_embedding: np.ndarray, results: List[Dict]):
+    def add(self, query_text: str, query_embedding: np.ndarray, results: List[Dict],
+            cost: Optional[float] = None, meta: Optional[Dict] = None):
         """
         Adds a new query and its results to the cache.
+        `cost` is the time (seconds) the uncached search took; used by the "cost" policy.
+        `meta` is stored with the entry for the caller (e.g. how the results were computed).
+        Persistence happens on a background thread.
         """
-        # Avoid growing indefinitely - simple FIFO or limit could be added here
-        # For now, just append
-        entry = {
+        payload = {
             "query": query_text,
-            "embedding": query_embedding.tolist(),
-            "results": results
+            "results": results,
+            "cost": cost,
+            "created_at": time.time(),
+        }
+        if meta is not None:
+            payload["meta"] = meta
+        embedding = _normalize_rows(query_embedding)[0]
+        with self._lock:
+            self._sync()
+            # Replaces the entry for the same text, e.g. one refused by a lookup's `accept` check
+            previous = self._by_text.get(normalize_query(query_text))
+            if previous is not None:
+                self._remove(previous)
+            key = next(self._keys)
+            self._insert(key, embedding, payload)
+            self._log.append(encode_record(OP_ADD, key, embedding, payload))
+            self._log_records += 1
+            self._maybe_compact()
+
+    def invalidate(self, doc_ids: Iterable[int]) -> int:
+        """
+        Drops every entry whose results contain one of the given chunk ids (chunks that
+        were updated or deleted). Returns the number of dropped entries.
+        """
+        with self._lock:
+            self._sync()
+            keys = set()
+            for doc_id in doc_ids:
+                keys |= self._by_doc.get(int(doc_id), set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            self._maybe_compact()
+            return len(keys)
+
+    def revalidate(self, version: str, resolve: Callable[[int, str], Optional[int]]) -> Tuple[int, int]:
+        """
+        Moves entries computed against another corpus version (`meta["corpus"]`) to
+        `version`. Results must carry each chunk's content "hash"; `resolve(id, hash)`
+        returns the id now holding that content, or None if it is gone. Entries whose
+        chunks all resolve are kept with remapped ids, the rest are dropped.
+        Returns (kept, dropped).
+        """
+        kept = dropped = 0
+        with self._lock:
+            self._sync()
+            for key, entry in list(self.entries.items()):
+                meta = entry.get("meta") or {}
+                if meta.get("corpus") == version:
+                    continue
+                results = []
+                for r in entry["results"]:
+                    new_id = resolve(r["id"], r["hash"]) if isinstance(r, dict) and "hash" in r else None
+                    if new_id is None:
+                        results = None
+                        break
+                    results.append(dict(r, id=new_id))
+                embedding = self._store.get(key)
+                self._remove(key)
+                if results is None or len({r["id"] for r in results}) < len(results):
+                    dropped += 1
+                    continue
+                payload = dict(self._payload(entry), results=results, meta=dict(meta, corpus=version))
+                self._insert(key, embedding, payload)
+                self._log.append(encode_record(OP_ADD, key, embedding, payload))
+                self._log_records += 1
+                kept += 1
+            self.invalidations += dropped
+            self._maybe_compact()
+        return kept, dropped
+
+    def flush(self):
+        """
+        Blocks until every pending write has reached the log.
+        """
+        self._log.flush()
+
+    def close(self):
+        self._log.close()
+
+    def stats(self) -> Dict:
+        """
+        Returns counters useful for sizing the cache.
+        """
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "store": "shared" if self._log.shared else "log",
+            "log_records": self._log_records,
+            "compactions": self.compactions,
         }
-        self.cache.append(entry)
-        self._save_cache()
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from src.config import RERANK_SCORE_CACHE_SIZE
+from src.core.query_cache import normalize_query
+
+
+class RerankScoreCache:
+    """
+    LRU of Cross-Encoder scores keyed by (normalized query, chunk id).
+
+    Chunk ids are never reused (an updated document gets new ids), so a cached score
+    can never belong to different content and entries need no invalidation.
+    """
+    def __init__(self, max_entries: int = RERANK_SCORE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, query: str, chunk_ids: List[int]) -> List[Optional[float]]:
+        query = normalize_query(query)
+        scores = []
+        with self._lock:
+            for chunk_id in chunk_ids:
+                score = self._scores.get((query, chunk_id))
+                if score is None:
+                    self.misses += 1
+                else:
+                    self._scores.move_to_end((query, chunk_id))
+                    self.hits += 1
+                scores.append(score)
+        return scores
+
+    def put_many(self, query: str, chunk_ids: List[int], scores: List[float]):
+        if self.max_entries <= 0:
+            return
+        query = normalize_query(query)
+        with self._lock:
+            for chunk_id, score in zip(chunk_ids, scores):
+                self._scores[(query, chunk_id)] = float(score)
+                self._scores.move_to_end((query, chunk_id))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,59 +1,389 @@
+import threading
+import time
 import faiss
 import numpy as np
-import json
-from rank_bm25 import BM25Okapi
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from sentence_transformers import CrossEncoder
-from src.config import INDICES_DIR, EMBEDDING_DIMENSION
+from src.config import (
+    INDICES_DIR,
+    METADATA_FILE,
+    METADATA_STORE_FILE,
+    EMBEDDINGS_FILE,
+    CORPUS_FILE,
+    DOCUMENT_LOG_FILE,
+    SNAPSHOT_DIR,
+    SHARDS_DIR,
+    SEARCH_SHARDS,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MEMO_ENABLED,
+    CROSS_ENCODER_MODEL_NAME,
+    INFERENCE_BACKEND,
+    INGEST_BATCH_SIZE,
+    LIVE_COMPACT_MIN_CHANGES,
+    RERANK_CANDIDATES,
+    RERANK_ADAPTIVE,
+    RERANK_ADAPTIVE_MIN_RATIO,
+    RERANK_BATCH_SIZE,
+    SEARCH_BATCH_CHUNK_SIZE,
+)
+from src.core.batcher import DeadlineExceeded
+from src.core.bm25 import BM25Index, LiveBM25, tokenize
+from src.core.document_store import DocumentStore, content_hash, write_generation
 from src.core.embedder import Embedder
-from src.core.query_cache import SemanticQueryCache
+from src.core.inference import load_cross_encoder
+from src.core.index_snapshot import load_snapshot, write_snapshot
+from src.core.ingest_pipeline import NpyAppendWriter
+from src.core.metadata_store import MetadataStore, MetadataStoreWriter
+from src.core.preprocessing import TextLoader
+from src.core.vector_index import LiveVectorIndex, build_vector_index
+from src.core.cache_log import OP_ADD
+from src.core.query_cache import SemanticQueryCache, normalize_query
+from src.core.rerank_cache import RerankScoreCache
+from src.core.shards import ShardPool, ShardedBM25, ShardedVectorIndex, load_manifest
+from src.core.metrics import StageMetrics
+
+SEARCH_DEFAULTS = {"k": 5, "alpha": 0.5, "rerank": True, "nprobe": None, "ef_search": None,
+                   "fields": None, "snippet_length": None}
+# Everything a rendered result can carry; "id" and "score" are always included
+RESULT_FIELDS = ("id", "score", "filename", "path", "content", "vector_score", "bm25_score",
+                 "overlap_score", "matched_keywords", "explanation")
+
+
+class DocumentExists(ValueError):
+    """
+    `add_document` was called for a filename that is already indexed.
+    """
+
+
+class DocumentNotFound(KeyError):
+    """
+    `update_document` or `delete_document` was called for a filename that is not indexed.
+    """
+
+
+class DocumentsReadOnly(RuntimeError):
+    """
+    Live document changes are disabled for this engine: sharded indices, or a query cache
+    shared between worker processes that would each apply the change to their own corpus.
+    """
+
 
 class SearchEngine:
-    def __init__(self):
-        self.embedder = Embedder()
-        self.query_cache = SemanticQueryCache()
+    def __init__(self, embedder: Optional[Embedder] = None, cross_encoder: Optional[CrossEncoder] = None,
+                 query_cache: Optional[SemanticQueryCache] = None, index_dir: Path = INDICES_DIR,
+                 compact_min_changes: Optional[int] = LIVE_COMPACT_MIN_CHANGES,
+                 rerank_cache: Optional[RerankScoreCache] = None, adaptive_rerank: bool = RERANK_ADAPTIVE,
+                 metrics: Optional[StageMetrics] = None, shards: int = SEARCH_SHARDS):
+        self.embedder = embedder if embedder is not None else Embedder(memo=EMBEDDING_MEMO_ENABLED)
+        self.query_cache = query_cache if query_cache is not None else SemanticQueryCache()
+        self.rerank_cache = rerank_cache if rerank_cache is not None else RerankScoreCache()
+        self.adaptive_rerank = adaptive_rerank
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self._rerank_lock = threading.Lock()
+        self.rerank_pairs = {"scored": 0, "cached": 0, "pruned": 0}
         # Load CrossEncoder for re-ranking
-        print("Loading CrossEncoder...")
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        print("CrossEncoder loaded.")
+        if cross_encoder is None:
+            print(f"Loading CrossEncoder ({INFERENCE_BACKEND})...")
+            cross_encoder = load_cross_encoder(CROSS_ENCODER_MODEL_NAME)
+            print("CrossEncoder loaded.")
+        self.cross_encoder = cross_encoder
+
+        index_dir = Path(index_dir)
+        self.metadata_file = index_dir / METADATA_STORE_FILE.name
+        self.embeddings_file = index_dir / EMBEDDINGS_FILE.name
+        self.corpus_file = index_dir / CORPUS_FILE.name
+        self.snapshot_dir = index_dir / SNAPSHOT_DIR.name
+        self.shards_dir = index_dir / SHARDS_DIR.name
+        self.compact_min_changes = compact_min_changes
+        self._write_lock = threading.Lock() # Serializes document changes and compaction swaps
+        self._compaction: Optional[threading.Thread] = None
+        self.compactions = 0
         
-        self.documents = []
+        self.documents = DocumentStore(self.metadata_file, index_dir / DOCUMENT_LOG_FILE.name, self.corpus_file,
+                                       legacy_path=index_dir / METADATA_FILE.name)
         self.embeddings = None
         self.index = None
         self.bm25 = None
+        self.shards: Optional[ShardPool] = None
         self._load_data()
-        self._build_indices()
+        if shards:
+            self._open_shards(shards)
+        if self.shards is None:
+            self._build_indices()
+        self._revalidate_query_cache()
 
     def _load_data(self):
-        # Load metadata
-        meta_path = INDICES_DIR / "metadata.json"
-        if meta_path.exists():
-            with open(meta_path, "r") as f:
-                self.documents = json.load(f)
-        else:
-            print("Warning: metadata.json not found. Run ingest.py first.")
+        # Metadata is memory-mapped by the DocumentStore
+        if not self.metadata_file.exists():
+            print(f"Warning: {self.metadata_file.name} not found. Run ingest.py first.")
         
-        # Load embeddings
-        emb_path = INDICES_DIR / "embeddings.npy"
-        if emb_path.exists():
-            self.embeddings = np.load(emb_path)
+        # Map embeddings lazily; they are only read if no snapshot can be used
+        if self.embeddings_file.exists():
+            self.embeddings = np.load(self.embeddings_file, mmap_mode="r")
         else:
             print("Warning: embeddings.npy not found. Run ingest.py first.")
 
+    def _open_shards(self, n_shards: int):
+        """
+        Sharded mode: retrieval is scattered to one local process per shard (see `ShardPool`);
+        fusion, re-ranking and caching still run here, once, on the merged candidates.
+        Falls back to the unsharded indices if ingest.py has not written matching shards.
+        """
+        manifest = load_manifest([self.metadata_file, self.embeddings_file], self.shards_dir, n_shards)
+        if manifest is None:
+            print(f"No usable {n_shards}-shard index in {self.shards_dir}. Run ingest.py with SEARCH_SHARDS={n_shards}.")
+            return
+        if self.documents.pending_changes:
+            print("Warning: live document changes are not applied to sharded indices.")
+        self.shards = ShardPool(self.shards_dir, manifest)
+        self.index = ShardedVectorIndex(self.shards)
+        self.bm25 = ShardedBM25(self.shards)
+
+    def _check_writable(self):
+        if self.shards is not None:
+            raise DocumentsReadOnly("Live document updates are not supported in sharded mode; re-run ingest.py")
+        if self.query_cache.store == "shared":
+            # Every worker has its own document log and indices; concurrent writes would diverge
+            raise DocumentsReadOnly("Live document updates are not supported with a shared query cache; "
+                                    "change documents through ingest.py and restart the workers")
+
     def _build_indices(self):
-        if self.embeddings is not None:
-            # Normalize for Cosine Similarity
-            faiss.normalize_L2(self.embeddings)
-            # FAISS Index (Inner Product)
-            self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSION)
-            self.index.add(self.embeddings)
-            print(f"FAISS index built with {self.index.ntotal} vectors (Cosine Similarity).")
-
-        if self.documents:
-            # BM25 Index
-            # Simple tokenization by splitting on space
-            tokenized_corpus = [doc["content"].lower().split(" ") for doc in self.documents]
-            self.bm25 = BM25Okapi(tokenized_corpus)
-            print("BM25 index built.")
+        index, bm25 = self._build_base_indices()
+        if index is None:
+            # Nothing ingested yet: start empty so documents can still be added live
+            index = faiss.IndexFlatIP(EMBEDDING_DIMENSION)
+            bm25 = BM25Index.from_corpus([])
+        self.index = LiveVectorIndex(index)
+        self.bm25 = LiveBM25(bm25)
+
+        # Apply document changes logged since the base files were written
+        for doc_id, doc in self.documents.removed.items():
+            self.index.remove([doc_id])
+            self.bm25.remove(doc_id, tokenize(doc["content"]))
+        for doc_id in sorted(self.documents.added):
+            self.index.add([doc_id], self.documents.embeddings[doc_id])
+            self.bm25.add(doc_id, tokenize(self.documents[doc_id]["content"]))
+
+    def _build_base_indices(self):
+        """
+        Vector and BM25 indices over the base files (ingest.py output or the last compaction).
+        """
+        base_count = self.documents.base_count
+        # Prefer the on-disk snapshot written by ingest.py: opening it does not scale with corpus size
+        if self.embeddings is not None and base_count:
+            snapshot = load_snapshot([self.metadata_file, self.embeddings_file], self.snapshot_dir)
+            if snapshot is not None:
+                index, bm25, manifest = snapshot
+                print(f"Loaded index snapshot {manifest['version']} ({index.ntotal} vectors).")
+                return index, bm25
+
+        if self.embeddings is None or not base_count:
+            return None, None
+        index, bm25 = self._index_base(self.documents.base, self.embeddings)
+        print(f"FAISS index built with {index.ntotal} vectors (Cosine Similarity).")
+        print("BM25 index built.")
+        return index, bm25
+
+    @staticmethod
+    def _index_base(base: MetadataStore, embeddings: np.ndarray) -> Tuple[faiss.Index, BM25Index]:
+        """
+        Vector and BM25 indices over a metadata store and its (memory-mapped) embeddings,
+        streamed: vectors are added in blocks and BM25 reads chunk texts one at a time.
+        Tombstoned rows keep their ids but are left out of both indices.
+        """
+        live = base.live_rows()
+        # FAISS Index (Inner Product over normalized vectors = Cosine Similarity)
+        if len(live) == len(base):
+            index = build_vector_index(embeddings)
+        elif len(live):
+            index = build_vector_index(embeddings, rows=live)
+        else:
+            index = faiss.IndexFlatIP(embeddings.shape[1])
+        bm25 = BM25Index.from_corpus(tokenize(base.content(row)) if base.is_live(row) else None
+                                     for row in range(len(base)))
+        return index, bm25
+
+    def _revalidate_query_cache(self):
+        """
+        Carries cached entries over a re-ingest: entries from another corpus version keep
+        working if every chunk they reference still exists (possibly under a new id),
+        found by content hash. Only entries with changed or removed chunks are dropped.
+        """
+        def resolve(doc_id: int, chunk_hash: str) -> Optional[int]:
+            if self.documents.chunk_hash(doc_id) == chunk_hash:
+                return doc_id
+            return self.documents.find_chunk(chunk_hash)
+
+        kept, dropped = self.query_cache.revalidate(self.documents.generation, resolve)
+        if kept or dropped:
+            print(f"Query cache moved to corpus {self.documents.generation}: "
+                  f"{kept} entries kept, {dropped} invalidated.")
+
+    # ----- Live document updates -----
+
+    def _chunk_document(self, filename: str, content: str, path: Optional[str]) -> List[Dict]:
+        loader = TextLoader()
+        cleaned = loader.clean_text(content)
+        if not cleaned:
+            return []
+        return [{"filename": filename, "path": path or filename, "content": chunk, "hash": content_hash(chunk),
+                 "chunk_id": i} for i, chunk in enumerate(loader.chunk_text(cleaned))]
+
+    def _embed_chunks(self, chunks: List[Dict]) -> np.ndarray:
+        """
+        Chunk embeddings, computed before the write lock is taken so a model call never
+        blocks other writers or a compaction swap.
+        """
+        if not chunks:
+            return np.zeros((0, self.index.d), dtype=np.float32)
+        embeddings = np.array(self.embedder.embed_documents([c["content"] for c in chunks]), dtype=np.float32)
+        return embeddings.reshape(len(chunks), -1)
+
+    def _insert_chunks(self, chunks: List[Dict], embeddings: np.ndarray) -> List[int]:
+        """
+        Makes embedded chunks searchable. Called with the write lock held.
+        """
+        ids = []
+        for chunk, embedding in zip(chunks, embeddings):
+            doc_id = self.documents.add(chunk, embedding)
+            self.index.add([doc_id], embedding)
+            self.bm25.add(doc_id, tokenize(chunk["content"]))
+            ids.append(doc_id)
+        return ids
+
+    def _remove_chunks(self, doc_ids: List[int]) -> List[int]:
+        removed = []
+        for doc_id in doc_ids:
+            doc = self.documents.delete(doc_id)
+            if doc is None:
+                continue
+            self.index.remove([doc_id])
+            self.bm25.remove(doc_id, tokenize(doc["content"]))
+            removed.append(doc_id)
+        if removed:
+            # Cached results that contain a removed chunk are stale
+            self.query_cache.invalidate(removed)
+        return removed
+
+    def add_document(self, filename: str, content: str, path: Optional[str] = None) -> List[int]:
+        """
+        Chunks, embeds and indexes a new document. Returns its chunk ids.
+        Raises DocumentExists if a document with this filename already exists.
+        """
+        self._check_writable()
+        if self.documents.ids_for(filename):
+            raise DocumentExists(f"Document {filename} already exists")
+        chunks = self._chunk_document(filename, content, path)
+        embeddings = self._embed_chunks(chunks)
+        with self._write_lock:
+            if self.documents.ids_for(filename):
+                raise DocumentExists(f"Document {filename} already exists")
+            ids = self._insert_chunks(chunks, embeddings)
+        self._maybe_compact()
+        return ids
+
+    def update_document(self, filename: str, content: str, path: Optional[str] = None) -> Dict[str, List[int]]:
+        """
+        Replaces a document's chunks (new chunks get new ids).
+        Raises DocumentNotFound if the document does not exist.
+        """
+        self._check_writable()
+        chunks = self._chunk_document(filename, content, path)
+        embeddings = self._embed_chunks(chunks)
+        with self._write_lock:
+            old_ids = self.documents.ids_for(filename)
+            if not old_ids:
+                raise DocumentNotFound(filename)
+            removed = self._remove_chunks(old_ids)
+            added = self._insert_chunks(chunks, embeddings)
+        self._maybe_compact()
+        return {"removed": removed, "added": added}
+
+    def delete_document(self, filename: str) -> List[int]:
+        """
+        Deletes a document's chunks. Raises DocumentNotFound if the document does not exist.
+        """
+        self._check_writable()
+        with self._write_lock:
+            old_ids = self.documents.ids_for(filename)
+            if not old_ids:
+                raise DocumentNotFound(filename)
+            removed = self._remove_chunks(old_ids)
+        self._maybe_compact()
+        return removed
+
+    def _maybe_compact(self):
+        if self.compact_min_changes is None or self.documents.pending_changes < self.compact_min_changes:
+            return
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self.compact, name="index-compaction", daemon=True)
+        self._compaction.start()
+
+    def compact(self):
+        """
+        Folds logged document changes into new base files (metadata, embeddings, snapshot)
+        and rebuilds the main indices without tombstones. Searches and document changes
+        keep running meanwhile; changes made during the rebuild are re-applied on top.
+        """
+        self._check_writable()
+        with self._write_lock:
+            slots, added_embeddings, marker = self.documents.begin_compaction()
+            base_embeddings = self.embeddings
+        start_time = time.perf_counter()
+
+        dim = self.index.d
+        vectors = NpyAppendWriter(self.embeddings_file)
+        metadata = MetadataStoreWriter(self.metadata_file)
+        for start in range(0, len(slots), INGEST_BATCH_SIZE):
+            block = np.zeros((min(INGEST_BATCH_SIZE, len(slots) - start), dim), dtype=np.float32)
+            for offset in range(len(block)):
+                doc_id = start + offset
+                doc = slots[doc_id]
+                # Tombstones keep a zero row so ids stay stable
+                if doc is not None:
+                    block[offset] = added_embeddings[doc_id] if doc_id in added_embeddings else base_embeddings[doc_id]
+                metadata.write(doc)
+            vectors.append(block)
+        vectors.close()
+        metadata.close()
+        write_generation(self.documents.generation, self.corpus_file)
+
+        embeddings = np.load(self.embeddings_file, mmap_mode="r")
+        index, bm25 = self._index_base(MetadataStore(self.metadata_file), embeddings)
+        if index.ntotal:
+            write_snapshot(index, bm25, [self.metadata_file, self.embeddings_file], self.snapshot_dir)
+
+        with self._write_lock:
+            tail = self.documents.finish_compaction(marker, len(slots))
+            new_index, new_bm25 = LiveVectorIndex(index), LiveBM25(bm25)
+            for op, doc_id, embedding, doc in tail:
+                if op == OP_ADD:
+                    new_index.add([doc_id], embedding)
+                    new_bm25.add(doc_id, tokenize(doc["content"]))
+                else:
+                    new_index.remove([doc_id])
+                    new_bm25.remove(doc_id, tokenize(doc["content"]))
+            self.embeddings = embeddings
+            self.index, self.bm25 = new_index, new_bm25
+            self.compactions += 1
+        print(f"Compacted {len(slots)} chunks in {time.perf_counter() - start_time:.1f}s "
+              f"({len(tail)} changes carried over).")
+
+    def live_stats(self) -> Dict:
+        if self.shards is not None:
+            return {"documents": len(self.documents), "pending_changes": self.documents.pending_changes,
+                    **self.shards.stats()}
+        return {
+            "documents": len(self.documents),
+            "pending_changes": self.documents.pending_changes,
+            "vector_delta": self.index.delta.ntotal,
+            "vector_tombstones": len(self.index.tombstones),
+            "bm25_delta": len(self.bm25.delta_len),
+            "bm25_tombstones": len(self.bm25.tombstones),
+            "compactions": self.compactions,
+        }
 
     def _calculate_overlap(self, query: str, doc_content: str) -> tuple[float, list[str]]:
         """
@@ -67,100 +397,323 @@ class SearchEngine:
         overlap = len(intersection)
         return overlap / len(q_terms), list(intersection)
 
-    def search(self, query: str, k: int = 5, alpha: float = 0.5, rerank: bool = True):
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
         """
-        Hybrid search using FAISS + BM25 with optional Re-ranking.
-        alpha: Weight for vector search (0.0 to 1.0).
-        rerank: Whether to apply Cross-Encoder re-ranking.
+        Embeds queries in one model call and normalizes them for Cosine Similarity.
         """
-        if not self.documents or not self.index:
-            return []
+        embeddings = np.array(self.embedder.embed_documents(queries), dtype=np.float32).reshape(len(queries), -1)
+        faiss.normalize_L2(embeddings)
+        return embeddings
 
-        # 1. Vector Search
-        query_embedding = self.embedder.embed_documents([query])[0]
-        # Normalize query for Cosine Similarity
-        faiss.normalize_L2(query_embedding.reshape(1, -1))
-        
-        # Check Semantic Cache
-        cached_results = self.query_cache.check(query_embedding)
-        if cached_results:
-            return cached_results[:k]
-
-        # FAISS expects 2D array
-        # Fetch more candidates for re-ranking (e.g., 20 or 2*k)
-        initial_k = 20 if rerank else k * 2
-        D, I = self.index.search(np.array([query_embedding]), initial_k) 
-        
+    def _candidates(self, vector_hits: Tuple[np.ndarray, np.ndarray],
+                    bm25_hits: Tuple[np.ndarray, np.ndarray]) -> List[Dict]:
+        """
+        Merges one query's FAISS and BM25 hits into pre-fusion candidate records
+        {"id", "hash", "vector_score", "bm25_score"}. These do not depend on alpha, k or
+        rerank, which is why they (not final results) are what the query cache stores;
+        the content hash lets the cache follow a chunk across re-ingests.
+        """
         vector_results = {}
-        for dist, idx in zip(D[0], I[0]):
+        for dist, idx in zip(*vector_hits):
             if idx != -1:
                 # For Inner Product with normalized vectors, dist is cosine similarity (-1 to 1)
-                score = float(dist) 
-                vector_results[idx] = score
+                vector_results[int(idx)] = float(dist)
 
-        # 2. BM25 Search
-        tokenized_query = query.lower().split(" ")
-        bm25_scores = self.bm25.get_scores(tokenized_query)
-        top_bm25_indices = np.argsort(bm25_scores)[::-1][:initial_k]
-        
+        top_bm25_indices, top_bm25_scores = bm25_hits
         bm25_results = {}
-        max_bm25 = np.max(bm25_scores) if len(bm25_scores) > 0 else 1.0
+        # Normalize by the best BM25 score, which is the first of the top-k
+        max_bm25 = top_bm25_scores[0] if len(top_bm25_scores) > 0 else 1.0
         if max_bm25 == 0: max_bm25 = 1.0
         
-        for idx in top_bm25_indices:
-            bm25_results[idx] = bm25_scores[idx] / max_bm25
+        for idx, score in zip(top_bm25_indices, top_bm25_scores):
+            bm25_results[int(idx)] = float(score / max_bm25)
 
-        # 3. Merge Scores
-        all_indices = set(vector_results.keys()) | set(bm25_results.keys())
-        candidates = []
-        
-        for idx in all_indices:
-            v_score = vector_results.get(idx, 0.0)
-            b_score = bm25_results.get(idx, 0.0)
-            final_score = (alpha * v_score) + ((1 - alpha) * b_score)
-            
-            overlap_score, matched_keywords = self._calculate_overlap(query, self.documents[idx]["content"])
-            
-            # Generate explanation
-            explanation = f"Matched with {overlap_score:.0%} keyword overlap ({', '.join(matched_keywords)})."
-            if v_score > 0.5:
-                explanation += f" High semantic similarity ({v_score:.2f})."
-            
-            candidates.append({
-                "id": int(idx),
-                "score": final_score,
-                "filename": self.documents[idx]["filename"],
-                "content": self.documents[idx]["content"],
-                "vector_score": v_score,
-                "bm25_score": b_score,
-                "overlap_score": overlap_score,
-                "matched_keywords": matched_keywords,
-                "explanation": explanation
-            })
-            
-        # Sort by initial hybrid score
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        
-        # 4. Re-ranking
-        if rerank and candidates:
-            # Take top 20 candidates for re-ranking
-            top_candidates = candidates[:20]
-            cross_inp = [[query, c["content"]] for c in top_candidates]
-            cross_scores = self.cross_encoder.predict(cross_inp)
-            
-            for i, score in enumerate(cross_scores):
-                top_candidates[i]["score"] = float(score) # Replace score with cross-encoder score
-                top_candidates[i]["rerank_score"] = float(score)
-            
-            # Sort by new score
-            top_candidates.sort(key=lambda x: x["score"], reverse=True)
-            final_results = top_candidates[:k]
-            self.query_cache.add(query, query_embedding, final_results)
-            return final_results
-            
-        final_results = candidates[:k]
-        self.query_cache.add(query, query_embedding, final_results)
-        return final_results
+        return [{"id": idx, "hash": self.documents.chunk_hash(idx), "vector_score": vector_results.get(idx, 0.0),
+                 "bm25_score": bm25_results.get(idx, 0.0)}
+                for idx in sorted(vector_results.keys() | bm25_results.keys())]
+
+    def _fuse(self, records: List[Dict], alpha: float) -> Tuple[List[Dict], np.ndarray]:
+        """
+        Orders candidate records by the hybrid score for `alpha`.
+        Returns (records, scores), best first; chunks deleted since retrieval are dropped.
+        """
+        records = [r for r in records if self.documents.is_live(r["id"])]
+        if not records:
+            return [], np.zeros(0)
+        v_scores = np.fromiter((r["vector_score"] for r in records), dtype=np.float64, count=len(records))
+        b_scores = np.fromiter((r["bm25_score"] for r in records), dtype=np.float64, count=len(records))
+        scores = (alpha * v_scores) + ((1 - alpha) * b_scores)
+        order = np.argsort(-scores, kind="stable")
+        return [records[j] for j in order], scores[order]
+
+    def _render(self, query: str, record: Dict, score: float, fields: Optional[List[str]] = None,
+                snippet_length: Optional[int] = None) -> Dict:
+        """
+        Hydrates a candidate record (ids and scores only) into a search result from the
+        document store. Only `fields` are filled in (all by default), so e.g. an id/score
+        response never touches chunk text; `snippet_length` caps `content` at that many words.
+        """
+        wanted = set(RESULT_FIELDS if fields is None else fields)
+        doc = self.documents[record["id"]] if wanted - {"id", "score", "vector_score", "bm25_score"} else None
+        v_score = record["vector_score"]
+        result = {"id": record["id"], "score": float(score)}
+        if "filename" in wanted:
+            result["filename"] = doc["filename"]
+        if "path" in wanted:
+            result["path"] = doc.get("path")
+        if "content" in wanted:
+            result["content"] = doc["content"]
+            if snippet_length is not None:
+                result["content"] = " ".join(doc["content"].split()[:snippet_length])
+        if "vector_score" in wanted:
+            result["vector_score"] = v_score
+        if "bm25_score" in wanted:
+            result["bm25_score"] = record["bm25_score"]
+        if wanted & {"overlap_score", "matched_keywords", "explanation"}:
+            overlap_score, matched_keywords = self._calculate_overlap(query, doc["content"])
+            if "overlap_score" in wanted:
+                result["overlap_score"] = overlap_score
+            if "matched_keywords" in wanted:
+                result["matched_keywords"] = matched_keywords
+            if "explanation" in wanted:
+                # Generate explanation
+                explanation = f"Matched with {overlap_score:.0%} keyword overlap ({', '.join(matched_keywords)})."
+                if v_score > 0.5:
+                    explanation += f" High semantic similarity ({v_score:.2f})."
+                result["explanation"] = explanation
+        return result
+
+    @staticmethod
+    def _candidate_depth(k: int) -> int:
+        # Retrieval depth; independent of alpha and rerank so cached candidates serve both
+        return max(RERANK_CANDIDATES, k * 2)
+
+    def _retrieve_batch(self, requests: List[Dict], query_embeddings: np.ndarray) -> List[List[Dict]]:
+        """
+        Hybrid FAISS + BM25 retrieval for several queries: one multi-row vector search per
+        distinct (depth, nprobe, ef_search) combination and one batched BM25 pass.
+        """
+        depths = [self._candidate_depth(r["k"]) for r in requests]
+
+        # 1. Vector Search
+        groups: Dict[tuple, List[int]] = {}
+        for i, request in enumerate(requests):
+            groups.setdefault((depths[i], request["nprobe"], request["ef_search"]), []).append(i)
+        vector_hits = [None] * len(requests)
+        with self.metrics.time("vector_search"):
+            for (depth, nprobe, ef_search), rows in groups.items():
+                D, I = self.index.search(query_embeddings[rows], depth, nprobe=nprobe, ef_search=ef_search)
+                for row, dists, ids in zip(rows, D, I):
+                    vector_hits[row] = (dists, ids)
+
+        # 2. BM25 Search (only documents containing query terms are scored)
+        with self.metrics.time("bm25"):
+            bm25_hits = self.bm25.top_k_batch([tokenize(r["query"]) for r in requests], depths)
+
+        with self.metrics.time("merge"):
+            return [self._candidates(vector_hits[i], bm25_hits[i]) for i in range(len(requests))]
+
+    def _rerank_depth(self, scores: np.ndarray, k: int) -> int:
+        """
+        Number of fused candidates (hybrid `scores`, best first) to send to the
+        Cross-Encoder. In adaptive mode, candidates are taken in steps of RERANK_BATCH_SIZE
+        until the next ones score below RERANK_ADAPTIVE_MIN_RATIO of the best hybrid score
+        (and at least k are taken). The rule only looks at hybrid scores, so the depth is
+        known before any model call. It is a heuristic: hybrid scores do not bound
+        Cross-Encoder scores, so a skipped candidate could have made the top k. Off by
+        default; then every candidate up to RERANK_CANDIDATES is re-scored.
+        """
+        depth = min(len(scores), RERANK_CANDIDATES)
+        best = scores[0] if len(scores) else 0.0
+        if not self.adaptive_rerank or depth <= k or best <= 0:
+            return depth
+        competitive = int(np.count_nonzero(scores[:depth] >= RERANK_ADAPTIVE_MIN_RATIO * best))
+        step = max(1, RERANK_BATCH_SIZE)
+        return min(depth, -(-max(k, competitive) // step) * step)
+
+    def _cross_encode(self, batches: List[Tuple[str, List[Dict]]]) -> List[List[float]]:
+        """
+        Cross-Encoder scores for every (query, candidate records) item. Scores cached for the same
+        (normalized query, chunk id) are reused; the remaining pairs, deduplicated across
+        the batch, go through a single predict call.
+        """
+        scores = [self.rerank_cache.get_many(query, [c["id"] for c in top]) for query, top in batches]
+        missing: Dict[Tuple[str, int], List[str]] = {}
+        for (query, top), item_scores in zip(batches, scores):
+            for c, score in zip(top, item_scores):
+                if score is None:
+                    missing.setdefault((normalize_query(query), c["id"]), [query, self.documents[c["id"]]["content"]])
+        if missing:
+            predicted = dict(zip(missing.keys(), (float(s) for s in self.cross_encoder.predict(list(missing.values())))))
+            for (query, top), item_scores in zip(batches, scores):
+                key = normalize_query(query)
+                for j, c in enumerate(top):
+                    if item_scores[j] is None:
+                        item_scores[j] = predicted[(key, c["id"])]
+                self.rerank_cache.put_many(query, [c["id"] for c in top], item_scores)
+        with self._rerank_lock:
+            self.rerank_pairs["scored"] += len(missing)
+            self.rerank_pairs["cached"] += sum(len(top) for _, top in batches) - len(missing)
+        return scores
+
+    def rerank_stats(self) -> Dict:
+        with self._rerank_lock:
+            pairs = dict(self.rerank_pairs)
+        return {"adaptive": self.adaptive_rerank, "pairs": pairs, "score_cache": self.rerank_cache.stats()}
+
+    def _apply_rerank(self, request: Dict, records: List[Dict], cross_scores: List[float]) -> List[Dict]:
+        """
+        Orders re-ranked candidates by Cross-Encoder score and hydrates only the top k.
+        """
+        order = sorted(range(len(records)), key=lambda j: -cross_scores[j])[:request["k"]]
+        results = []
+        for j in order:
+            # Score replaced with the cross-encoder score
+            result = self._render(request["query"], records[j], cross_scores[j],
+                                  request["fields"], request["snippet_length"])
+            result["rerank_score"] = float(cross_scores[j])
+            results.append(result)
+        return results
+
+    def search(self, query: str, k: int = 5, alpha: float = 0.5, rerank: bool = True,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               fields: Optional[List[str]] = None, snippet_length: Optional[int] = None):
+        """
+        Hybrid search using FAISS + BM25 with optional Re-ranking.
+        alpha: Weight for vector search (0.0 to 1.0).
+        rerank: Whether to apply Cross-Encoder re-ranking.
+        nprobe / ef_search: Per-request recall/latency knobs for IVF / HNSW indices.
+        fields / snippet_length: Result fields to return (see RESULT_FIELDS) and max words of content.
+        """
+        return self.search_many([dict(query=query, k=k, alpha=alpha, rerank=rerank, nprobe=nprobe,
+                                      ef_search=ef_search, fields=fields, snippet_length=snippet_length)])[0]
+
+    def search_many(self, requests: List[Dict]) -> List[List[Dict]]:
+        """
+        Runs several independent searches with one embedding call for all queries and one
+        Cross-Encoder call for all (query, candidate) pairs, so model overhead is paid once
+        per batch. Each request is a dict of `search` keyword arguments; results are
+        returned in request order.
+        """
+        return self._run_batch(requests)[0]
+
+    def search_batch(self, queries: List[str], k: int = 5, alpha: float = 0.5, rerank: bool = True,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                     fields: Optional[List[str]] = None, snippet_length: Optional[int] = None,
+                     deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Searches many queries with the same parameters.
+        Returns one {"query", "results", "cache_hit"} dict per query, in order.
+        `deadline` (a `time.monotonic()` timestamp) is checked between query chunks: once it
+        has passed, the remaining chunks are abandoned with DeadlineExceeded.
+        """
+        requests = [dict(query=q, k=k, alpha=alpha, rerank=rerank, nprobe=nprobe, ef_search=ef_search,
+                         fields=fields, snippet_length=snippet_length) for q in queries]
+        results, cache_hits = [], []
+        # Large jobs are processed in chunks to bound model batch sizes and memory
+        for start in range(0, len(requests), SEARCH_BATCH_CHUNK_SIZE):
+            if deadline is not None and time.monotonic() > deadline:
+                raise DeadlineExceeded(f"Batch deadline passed after {start} of {len(requests)} queries")
+            chunk_results, chunk_hits = self._run_batch(requests[start:start + SEARCH_BATCH_CHUNK_SIZE])
+            results.extend(chunk_results)
+            cache_hits.extend(chunk_hits)
+        return [{"query": q, "results": res, "cache_hit": hit} for q, res, hit in zip(queries, results, cache_hits)]
+
+    def _run_batch(self, requests: List[Dict]) -> Tuple[List[List[Dict]], List[bool]]:
+        if not self.documents or not self.index:
+            return [[] for _ in requests], [False] * len(requests)
+        if not requests:
+            return [], []
+        with self.metrics.time_search():
+            return self._run_stages(requests)
+
+    def _run_stages(self, requests: List[Dict]) -> Tuple[List[List[Dict]], List[bool]]:
+        start_time = time.perf_counter()
+        requests = [dict(SEARCH_DEFAULTS, **r) for r in requests]
+        # Cached entries hold candidate records, re-fused below for each request's alpha/k/rerank;
+        # an entry retrieved at a smaller depth than a request needs is not a hit
+        accept = [lambda entry, depth=self._candidate_depth(r["k"]): entry.get("meta", {}).get("depth", 0) >= depth
+                  for r in requests]
+        entries: List[Optional[Dict]] = [None] * len(requests)
+        cache_hits = [False] * len(requests)
+
+        # Exact-match tier: repeated query text is answered without running the embedder
+        with self.metrics.time("cache_exact"):
+            for i, request in enumerate(requests):
+                entries[i] = self.query_cache.lookup_text(request["query"], accept=accept[i])
+                cache_hits[i] = entries[i] is not None
+        pending = [i for i, hit in enumerate(cache_hits) if not hit]
+
+        query_embeddings = np.zeros((len(requests), self.index.d), dtype=np.float32)
+        misses = []
+        if pending:
+            with self.metrics.time("embed"):
+                query_embeddings[pending] = self._embed_queries([requests[i]["query"] for i in pending])
+
+            # Check Semantic Cache for the remaining queries at once
+            with self.metrics.time("cache_semantic"):
+                found = self.query_cache.lookup_batch(query_embeddings[pending], accept=[accept[i] for i in pending])
+            for i, entry in zip(pending, found):
+                entries[i] = entry
+                cache_hits[i] = entry is not None
+            misses = [i for i in pending if not cache_hits[i]]
+
+        if misses:
+            retrieved = self._retrieve_batch([requests[i] for i in misses], query_embeddings[misses])
+            for i, records in zip(misses, retrieved):
+                entries[i] = {"query": requests[i]["query"], "results": records,
+                              "meta": {"depth": self._candidate_depth(requests[i]["k"]),
+                                       "corpus": self.documents.generation}}
+
+        results: List[Optional[List[Dict]]] = [None] * len(requests)
+        reranked: Dict[int, Tuple[List[Dict], List[Optional[float]]]] = {}
+        reused = 0
+        with self.metrics.time("fusion"):
+            for i, request in enumerate(requests):
+                records, scores = self._fuse(entries[i]["results"], request["alpha"])
+                # 4. Re-ranking (deferred so all pairs of the batch go through one predict call)
+                if request["rerank"] and records:
+                    depth = self._rerank_depth(scores, request["k"])
+                    rerank_scores = [r.get("rerank_score") for r in records[:depth]]
+                    reused += sum(score is not None for score in rerank_scores)
+                    # Hydrated after re-ranking, and only for the k results returned
+                    reranked[i] = (records[:depth], rerank_scores)
+                    with self._rerank_lock:
+                        self.rerank_pairs["pruned"] += min(len(records), RERANK_CANDIDATES) - depth
+                else:
+                    results[i] = [self._render(request["query"], r, score, request["fields"], request["snippet_length"])
+                                  for r, score in zip(records[:request["k"]], scores)]
+
+        if reranked:
+            with self.metrics.time("rerank"):
+                # Only pairs without a score stored in the entry are scored, for the entry's query
+                missing = {i: [r for r, score in zip(top, rerank_scores) if score is None]
+                           for i, (top, rerank_scores) in reranked.items()}
+                missing = {i: top for i, top in missing.items() if top}
+                if missing:
+                    fresh = self._cross_encode([(entries[i]["query"], top) for i, top in missing.items()])
+                    for i, scores in zip(missing, fresh):
+                        fresh_scores = iter(scores)
+                        rerank_scores = reranked[i][1]
+                        for j, score in enumerate(rerank_scores):
+                            if score is None:
+                                rerank_scores[j] = next(fresh_scores)
+                with self._rerank_lock:
+                    self.rerank_pairs["cached"] += reused
+                for i, (top, rerank_scores) in reranked.items():
+                    results[i] = self._apply_rerank(requests[i], top, rerank_scores)
+
+        # Each missed query is charged its share of the batch, not the whole batch's time
+        cost = (time.perf_counter() - start_time) / max(1, len(misses))
+        with self.metrics.time("cache_write"):
+            for i in misses:
+                records = entries[i]["results"]
+                if i in reranked:
+                    scored = {r["id"]: score for r, score in zip(reranked[i][0], reranked[i][1])}
+                    records = [dict(r, rerank_score=scored[r["id"]]) if r["id"] in scored else r for r in records]
+                self.query_cache.add(requests[i]["query"], query_embeddings[i], records, cost=cost,
+                                     meta=entries[i]["meta"])
+        return results, cache_hits
 
 if __name__ == "__main__":
     engine = SearchEngine()
@@ -0,0 +1,251 @@
+import atexit
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from src.config import SHARDS_DIR, SNAPSHOT_MMAP
+from src.core.bm25 import BM25Index, tokenize
+from src.core.index_snapshot import file_stamp, stamp_matches
+from src.core.metadata_store import MetadataStore
+from src.core.vector_index import build_vector_index, configure_index, search
+
+SHARD_FORMAT_VERSION = 1
+_MANIFEST = "manifest.json"
+
+
+def shard_of(doc_id: int, n_shards: int) -> int:
+    # Round-robin by chunk id: shards stay balanced and a document's chunks are spread out
+    return doc_id % n_shards
+
+
+def write_shards(metadata_file: Path, embeddings_file: Path, corpus_bm25: BM25Index, n_shards: int,
+                 shards_dir: Path = SHARDS_DIR) -> Path:
+    """
+    Partitions the ingested chunks into `n_shards` shards, each with its own vector index
+    (returning global chunk ids) and BM25 index. Every shard's BM25 scores use
+    `corpus_bm25`'s statistics, so merged shard results rank like the unsharded index.
+    The new shard set replaces the old one in a single rename.
+    """
+    shards_dir = Path(shards_dir)
+    tmp_dir = shards_dir.with_name(shards_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    # One shard at a time: its vectors are read from the memory-mapped matrix in blocks and
+    # its BM25 postings are built from a stream of chunk texts, so no shard is held in RAM
+    embeddings = np.load(embeddings_file, mmap_mode="r")
+    metadata = MetadataStore(metadata_file)
+    live = metadata.live_rows()
+    vector_count = 0
+    for shard in range(n_shards):
+        shard_dir = tmp_dir / f"shard-{shard:03d}"
+        shard_dir.mkdir()
+        shard_ids = live[shard_of(live, n_shards) == shard].astype(np.int64)
+        if len(shard_ids):
+            index = build_vector_index(embeddings, rows=shard_ids)
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(embeddings.shape[1]))
+        faiss.write_index(index, str(shard_dir / "index.faiss"))
+        bm25 = BM25Index.from_corpus(tokenize(metadata.content(int(doc_id))) for doc_id in shard_ids)
+        bm25.with_global_stats(corpus_bm25).save(shard_dir / "bm25")
+        np.save(shard_dir / "ids.npy", shard_ids)
+        vector_count += len(shard_ids)
+        print(f"Shard {shard}: {len(shard_ids)} chunks.")
+
+    manifest = {
+        "format_version": SHARD_FORMAT_VERSION,
+        "shards": n_shards,
+        "dimension": int(embeddings.shape[1]),
+        "vector_count": vector_count,
+        "corpus_size": corpus_bm25.corpus_size,
+        "sources": {Path(p).name: file_stamp(p) for p in (metadata_file, embeddings_file)},
+    }
+    with open(tmp_dir / _MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(shards_dir, ignore_errors=True)
+    os.replace(tmp_dir, shards_dir)
+    print(f"{n_shards} shards written to {shards_dir}")
+    return shards_dir
+
+
+def load_manifest(sources: List[Path], shards_dir: Path = SHARDS_DIR, n_shards: Optional[int] = None) -> Optional[Dict]:
+    """
+    The shard set's manifest if it exists, matches `n_shards` and was built from exactly these source files.
+    """
+    path = Path(shards_dir) / _MANIFEST
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SHARD_FORMAT_VERSION:
+        return None
+    if n_shards is not None and manifest["shards"] != n_shards:
+        print(f"Shards in {shards_dir} were written for {manifest['shards']} shards, not {n_shards}.")
+        return None
+    for source in sources:
+        source = Path(source)
+        if not stamp_matches(source, manifest["sources"].get(source.name)):
+            print(f"Shards in {shards_dir} are stale: {source.name} changed since they were written.")
+            return None
+    return manifest
+
+
+def _serve(shard_dir: str, conn, mmap: bool):
+    """
+    Shard process: answers vector and BM25 retrieval requests for one shard until told to stop.
+    """
+    shard_dir = Path(shard_dir)
+    flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if mmap else 0
+    index = configure_index(faiss.read_index(str(shard_dir / "index.faiss"), flags))
+    bm25 = BM25Index.load(shard_dir / "bm25", mmap=mmap)
+    ids = np.load(shard_dir / "ids.npy")
+    conn.send(("ready", None))
+    while True:
+        kind, args = conn.recv()
+        try:
+            if kind == "vector":
+                queries, k, nprobe, ef_search = args
+                reply = search(index, queries, k, nprobe=nprobe, ef_search=ef_search) if index.ntotal else None
+            elif kind == "bm25":
+                queries, ks = args
+                # Shard-local BM25 positions -> global chunk ids
+                reply = [(ids[docs], scores) for docs, scores in bm25.top_k_batch(queries, ks)]
+            elif kind == "stop":
+                conn.send(("ok", None))
+                return
+            else:
+                raise ValueError(f"Unknown shard request: {kind}")
+            conn.send(("ok", reply))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _merge_top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best `k` of the concatenated shard hits; ties go to the lower chunk id, as in an unsharded index.
+    """
+    order = np.lexsort((ids, -scores))[:k]
+    return ids[order], scores[order]
+
+
+class ShardPool:
+    """
+    One local process per shard, each holding that shard's vector and BM25 indices.
+    A call scatters the whole query batch to every shard and gathers their top-k lists;
+    shards work in parallel, and the search batcher already coalesces concurrent queries,
+    so one scatter-gather runs at a time.
+    """
+    def __init__(self, shards_dir: Path, manifest: Dict, mmap: bool = SNAPSHOT_MMAP):
+        self.shards_dir = Path(shards_dir)
+        self.manifest = manifest
+        self._lock = threading.Lock()
+        self._conns = []
+        self._processes = []
+        # Spawned, not forked: the parent may already run model and FAISS threads
+        context = multiprocessing.get_context("spawn")
+        for shard in range(manifest["shards"]):
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, name=f"search-shard-{shard}", daemon=True,
+                                      args=(str(self.shards_dir / f"shard-{shard:03d}"), child, mmap))
+            process.start()
+            self._conns.append(parent)
+            self._processes.append(process)
+        for conn in self._conns:
+            conn.recv()
+        atexit.register(self.close)
+        print(f"Started {len(self._processes)} shard processes.")
+
+    def __len__(self) -> int:
+        return len(self._conns)
+
+    def scatter(self, kind: str, args) -> List:
+        with self._lock:
+            for conn in self._conns:
+                conn.send((kind, args))
+            replies = [conn.recv() for conn in self._conns]
+        for status, reply in replies:
+            if status != "ok":
+                raise RuntimeError(f"Shard request failed: {reply}")
+        return [reply for _, reply in replies]
+
+    def close(self):
+        if not self._conns:
+            return
+        try:
+            self.scatter("stop", None)
+        except (OSError, EOFError):
+            pass
+        for process in self._processes:
+            process.join(timeout=5)
+        self._conns, self._processes = [], []
+
+    def stats(self) -> Dict:
+        return {"shards": len(self), "alive": sum(p.is_alive() for p in self._processes),
+                "vector_count": self.manifest["vector_count"]}
+
+
+class ShardedVectorIndex:
+    """
+    `LiveVectorIndex` stand-in that searches every shard and merges their top-k lists.
+    Read-only: sharded indices are rebuilt by ingest.py.
+    """
+    has_changes = False
+
+    def __init__(self, pool: ShardPool):
+        self.pool = pool
+
+    @property
+    def d(self) -> int:
+        return self.pool.manifest["dimension"]
+
+    @property
+    def ntotal(self) -> int:
+        return self.pool.manifest["vector_count"]
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        hits = [h for h in self.pool.scatter("vector", (queries, k, nprobe, ef_search)) if h is not None]
+        D = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        I = np.full((len(queries), k), -1, dtype=np.int64)
+        if not hits:
+            return D, I
+        all_D = np.concatenate([h[0] for h in hits], axis=1)
+        all_I = np.concatenate([h[1] for h in hits], axis=1)
+        for row in range(len(queries)):
+            found = all_I[row] != -1
+            ids, scores = _merge_top_k(all_I[row][found], all_D[row][found], k)
+            D[row, :len(ids)], I[row, :len(ids)] = scores, ids
+        return D, I
+
+
+class ShardedBM25:
+    """
+    `LiveBM25` stand-in: per-shard BM25 top-k lists (scored with corpus-wide statistics) merged by score.
+    """
+    has_changes = False
+
+    def __init__(self, pool: ShardPool):
+        self.pool = pool
+
+    @property
+    def corpus_size(self) -> int:
+        return self.pool.manifest["corpus_size"]
+
+    def top_k(self, query: List[str], k: int, term_cache: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.top_k_batch([query], k)[0]
+
+    def top_k_batch(self, queries: List[List[str]], k) -> List[Tuple[np.ndarray, np.ndarray]]:
+        ks = [k] * len(queries) if isinstance(k, int) else list(k)
+        per_shard = self.pool.scatter("bm25", (queries, ks))
+        merged = []
+        for i, query_k in enumerate(ks):
+            ids = np.concatenate([np.asarray(hits[i][0], dtype=np.int64) for hits in per_shard])
+            scores = np.concatenate([np.asarray(hits[i][1], dtype=np.float64) for hits in per_shard])
+            merged.append(_merge_top_k(ids, scores, query_k))
+        return merged
@@ -0,0 +1,226 @@
+import threading
+import faiss
+import numpy as np
+from typing import Iterable, Optional, Set, Tuple
+from src.config import (
+    VECTOR_INDEX_TYPE,
+    IVF_NLIST,
+    IVF_NPROBE,
+    IVF_PQ_M,
+    IVF_PQ_NBITS,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    VECTOR_INDEX_TRAIN_SAMPLE,
+    VECTOR_INDEX_ADD_BATCH,
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS recommends at least ~39 training points per centroid
+_MIN_POINTS_PER_CENTROID = 39
+
+
+def _training_sample(n_vectors: int, size: int, seed: int = 0) -> np.ndarray:
+    """
+    Sorted positions of the (at most `size`) vectors an index is trained on.
+    """
+    if n_vectors <= size:
+        return np.arange(n_vectors)
+    return np.sort(np.random.default_rng(seed).choice(n_vectors, size, replace=False))
+
+
+def create_index(index_type: str, dim: int, n_vectors: int,
+                 nlist: int = IVF_NLIST, pq_m: int = IVF_PQ_M, pq_nbits: int = IVF_PQ_NBITS,
+                 hnsw_m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> faiss.Index:
+    """
+    Creates an empty inner-product index of the requested type.
+    IVF list counts are clamped to what `n_vectors` can train.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {index_type}")
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    nlist = max(1, min(nlist, n_vectors // _MIN_POINTS_PER_CENTROID))
+    quantizer = faiss.IndexFlatIP(dim)
+    if index_type == "ivf_pq":
+        if dim % pq_m != 0:
+            raise ValueError(f"IVF_PQ_M={pq_m} must divide the embedding dimension {dim}")
+        if n_vectors < _MIN_POINTS_PER_CENTROID * 2 ** pq_nbits:
+            print(f"Only {n_vectors} vectors: too few to train {pq_nbits}-bit PQ codes. Using ivf_flat.")
+        else:
+            return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, faiss.METRIC_INNER_PRODUCT)
+    return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+
+
+def configure_index(index: faiss.Index, nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH) -> faiss.Index:
+    """
+    Applies the default query-time knobs to a built or loaded index.
+    """
+    ivf = _as_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = _as_hnsw(index)
+    if hnsw is not None:
+        hnsw.hnsw.efSearch = ef_search
+    return index
+
+
+def _normalized(embeddings: np.ndarray) -> np.ndarray:
+    embeddings = np.array(embeddings, dtype=np.float32, order="C")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def build_vector_index(embeddings: np.ndarray, index_type: str = VECTOR_INDEX_TYPE,
+                       train_sample: int = VECTOR_INDEX_TRAIN_SAMPLE, ids: Optional[np.ndarray] = None,
+                       rows: Optional[np.ndarray] = None, batch_size: int = VECTOR_INDEX_ADD_BATCH,
+                       **params) -> faiss.Index:
+    """
+    Builds the cosine-similarity index (inner product over L2-normalized vectors),
+    training it first (on a sample) when the index type needs it.
+    Vectors are normalized and added `batch_size` rows at a time, so a memory-mapped
+    `embeddings` is read in blocks instead of being copied into RAM.
+    Without `ids`, results are row positions; with `ids` the index is ID-mapped and
+    returns those ids instead. `rows` indexes only those rows of `embeddings` (e.g. the
+    live ones), ID-mapped to their row numbers, without copying them out first.
+    """
+    if rows is not None:
+        rows = ids = np.asarray(rows, dtype=np.int64)
+    n_vectors = len(embeddings) if rows is None else len(rows)
+
+    def read(positions) -> np.ndarray:
+        return _normalized(embeddings[positions] if rows is None else embeddings[rows[positions]])
+
+    index = create_index(index_type, embeddings.shape[1], n_vectors, **params)
+    if not index.is_trained:
+        index.train(read(_training_sample(n_vectors, train_sample)))
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        ids = np.asarray(ids, dtype=np.int64)
+    for start in range(0, n_vectors, batch_size):
+        block = read(slice(start, start + batch_size))
+        if ids is None:
+            index.add(block)
+        else:
+            index.add_with_ids(block, ids[start:start + batch_size])
+    return configure_index(index)
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def _as_ivf(index: faiss.Index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def _as_hnsw(index: faiss.Index):
+    index = _unwrap(index)
+    return index if isinstance(index, faiss.IndexHNSW) else None
+
+
+def index_type_of(index: faiss.Index) -> str:
+    index = _unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int,
+           nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+           exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs a k-NN search, overriding nprobe / efSearch for this call only.
+    Per-call parameters leave the shared index untouched, so concurrent requests can
+    use different operating points. Ids in `exclude` are filtered out during the search.
+    """
+    selector = None
+    if exclude is not None and len(exclude):
+        selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.asarray(exclude, dtype=np.int64)))
+    params = None
+    if nprobe is not None and _as_ivf(index) is not None:
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    elif ef_search is not None and _as_hnsw(index) is not None:
+        params = faiss.SearchParametersHNSW(efSearch=ef_search)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    D, I = index.search(np.ascontiguousarray(queries, dtype=np.float32), k, params=params)
+    return D, I
+
+
+class LiveVectorIndex:
+    """
+    A read-only main index (any type, possibly memory-mapped) plus a small ID-mapped
+    flat delta index for vectors added since the main index was built.
+    Deleting a main-index vector records a tombstone that is filtered out at search time;
+    compaction later rebuilds the main index without it.
+    """
+    def __init__(self, main: faiss.Index):
+        self.main = main
+        self.delta = faiss.IndexIDMap2(faiss.IndexFlatIP(main.d))
+        self.tombstones: Set[int] = set()
+        self._delta_ids: Set[int] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def d(self) -> int:
+        return self.main.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.main.ntotal - len(self.tombstones) + self.delta.ntotal
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.tombstones or self._delta_ids)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray):
+        vectors = np.array(vectors, dtype=np.float32, order="C", ndmin=2)
+        faiss.normalize_L2(vectors)
+        ids = np.asarray(list(ids), dtype=np.int64)
+        with self._lock:
+            self.delta.add_with_ids(vectors, ids)
+            self._delta_ids.update(int(i) for i in ids)
+
+    def remove(self, ids: Iterable[int]):
+        with self._lock:
+            for doc_id in ids:
+                doc_id = int(doc_id)
+                if doc_id in self._delta_ids:
+                    self._delta_ids.discard(doc_id)
+                    self.delta.remove_ids(np.array([doc_id], dtype=np.int64))
+                else:
+                    self.tombstones.add(doc_id)
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            exclude = np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))
+            delta = self.delta.search(np.ascontiguousarray(queries, dtype=np.float32), k) if self.delta.ntotal else None
+        D, I = search(self.main, queries, k, nprobe=nprobe, ef_search=ef_search, exclude=exclude)
+        if delta is None:
+            return D, I
+        # Merge both result lists per query; missing results (-1) sort last
+        D = np.concatenate([D, delta[0]], axis=1)
+        I = np.concatenate([I, delta[1]], axis=1)
+        D = np.where(I == -1, -np.inf, D)
+        order = np.argsort(-D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
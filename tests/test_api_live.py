@@ -5,13 +5,13 @@ import requests
 from fastapi.testclient import TestClient
 from src.api.main import app
 
-client = TestClient(app)
-
 def test_search_api():
-    response = client.post(
-        "/api/v1/search",
-        json={"query": "artificial intelligence", "k": 1}
-    )
+    # The context manager runs the app lifespan, which loads the engine
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/v1/search",
+            json={"query": "artificial intelligence", "k": 1}
+        )
     assert response.status_code == 200
     data = response.json()
     assert "results" in data
@@ -0,0 +1,42 @@
+import threading
+import pytest
+from src.core.batcher import SearchBatcher
+
+
+class FakeEngine:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+
+    def search_many(self, requests):
+        self.release.wait(5)
+        self.batches.append([r["query"] for r in requests])
+        if any(r["query"] == "boom" for r in requests):
+            raise ValueError("boom")
+        return [[{"query": r["query"], "k": r.get("k")}] for r in requests]
+
+
+def test_batcher_coalesces_concurrent_requests():
+    engine = FakeEngine()
+    batcher = SearchBatcher(engine, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(f"q{i}", k=i) for i in range(6)]
+    engine.release.set()
+
+    assert [f.result(5) for f in futures] == [[{"query": f"q{i}", "k": i}] for i in range(6)]
+    assert [len(b) for b in engine.batches] == [4, 2]
+    stats = batcher.stats()
+    assert stats["requests"] == 6
+    assert stats["batch_size_histogram"] == {"2": 1, "4": 1}
+    batcher.close()
+
+
+def test_batcher_propagates_errors_and_rejects_after_close():
+    engine = FakeEngine()
+    engine.release.set()
+    batcher = SearchBatcher(engine, max_batch_size=8, max_wait_ms=50)
+    failing = batcher.submit("boom")
+    with pytest.raises(ValueError):
+        failing.result(5)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("late").result(1)
@@ -0,0 +1,117 @@
+import json
+import numpy as np
+from rank_bm25 import BM25Okapi
+from src.config import METADATA_FILE
+from src.core.bm25 import BM25Index, LiveBM25, tokenize
+
+QUERIES = ["artificial intelligence", "the", "space shuttle launch", "unknownterm", "god is the Answer", ""]
+
+
+def load_corpus():
+    with open(METADATA_FILE, "r") as f:
+        return [tokenize(doc["content"]) for doc in json.load(f)]
+
+
+def test_scores_match_rank_bm25(tmp_path):
+    corpus = load_corpus()
+    reference = BM25Okapi(corpus)
+    index = BM25Index.from_corpus(corpus)
+    index.save(tmp_path / "bm25")
+    mapped = BM25Index.load(tmp_path / "bm25", mmap=True)
+
+    for query in QUERIES:
+        expected = reference.get_scores(tokenize(query))
+        assert np.allclose(index.get_scores(tokenize(query)), expected)
+        assert np.allclose(mapped.get_scores(tokenize(query)), expected)
+
+
+def test_top_k_matches_full_ranking():
+    corpus = load_corpus()
+    reference = BM25Okapi(corpus)
+    index = BM25Index.from_corpus(corpus)
+
+    for query in QUERIES + ["the of and to a in is that space god"]:
+        expected = reference.get_scores(tokenize(query))
+        for k in (1, 5, 20):
+            docs, scores = index.top_k(tokenize(query), k)
+            assert np.allclose(scores, expected[docs])
+            positive = np.sort(expected[expected > 0])[::-1][:k]
+            assert np.allclose(scores[scores > 0], positive)
+
+
+def test_top_k_prunes_unseen_documents():
+    # "rare" appears once, "common" in 41 of 100 documents: after scoring "rare" the
+    # winner is known and "common" is only scored for the surviving candidate.
+    corpus = [["rare", "common"]] + [["common", "x"]] * 40 + [["other", "y"]] * 59
+    index = BM25Index.from_corpus(corpus)
+    full_scans = []
+    term_scores = index._term_scores
+    index._term_scores = lambda term_id, *stats: full_scans.append(term_id) or term_scores(term_id, *stats)
+
+    docs, scores = index.top_k(["rare", "common"], 1)
+    assert docs.tolist() == [0]
+    assert np.isclose(scores[0], BM25Okapi(corpus).get_scores(["rare", "common"])[0])
+    assert full_scans == [index.vocab.lookup("rare")]
+
+
+def test_top_k_batch_matches_top_k():
+    index = BM25Index.from_corpus(load_corpus())
+    queries = [tokenize(q) for q in QUERIES]
+    ks = [3, 5, 1, 4, 20, 2]
+    for (docs, scores), query, k in zip(index.top_k_batch(queries, ks), queries, ks):
+        expected_docs, expected_scores = index.top_k(query, k)
+        assert docs.tolist() == expected_docs.tolist()
+        assert np.allclose(scores, expected_scores)
+
+
+def test_live_bm25_matches_rebuilt_index():
+    corpus = load_corpus()
+    live = LiveBM25(BM25Index.from_corpus(corpus))
+    added = [tokenize("space shuttle launch window opens"), tokenize("the shuttle crew returned")]
+    for doc_id in (3, 10, 11):
+        live.remove(doc_id, corpus[doc_id])
+    for offset, tokens in enumerate(added):
+        live.add(len(corpus) + offset, tokens)
+    live.remove(len(corpus) + 1, added[1])
+
+    # Same state built from scratch; deleted ids stay as absent documents
+    rebuilt_corpus = [None if i in (3, 10, 11) else tokens for i, tokens in enumerate(corpus)] + [added[0], None]
+    rebuilt = BM25Index.from_corpus(rebuilt_corpus)
+    for query in ["space shuttle launch", "artificial intelligence", "window opens"]:
+        docs, scores = live.top_k(tokenize(query), 5)
+        expected_docs, expected_scores = rebuilt.top_k(tokenize(query), 5)
+        assert np.allclose(scores, expected_scores)
+        assert set(docs.tolist()) == set(expected_docs.tolist())
+        assert not {3, 10, 11, len(corpus) + 1} & set(docs.tolist())
+
+
+def test_live_bm25_keeps_pruning_with_pending_changes():
+    corpus = [["rare", "common"]] * 2 + [["common", "x"]] * 40 + [["other", "y"]] * 58
+    live = LiveBM25(BM25Index.from_corpus(corpus))
+    live.remove(50, corpus[50])
+    live.add(100, ["common", "new", "rare"])
+    full_scans = []
+    term_scores = live.main._term_scores
+    live.main._term_scores = lambda term_id, *stats: full_scans.append(term_id) or term_scores(term_id, *stats)
+
+    rebuilt = BM25Index.from_corpus([None if i == 50 else t for i, t in enumerate(corpus)] + [["common", "new", "rare"]])
+    for k in (1, 3):
+        docs, scores = live.top_k(["rare", "common"], k)
+        expected_docs, expected_scores = rebuilt.top_k(["rare", "common"], k)
+        assert np.allclose(scores, expected_scores)
+        assert set(docs.tolist()) == set(expected_docs.tolist())
+        if k == 1:
+            # "common" was only scored for the surviving candidates, never as a full posting list
+            assert full_scans == [live.main.vocab.lookup("rare")]
+
+
+def test_batched_build_matches_single_batch():
+    corpus = load_corpus()[:200]
+    corpus[5] = None # Absent ids keep their place
+    whole = BM25Index.from_corpus(corpus, batch_size=len(corpus))
+    for batch_size in (1, 7, 64):
+        batched = BM25Index.from_corpus(iter(corpus), batch_size=batch_size)
+        for name in ("indptr", "doc_ids", "tfs", "doc_len", "idf", "max_impact"):
+            assert np.array_equal(getattr(batched, name), getattr(whole, name)), name
+        assert np.array_equal(batched.vocab.arena, whole.vocab.arena) and np.array_equal(batched.vocab.offsets, whole.vocab.offsets)
+        assert batched.avgdl == whole.avgdl and batched.n_docs == whole.n_docs
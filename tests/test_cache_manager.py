@@ -0,0 +1,84 @@
+import hashlib
+import json
+import numpy as np
+from src.config import EMBEDDING_MODEL_NAME
+from src.core.cache_manager import CacheManager
+from src.core.inference import model_fingerprint
+
+TORCH_MODEL = model_fingerprint(EMBEDDING_MODEL_NAME, "torch")
+ONNX_MODEL = model_fingerprint(EMBEDDING_MODEL_NAME, "onnx_int8", "avx2")
+
+
+def test_binary_cache_roundtrip_and_updates(tmp_path):
+    manager = CacheManager(cache_dir=tmp_path)
+    for i in range(1500):
+        manager.update_entry(f"doc_{i}", f"text {i}", np.full(8, i, dtype=np.float32))
+    manager.save_cache()
+
+    reloaded = CacheManager(cache_dir=tmp_path)
+    assert len(reloaded.store) == 1500
+    assert np.array_equal(reloaded.get_embedding("doc_42", "text 42"), np.full(8, 42))
+    assert reloaded.get_embedding("doc_42", "changed text") is None
+    assert reloaded.get_embedding("missing", "text 42") is None
+
+    reloaded.update_entry("doc_42", "changed text", np.ones(8))
+    reloaded.update_entry("doc_42", "changed again", np.full(8, 2.0))
+    assert np.array_equal(reloaded.get_embedding("doc_42", "changed again"), np.full(8, 2.0))
+
+    # Unsaved changes never touch rows referenced by the saved index
+    assert np.array_equal(CacheManager(cache_dir=tmp_path).get_embedding("doc_42", "text 42"), np.full(8, 42))
+
+    reloaded.save_cache()
+    final = CacheManager(cache_dir=tmp_path)
+    assert len(final.store) == 1500
+    assert np.array_equal(final.get_embedding("doc_42", "changed again"), np.full(8, 2.0))
+    assert final.store.rows == 1501
+
+
+def test_json_cache_is_migrated_once(tmp_path):
+    legacy = CacheManager(cache_dir=tmp_path, backend="json")
+    legacy.update_entry("a_chunk_0", "hello", np.array([1.0, 2.0, 3.0]))
+    legacy.save_cache()
+
+    migrated = CacheManager(cache_dir=tmp_path)
+    assert np.allclose(migrated.get_embedding("a_chunk_0", "hello"), [1.0, 2.0, 3.0])
+
+    with open(tmp_path / "embeddings_cache.json", "w") as f:
+        json.dump({}, f)
+    assert CacheManager(cache_dir=tmp_path).get_embedding("a_chunk_0", "hello") is not None
+
+
+def test_binary_cache_finds_digests_ending_in_nul(tmp_path):
+    manager = CacheManager(cache_dir=tmp_path)
+    names = [f"doc_{i}" for i in range(5000)]
+    for i, name in enumerate(names):
+        manager.update_entry(name, f"text {i}", np.full(4, i, dtype=np.float32))
+    manager.save_cache()
+
+    reloaded = CacheManager(cache_dir=tmp_path)
+    # About 1 in 128 of these keys or content hashes ends with a zero byte
+    assert all(reloaded.get_embedding(name, f"text {i}") is not None for i, name in enumerate(names))
+
+
+def test_cached_embeddings_are_tied_to_the_model_and_backend(tmp_path):
+    torch_cache = CacheManager(cache_dir=tmp_path, model=TORCH_MODEL)
+    torch_cache.update_entry("a_chunk_0", "hello", np.ones(4))
+    torch_cache.save_cache()
+
+    onnx_cache = CacheManager(cache_dir=tmp_path, model=ONNX_MODEL)
+    assert onnx_cache.get_embedding("a_chunk_0", "hello") is None
+    onnx_cache.update_entry("a_chunk_0", "hello", np.full(4, 2.0))
+    onnx_cache.save_cache()
+    # Both models' entries are kept side by side
+    assert np.array_equal(CacheManager(cache_dir=tmp_path, model=TORCH_MODEL)
+                          .get_embedding("a_chunk_0", "hello"), np.ones(4))
+
+
+def test_legacy_json_entries_are_attributed_to_the_torch_model(tmp_path):
+    with open(tmp_path / "embeddings_cache.json", "w") as f:
+        json.dump({"a_chunk_0": {"hash": hashlib.md5(b"hello").hexdigest(), "embedding": [1.0, 2.0]}}, f)
+
+    assert np.allclose(CacheManager(cache_dir=tmp_path, model=TORCH_MODEL)
+                       .get_embedding("a_chunk_0", "hello"), [1.0, 2.0])
+    assert CacheManager(cache_dir=tmp_path, model=ONNX_MODEL,
+                        backend="json").get_embedding("a_chunk_0", "hello") is None
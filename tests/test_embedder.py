@@ -0,0 +1,43 @@
+import numpy as np
+from src.core.embedder import Embedder
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False):
+        self.calls.append((list(texts), show_progress_bar))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_memo_only_encodes_missing_texts():
+    model = FakeModel()
+    embedder = Embedder(model=model, memo=True, memo_max_entries=2)
+
+    first = embedder.embed_documents(["a", "bb", "a"])
+    assert model.calls == [(["a", "bb"], False)]
+    assert first.dtype == np.float32
+    assert first[:, 0].tolist() == [1, 2, 1]
+
+    second = embedder.embed_documents(["bb", "ccc"])
+    assert model.calls[-1] == (["ccc"], False)
+    assert second[:, 0].tolist() == [2, 3]
+    second[0, 0] = 99 # Results are copies, the memo is unaffected
+    assert embedder.embed_documents(["bb"])[0, 0] == 2
+
+    # Capacity 2: "a" was least recently used and has been evicted
+    embedder.embed_documents(["a"])
+    assert model.calls[-1] == (["a"], False)
+    stats = embedder.memo_stats()
+    assert stats["entries"] == 2
+    assert (stats["hits"], stats["misses"]) == (2, 5)
+
+
+def test_memo_is_opt_in():
+    model = FakeModel()
+    embedder = Embedder(model=model)
+    embedder.embed_documents(["a"])
+    embedder.embed_documents(["a"])
+    assert len(model.calls) == 2
+    assert embedder.memo_stats() == {"enabled": False}
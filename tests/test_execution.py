@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.api.execution import ExecutionLayer, Overloaded
+from src.api.routes import Services, _batch_timeout_ms, router
+from src.api.schemas import BatchSearchRequest
+from src.config import API_BATCH_TIMEOUT_MS_PER_QUERY
+from src.core.batcher import DeadlineExceeded, SearchBatcher
+from src.core.query_cache import SemanticQueryCache
+from tests.test_search_engine import make_engine
+
+
+def test_full_queue_is_shed_and_slots_are_released():
+    release = threading.Event()
+
+    async def scenario():
+        executor = ExecutionLayer(workers=1, queue_size=1, timeout_ms=None)
+        running = asyncio.ensure_future(executor.run(release.wait, 5))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded):
+            await executor.run(lambda: "rejected")
+        release.set()
+        assert await running is True
+        assert await queued == "queued"
+        assert await executor.run(lambda: "admitted again") == "admitted again"
+        stats = executor.stats()
+        executor.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert (stats["in_flight"], stats["rejected"], stats["completed"]) == (0, 1, 3)
+
+
+def test_expired_requests_are_dropped_before_running():
+    release = threading.Event()
+    ran = []
+
+    async def scenario():
+        executor = ExecutionLayer(workers=1, queue_size=4, timeout_ms=50)
+        blocker = asyncio.ensure_future(executor.run(release.wait, 5, deadline=False))
+        await asyncio.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            await executor.run(ran.append, "late")
+        release.set()
+        await blocker
+        executor.close()
+
+    asyncio.run(scenario())
+    assert ran == []
+
+
+def test_batcher_fails_expired_requests_without_running_them():
+    class Engine:
+        def search_many(self, requests):
+            return [[r["query"]] for r in requests]
+
+    batcher = SearchBatcher(Engine(), max_batch_size=4, max_wait_ms=20)
+    expired = batcher.submit("old", deadline=time.monotonic() - 1)
+    fresh = batcher.submit("new", deadline=time.monotonic() + 5)
+    assert fresh.result(5) == ["new"]
+    with pytest.raises(DeadlineExceeded):
+        expired.result(5)
+    assert batcher.stats()["expired"] == 1
+    batcher.close()
+
+
+def test_batch_deadline_scales_with_the_query_count():
+    executor = ExecutionLayer(workers=1, queue_size=1, timeout_ms=1000)
+    small = BatchSearchRequest(queries=["a"])
+    large = BatchSearchRequest(queries=["a"] * 5000)
+    assert _batch_timeout_ms(small, executor) == 1000 + API_BATCH_TIMEOUT_MS_PER_QUERY
+    assert _batch_timeout_ms(large, executor) == 1000 + 5000 * API_BATCH_TIMEOUT_MS_PER_QUERY
+    assert _batch_timeout_ms(BatchSearchRequest(queries=["a"] * 5000, timeout_ms=250), executor) == 250
+    executor.close()
+    unbounded = ExecutionLayer(workers=1, queue_size=1, timeout_ms=None)
+    assert _batch_timeout_ms(large, unbounded) is None
+    unbounded.close()
+
+
+def test_routes_use_lifespan_services(tmp_path):
+    engine = make_engine(tmp_path)
+    app = FastAPI()
+    app.include_router(router)
+    app.state.services = Services(engine, SearchBatcher(engine), ExecutionLayer(workers=2, queue_size=2))
+    client = TestClient(app)
+
+    response = client.post("/search", json={"query": "machine learning models", "k": 3})
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 3
+    assert set(response.json()["results"][0]) == {"id", "score", "filename", "content", "vector_score",
+                                                 "bm25_score", "overlap_score"}
+    slim = client.post("/search", json={"query": "machine learning models", "k": 3, "fields": ["filename"]})
+    assert [set(r) for r in slim.json()["results"]] == [{"id", "score", "filename"}] * 3
+    stats = client.get("/stats").json()
+    assert stats["executor"]["completed"] == 2
+    app.state.services.close()
+
+
+def test_routes_reject_out_of_range_parameters_and_map_document_errors(tmp_path):
+    engine = make_engine(tmp_path)
+    app = FastAPI()
+    app.include_router(router)
+    app.state.services = Services(engine, SearchBatcher(engine), ExecutionLayer(workers=2, queue_size=2))
+    client = TestClient(app, raise_server_exceptions=False)
+
+    for params in ({"k": 0}, {"k": -3}, {"timeout_ms": 0}, {"snippet_length": -2}, {"nprobe": 0}):
+        assert client.post("/search", json={"query": "data storage", **params}).status_code == 422
+        assert client.post("/search/batch", json={"queries": ["data storage"], **params}).status_code == 422
+
+    document = {"filename": "new.txt", "content": "a brand new document about rockets"}
+    assert client.post("/documents", json=document).status_code == 201
+    assert client.post("/documents", json=document).status_code == 409
+    assert client.delete("/documents/missing.txt").status_code == 404
+
+    # Other errors are not mistaken for "already exists"
+    def fail(texts):
+        raise ValueError("embedding failed")
+
+    engine.embedder.embed_documents = fail
+    assert client.post("/documents", json={"filename": "other.txt", "content": "more text"}).status_code == 500
+    app.state.services.close()
+
+
+def test_document_writes_are_rejected_with_a_shared_query_cache(tmp_path):
+    cache = SemanticQueryCache(cache_path=tmp_path / "query_cache.sqlite", store="shared", dim=384)
+    engine = make_engine(tmp_path, query_cache=cache)
+    app = FastAPI()
+    app.include_router(router)
+    app.state.services = Services(engine, SearchBatcher(engine), ExecutionLayer(workers=2, queue_size=2))
+    client = TestClient(app)
+    count = len(engine.documents)
+    victim = engine.documents[0]["filename"]
+
+    # Each worker would apply the change to its own corpus, so none of them may
+    assert client.post("/documents", json={"filename": "new.txt", "content": "rockets"}).status_code == 409
+    assert client.put(f"/documents/{victim}", json={"content": "rockets"}).status_code == 409
+    assert client.delete(f"/documents/{victim}").status_code == 409
+    assert client.post("/documents/compact").status_code == 409
+    assert len(engine.documents) == count and engine.documents.pending_changes == 0
+    assert client.post("/search", json={"query": "data storage", "k": 3}).status_code == 200
+    app.state.services.close()
+    cache.close()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import numpy as np
+from src.core.bm25 import BM25Index, tokenize
+from src.core import index_snapshot
+from src.core.index_snapshot import current_snapshot, load_snapshot, stamp_matches, write_snapshot
+from src.core.vector_index import build_vector_index
+
+
+def write_sources(tmp_path, embeddings, docs):
+    emb_path = tmp_path / "embeddings.npy"
+    meta_path = tmp_path / "metadata.json"
+    np.save(emb_path, embeddings)
+    meta_path.write_text(repr(docs))
+    return [meta_path, emb_path]
+
+
+def test_snapshot_roundtrip_and_staleness(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((50, 8)).astype(np.float32)
+    docs = [f"document number {i} about topic {i % 5}" for i in range(50)]
+    sources = write_sources(tmp_path, embeddings, docs)
+    snapshot_dir = tmp_path / "snapshots"
+
+    index = build_vector_index(embeddings)
+    bm25 = BM25Index.from_corpus(tokenize(d) for d in docs)
+    for _ in range(3):
+        write_snapshot(index, bm25, sources, snapshot_dir=snapshot_dir, keep=2)
+    assert len(list(snapshot_dir.glob("v*"))) == 2
+
+    loaded_index, loaded_bm25, manifest = load_snapshot(sources, snapshot_dir=snapshot_dir)
+    assert manifest["vector_count"] == 50
+    query = embeddings[:1] / np.linalg.norm(embeddings[:1])
+    assert np.array_equal(loaded_index.search(query, 5)[1], index.search(query, 5)[1])
+    assert np.allclose(loaded_bm25.get_scores(tokenize("topic 3")), bm25.get_scores(tokenize("topic 3")))
+
+    # Re-ingesting changes the source files, so the old snapshot must not be used
+    write_sources(tmp_path, embeddings[:40], docs[:40])
+    assert load_snapshot(sources, snapshot_dir=snapshot_dir) is None
+    assert current_snapshot(snapshot_dir) is not None
+
+
+def test_snapshot_is_stale_after_same_size_rewrite_in_the_middle(tmp_path):
+    rng = np.random.default_rng(1)
+    # Large enough that a head/tail sample would skip the middle rows
+    embeddings = rng.standard_normal((20_000, 64)).astype(np.float32)
+    docs = [f"document {i}" for i in range(10)]
+    sources = write_sources(tmp_path, embeddings, docs)
+    snapshot_dir = tmp_path / "snapshots"
+    write_snapshot(build_vector_index(embeddings), BM25Index.from_corpus(tokenize(d) for d in docs),
+                   sources, snapshot_dir=snapshot_dir)
+    assert load_snapshot(sources, snapshot_dir=snapshot_dir) is not None
+
+    size = sources[1].stat().st_size
+    embeddings[10_000] += 1.0
+    np.save(sources[1], embeddings)
+    assert sources[1].stat().st_size == size
+    assert load_snapshot(sources, snapshot_dir=snapshot_dir) is None
+
+
+def test_unchanged_sources_are_not_rehashed_at_load(tmp_path, monkeypatch):
+    embeddings = np.random.default_rng(2).standard_normal((100, 8)).astype(np.float32)
+    docs = [f"document {i}" for i in range(100)]
+    sources = write_sources(tmp_path, embeddings, docs)
+    snapshot_dir = tmp_path / "snapshots"
+    write_snapshot(build_vector_index(embeddings), BM25Index.from_corpus(tokenize(d) for d in docs),
+                   sources, snapshot_dir=snapshot_dir)
+    stamp = index_snapshot.file_stamp(sources[1])
+
+    hashed = []
+    checksum = index_snapshot.file_checksum
+    monkeypatch.setattr(index_snapshot, "file_checksum", lambda path: hashed.append(path) or checksum(path))
+    assert load_snapshot(sources, snapshot_dir=snapshot_dir) is not None
+    assert hashed == []
+
+    # A copy (new mtime, same bytes) is rehashed once and still matches; verify always rehashes
+    copy = tmp_path / "copy.npy"
+    shutil.copy(sources[1], copy)
+    os.utime(copy, ns=(stamp["mtime_ns"] + 10**9, stamp["mtime_ns"] + 10**9))
+    assert stamp_matches(copy, stamp) and hashed == [copy]
+    assert stamp_matches(sources[1], stamp, verify=True) and hashed == [copy, sources[1]]
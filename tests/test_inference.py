@@ -0,0 +1,42 @@
+import importlib.util
+import pytest
+from src.core.inference import load_cross_encoder, load_embedding_model, model_fingerprint, quantized_model_dir
+
+ONNX_MIN_COSINE = 0.98 # Minimum cosine between int8 ONNX and PyTorch embeddings of the same text
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        load_embedding_model("all-MiniLM-L6-v2", backend="tensorrt")
+
+
+def test_model_fingerprint_names_the_backend():
+    assert model_fingerprint("all-MiniLM-L6-v2", "torch") != model_fingerprint("all-MiniLM-L6-v2", "onnx_int8", "avx2")
+    assert model_fingerprint("all-MiniLM-L6-v2", "onnx_int8", "avx2") != \
+        model_fingerprint("all-MiniLM-L6-v2", "onnx_int8", "avx512_vnni")
+    assert model_fingerprint("all-MiniLM-L6-v2", "torch") != model_fingerprint("all-mpnet-base-v2", "torch")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("onnxruntime") is not None, reason="ONNX Runtime is installed")
+def test_onnx_backend_explains_missing_dependency(tmp_path):
+    with pytest.raises(ImportError, match="sentence-transformers\\[onnx\\]"):
+        load_cross_encoder("cross-encoder/ms-marco-MiniLM-L-6-v2", backend="onnx_int8", models_dir=tmp_path)
+    assert quantized_model_dir("cross-encoder/ms-marco-MiniLM-L-6-v2", tmp_path).name == \
+        "cross-encoder__ms-marco-MiniLM-L-6-v2"
+
+
+def test_onnx_int8_embeddings_match_torch(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("optimum")
+    from src.config import EMBEDDING_MODEL_NAME
+    try:
+        torch_model = load_embedding_model(EMBEDDING_MODEL_NAME, backend="torch")
+        onnx_model = load_embedding_model(EMBEDDING_MODEL_NAME, backend="onnx_int8", quantization="avx2",
+                                          models_dir=tmp_path)
+    except OSError as e:
+        pytest.skip(f"Model not available: {e}")
+    texts = ["machine learning models", "the space shuttle launch was delayed", "how to store data on disk"]
+    expected = torch_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    actual = onnx_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    # int8 dynamic quantization perturbs the vectors, but must keep their direction
+    assert (expected * actual).sum(axis=1).min() >= ONNX_MIN_COSINE
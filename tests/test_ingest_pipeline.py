@@ -0,0 +1,43 @@
+import numpy as np
+from src.core.cache_manager import CacheManager
+from src.core.document_store import content_hash
+from src.core.ingest_pipeline import run_pipeline
+from src.core.metadata_store import MetadataStore
+from src.core.preprocessing import TextLoader
+
+
+class CountingEmbedder:
+    calls = []
+
+    def embed_documents(self, texts):
+        CountingEmbedder.calls.append(len(texts))
+        return np.array([[len(t), t.count(" "), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_pipeline_streams_batches_and_reuses_cache(tmp_path):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    for i in range(5):
+        (raw / f"doc_{i}.txt").write_text(" ".join(f"w{i}_{j}" for j in range(300 * (i % 2) + 10)))
+    chunks = TextLoader(raw).load_files()
+    out = tmp_path / "indices"
+    out.mkdir()
+    cache = CacheManager(cache_dir=tmp_path)
+
+    CountingEmbedder.calls = []
+    counts = run_pipeline(TextLoader(raw).iter_chunks(), cache, CountingEmbedder,
+                          out / "embeddings.npy", out / "metadata.bin", batch_size=2)
+    assert counts == {"chunks": len(chunks), "cached": 0, "embedded": len(chunks)}
+    assert max(CountingEmbedder.calls) <= 2
+
+    embeddings = np.load(out / "embeddings.npy", mmap_mode="r")
+    assert embeddings.shape == (len(chunks), 3)
+    assert embeddings[:, 0].tolist() == [len(c["content"]) for c in chunks]
+    assert list(MetadataStore(out / "metadata.bin")) == [dict(c, hash=content_hash(c["content"])) for c in chunks]
+
+    # Second run: everything comes from the embedding cache, the embedder is never built
+    CountingEmbedder.calls = []
+    counts = run_pipeline(TextLoader(raw).iter_chunks(), CacheManager(cache_dir=tmp_path), CountingEmbedder,
+                          out / "embeddings.npy", out / "metadata.bin", batch_size=2)
+    assert counts["cached"] == len(chunks) and CountingEmbedder.calls == []
+    assert np.array_equal(np.load(out / "embeddings.npy"), embeddings)
@@ -0,0 +1,83 @@
+import json
+import numpy as np
+from src.core import index_snapshot
+from src.core.document_store import DocumentStore, content_hash, read_generation
+from src.core.metadata_store import MetadataStore, MetadataStoreWriter, read_source
+
+RECORDS = [
+    {"filename": "b.txt", "path": "/raw/b.txt", "content": "zweite Datei", "chunk_id": 0, "original_filename": "b.txt"},
+    None,
+    {"filename": "a.txt", "path": "/raw/a.txt", "content": "first chunk", "chunk_id": 0, "original_filename": "a.txt"},
+    {"filename": "a.txt", "path": "/raw/a.txt", "content": "naïve second chunk", "chunk_id": 1,
+     "original_filename": "a.txt"},
+    {"filename": "c.txt", "path": None, "content": "first chunk"},
+]
+
+
+def write_store(path, records):
+    writer = MetadataStoreWriter(path)
+    for record in records:
+        writer.write(record)
+    writer.close()
+    return MetadataStore(path)
+
+
+def test_rows_round_trip_with_dictionary_encoded_names(tmp_path):
+    store = write_store(tmp_path / "metadata.bin", RECORDS)
+
+    assert list(store) == [None if r is None else dict(r, hash=content_hash(r["content"])) for r in RECORDS]
+    assert len(store) == 5 and store.live_count() == 4
+    assert [store.name(i) for i in range(len(store.names))] == ["/raw/a.txt", "/raw/b.txt", "a.txt", "b.txt", "c.txt"]
+    assert not store.content_arena.flags.writeable # Read-only view of the mapped file
+    assert store.ids_by_filename() == {"a.txt": [2, 3], "b.txt": [0], "c.txt": [4]}
+    assert store.find(content_hash("first chunk")) == [2, 4]
+    assert store.chunk_hash(1) is None and store.find(content_hash("missing")) == []
+    assert read_source(tmp_path / "metadata.bin") is None
+
+
+def test_legacy_json_is_converted_and_reconverted_when_it_changes(tmp_path):
+    legacy = tmp_path / "metadata.json"
+    legacy.write_text(json.dumps([{"filename": "a.txt", "path": "a.txt", "content": "old text"}]))
+    generation = read_generation(tmp_path / "corpus.json", legacy)
+
+    documents = DocumentStore(tmp_path / "metadata.bin", tmp_path / "documents.log", tmp_path / "corpus.json",
+                              dim=3, legacy_path=legacy)
+    # Same generation as before the conversion, so logged changes and cached queries stay valid
+    assert documents.generation == generation
+    assert documents[0]["content"] == "old text" and documents.ids_for("a.txt") == [0]
+    doc_id = documents.add({"filename": "b.txt", "path": "b.txt", "content": "added"}, np.ones(3))
+    documents.close()
+
+    reopened = DocumentStore(tmp_path / "metadata.bin", tmp_path / "documents.log", tmp_path / "corpus.json",
+                             dim=3, legacy_path=legacy)
+    assert reopened[doc_id]["content"] == "added" and len(reopened) == 2
+    reopened.close()
+
+    legacy.write_text(json.dumps([{"filename": "a.txt", "path": "a.txt", "content": "new text"}]))
+    changed = DocumentStore(tmp_path / "metadata.bin", tmp_path / "documents.log", tmp_path / "corpus.json",
+                            dim=3, legacy_path=legacy)
+    assert changed[0]["content"] == "new text" and changed.generation != generation
+    assert changed.pending_changes == 0 # The log belonged to the old corpus
+    changed.close()
+
+    # A store written by ingest.py is never replaced by a leftover metadata.json
+    write_store(tmp_path / "metadata.bin", [{"filename": "c.txt", "path": "c.txt", "content": "ingested"}])
+    ingested = DocumentStore(tmp_path / "metadata.bin", tmp_path / "documents.log", tmp_path / "corpus.json",
+                             dim=3, legacy_path=legacy)
+    assert ingested[0]["content"] == "ingested"
+    ingested.close()
+
+
+def test_converted_store_does_not_reread_an_unchanged_legacy_json(tmp_path, monkeypatch):
+    legacy = tmp_path / "metadata.json"
+    legacy.write_text(json.dumps([{"filename": "a.txt", "path": "a.txt", "content": "some text"}]))
+    paths = (tmp_path / "metadata.bin", tmp_path / "documents.log", tmp_path / "corpus.json")
+    DocumentStore(*paths, dim=3, legacy_path=legacy).close()
+    assert read_source(paths[0])["size"] == legacy.stat().st_size
+
+    hashed = []
+    checksum = index_snapshot.file_checksum
+    monkeypatch.setattr(index_snapshot, "file_checksum", lambda path: hashed.append(path) or checksum(path))
+    reopened = DocumentStore(*paths, dim=3, legacy_path=legacy)
+    assert reopened[0]["content"] == "some text" and hashed == []
+    reopened.close()
@@ -0,0 +1,35 @@
+from src.core.metrics import Histogram, StageMetrics, render_engine_metrics, render_prometheus
+from tests.test_search_engine import make_engine
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram(buckets=[0.1, 1.0])
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+
+    text = render_prometheus({"latency_seconds": [({"stage": "embed"}, histogram.snapshot())]}, {})
+    assert 'latency_seconds_bucket{stage="embed",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="embed",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{stage="embed",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{stage="embed"} 4' in text
+
+
+def test_disabled_metrics_record_nothing():
+    metrics = StageMetrics(enabled=False)
+    with metrics.time("embed"):
+        pass
+    assert metrics.snapshot()["stages"]["embed"]["count"] == 0
+
+
+def test_engine_metrics_cover_every_stage(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.search("machine learning models", k=3)
+    engine.search("machine learning models", k=3)
+
+    stages = engine.metrics.snapshot()["stages"]
+    assert {stage for stage, h in stages.items() if h["count"]} == set(stages)
+    assert stages["embed"]["count"] == 1 # The repeat was answered by the exact tier
+    text = render_engine_metrics(engine)
+    assert 'semanticcache_query_cache_hits_total{tier="exact"} 1' in text
+    assert "semanticcache_search_seconds_count 2" in text
+    assert f"semanticcache_vector_index_size {engine.index.ntotal}" in text
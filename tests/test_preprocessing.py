@@ -0,0 +1,21 @@
+from src.core.preprocessing import TextLoader
+
+
+def write_corpus(directory, n_files=12):
+    directory.mkdir()
+    for i in range(n_files):
+        words = " ".join(f"<b>w{i}_{j}</b>\n" for j in range(40 + 120 * (i % 4)))
+        (directory / f"doc_{i:02d}.txt").write_text(words)
+    (directory / "empty.txt").write_text("  \n\t ")
+
+
+def test_parallel_chunking_matches_serial_order(tmp_path):
+    write_corpus(tmp_path / "raw")
+    loader = TextLoader(tmp_path / "raw")
+
+    serial = list(loader.iter_chunks(workers=1))
+    parallel = list(loader.iter_chunks(workers=3, shard_size=2))
+
+    assert parallel == serial
+    assert [c["filename"] for c in serial][:2] == ["doc_00.txt", "doc_01.txt"]
+    assert all("<b>" not in c["content"] and "\n" not in c["content"] for c in serial)
@@ -0,0 +1,227 @@
+import json
+import numpy as np
+import pytest
+from src.core.query_cache import SemanticQueryCache
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("legacy_path", None)
+    return SemanticQueryCache(cache_path=tmp_path / "query_cache.log", dim=4, capacity=2, **kwargs)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "faiss"])
+def test_check_returns_most_similar_entry(tmp_path, backend):
+    cache = make_cache(tmp_path, backend=backend)
+    assert cache.check(np.array([1.0, 0, 0, 0])) is None
+
+    cache.add("a", np.array([1.0, 0, 0, 0]), [{"id": 1}])
+    cache.add("b", np.array([0, 2.0, 0, 0]), [{"id": 2}])
+    cache.add("c", np.array([0, 0, 3.0, 0]), [{"id": 3}])
+
+    assert cache.check(np.array([0, 5.0, 0.1, 0])) == [{"id": 2}]
+    assert cache.check(np.array([0, 0, 0, 1.0])) is None
+
+
+def test_cache_reloads_from_disk(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("a", np.array([0, 0, 1.0, 0]), [{"id": 7}])
+    cache.close()
+
+    reloaded = make_cache(tmp_path)
+    assert len(reloaded) == 1
+    assert reloaded.check(np.array([0, 0, 1.0, 0])) == [{"id": 7}]
+
+
+def test_lru_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2, policy="lru")
+    cache.add("a", np.eye(4)[0], [{"id": 0}])
+    cache.add("b", np.eye(4)[1], [{"id": 1}])
+    assert cache.check(np.eye(4)[0]) == [{"id": 0}]
+    cache.add("c", np.eye(4)[2], [{"id": 2}])
+
+    assert cache.check(np.eye(4)[1]) is None
+    assert cache.check(np.eye(4)[0]) == [{"id": 0}]
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+def test_lfu_keeps_frequently_hit_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2, policy="lfu")
+    cache.add("a", np.eye(4)[0], [{"id": 0}])
+    cache.add("b", np.eye(4)[1], [{"id": 1}])
+    for _ in range(3):
+        cache.check(np.eye(4)[1])
+    cache.check(np.eye(4)[0])
+    cache.add("c", np.eye(4)[2], [{"id": 2}])
+
+    assert cache.check(np.eye(4)[0]) is None
+    assert cache.check(np.eye(4)[1]) == [{"id": 1}]
+
+
+def test_cost_policy_keeps_expensive_entries(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2, policy="cost")
+    cache.add("cheap", np.eye(4)[0], [{"id": 0}], cost=0.001)
+    cache.add("expensive", np.eye(4)[1], [{"id": 1}], cost=2.0)
+    cache.add("c", np.eye(4)[2], [{"id": 2}], cost=0.5)
+
+    assert cache.check(np.eye(4)[0]) is None
+    assert cache.check(np.eye(4)[1]) == [{"id": 1}]
+
+
+def test_ttl_expires_entries(tmp_path):
+    cache = make_cache(tmp_path, policy="ttl", ttl_seconds=60)
+    cache.add("a", np.eye(4)[0], [{"id": 0}])
+    next(iter(cache.entries.values()))["created_at"] -= 120
+
+    assert cache.check(np.eye(4)[0]) is None
+    assert len(cache) == 0 and cache.stats()["expirations"] == 1
+
+
+def test_byte_budget_bounds_cache(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=400)
+    for i in range(10):
+        cache.add(f"q{i}", np.eye(4)[i % 4], [{"id": i, "content": "x" * 100}])
+
+    assert cache.total_bytes <= 400
+    assert cache.stats()["evictions"] == 10 - len(cache)
+
+
+def test_evictions_are_persisted_and_log_compacts(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2, compact_min_records=3, compact_ratio=1.0)
+    for i in range(8):
+        cache.add(f"q{i}", np.eye(4)[i % 4], [{"id": i}])
+    cache.close()
+    assert cache.stats()["compactions"] >= 1
+
+    reloaded = make_cache(tmp_path, max_entries=2)
+    assert sorted(e["query"] for e in reloaded.entries.values()) == ["q6", "q7"]
+    assert reloaded.stats()["evictions"] == 0
+
+
+def test_torn_tail_is_truncated_on_load(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("a", np.eye(4)[0], [{"id": 0}])
+    cache.add("b", np.eye(4)[1], [{"id": 1}])
+    cache.close()
+    log_path = tmp_path / "query_cache.log"
+    intact_size = log_path.stat().st_size
+    with open(log_path, "ab") as f:
+        f.write(b"\x01partial-record")
+
+    reloaded = make_cache(tmp_path)
+    assert len(reloaded) == 2
+    assert log_path.stat().st_size == intact_size
+
+    reloaded.add("c", np.eye(4)[2], [{"id": 2}])
+    reloaded.close()
+    assert len(make_cache(tmp_path)) == 3
+
+
+def test_legacy_json_cache_is_migrated(tmp_path):
+    legacy_path = tmp_path / "query_cache.json"
+    with open(legacy_path, "w") as f:
+        json.dump([{"query": "old", "embedding": [0, 3.0, 0, 0], "results": [{"id": 9}]}], f)
+
+    cache = make_cache(tmp_path, legacy_path=legacy_path)
+    assert cache.check(np.eye(4)[1]) == [{"id": 9}]
+    cache.close()
+
+    assert make_cache(tmp_path).check(np.eye(4)[1]) == [{"id": 9}]
+
+
+def test_exact_tier_matches_normalized_text(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.check_text("Space Shuttle") is None
+    cache.add("Space  Shuttle", np.eye(4)[0], [{"id": 5}])
+
+    assert cache.check_text("  space shuttle ") == [{"id": 5}]
+    assert cache.check_text("space shuttles") is None
+    assert cache.check(np.eye(4)[0]) == [{"id": 5}]
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["hits"], stats["misses"]) == (1, 1, 2, 0)
+
+    cache.invalidate([5])
+    assert cache.check_text("space shuttle") is None
+    assert make_cache(tmp_path / "off", exact_tier=False).check_text("space shuttle") is None
+
+
+def test_add_replaces_the_entry_for_the_same_text(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("space shuttle", np.eye(4)[0], [{"id": 5}], meta={"depth": 5})
+    assert cache.lookup_text("Space Shuttle", accept=lambda e: e["meta"]["depth"] >= 10) is None
+    cache.add("Space Shuttle", np.eye(4)[0], [{"id": 5}, {"id": 6}], meta={"depth": 10})
+
+    assert len(cache) == 1 and cache._store.size == 1
+    assert cache.check_text("space shuttle") == [{"id": 5}, {"id": 6}]
+    cache.close()
+    reloaded = make_cache(tmp_path)
+    assert len(reloaded) == 1 and reloaded.check_text("space shuttle") == [{"id": 5}, {"id": 6}]
+
+
+def make_shared_cache(tmp_path, **kwargs):
+    return SemanticQueryCache(cache_path=tmp_path / "query_cache.sqlite", store="shared", dim=4,
+                              sync_interval_ms=0, **kwargs)
+
+
+def test_shared_store_propagates_adds_and_invalidations(tmp_path):
+    worker_a = make_shared_cache(tmp_path)
+    worker_b = make_shared_cache(tmp_path)
+
+    worker_a.add("a", np.eye(4)[0], [{"id": 1}])
+    worker_a.flush()
+    assert worker_b.check(np.eye(4)[0]) == [{"id": 1}]
+    assert worker_b.check_text("A") == [{"id": 1}]
+
+    worker_b.add("b", np.eye(4)[1], [{"id": 2}])
+    assert worker_b.invalidate([1]) == 1
+    worker_b.flush()
+    assert worker_a.check(np.eye(4)[0]) is None
+    assert worker_a.check(np.eye(4)[1]) == [{"id": 2}]
+    assert len(worker_a) == len(worker_b) == 1
+
+    worker_a.close()
+    worker_b.close()
+    restarted = make_shared_cache(tmp_path)
+    assert restarted.check(np.eye(4)[1]) == [{"id": 2}]
+    restarted.close()
+
+
+def test_shared_store_sweep_resets_workers_that_fell_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.core.query_cache.QUERY_CACHE_SHARED_TOMBSTONE_SECONDS", 0)
+    worker_a = make_shared_cache(tmp_path, compact_min_records=0, compact_ratio=0)
+    worker_b = make_shared_cache(tmp_path)
+    worker_a.add("a", np.eye(4)[0], [{"id": 1}])
+    worker_a.add("b", np.eye(4)[1], [{"id": 2}])
+    worker_a.invalidate([1]) # Leaves a dead record, so the store is swept
+    worker_a.flush()
+
+    assert worker_a.stats()["compactions"] == 1
+    assert worker_b.check(np.eye(4)[0]) is None
+    assert worker_b.check(np.eye(4)[1]) == [{"id": 2}]
+    assert len(worker_b) == 1
+    worker_a.close()
+    worker_b.close()
+
+
+def test_shared_store_evictions_stay_local_and_the_store_is_trimmed(tmp_path):
+    worker_a = make_shared_cache(tmp_path, max_entries=2, compact_min_records=0, compact_ratio=0)
+    worker_b = make_shared_cache(tmp_path, max_entries=2)
+    worker_a.add("a", np.eye(4)[0], [{"id": 1}])
+    worker_a.add("b", np.eye(4)[1], [{"id": 2}])
+    worker_a.flush()
+    assert worker_b.check_text("a") == [{"id": 1}] # "a" is hot for worker B only
+
+    # Worker A is over budget and evicts "a" by its own LRU view, which must not reach B
+    worker_a.add("c", np.eye(4)[2], [{"id": 3}])
+    worker_a.flush()
+    assert worker_a.stats()["evictions"] == 1 and worker_a.check_text("a") is None
+    assert worker_b.check_text("a") == [{"id": 1}]
+    assert worker_b.stats()["evictions"] == 1 and worker_b.check_text("b") is None # B evicted "b" instead
+
+    # The store itself keeps only the newest max_entries entries
+    worker_a.close()
+    worker_b.close()
+    restarted = make_shared_cache(tmp_path)
+    assert sorted(entry["query"] for entry in restarted.entries.values()) == ["b", "c"]
+    restarted.close()
@@ -0,0 +1,307 @@
+import json
+import shutil
+import time
+import zlib
+import numpy as np
+import pytest
+from src.config import METADATA_FILE, EMBEDDINGS_FILE
+from src.core.batcher import DeadlineExceeded
+from src.core.metadata_store import MetadataStore
+from src.core.query_cache import SemanticQueryCache
+from src.core.rerank_cache import RerankScoreCache
+from src.core.search_engine import SearchEngine
+
+
+class StubEmbedder:
+    """
+    Deterministic pseudo-embeddings so tests do not need to download models.
+    """
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return np.stack([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(self.dim)
+                         for t in texts]).astype(np.float32)
+
+
+class StubCrossEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs):
+        self.calls.append(len(pairs))
+        return np.array([len(set(q.lower().split()) & set(d.lower().split())) + len(d) / 1e5
+                         for q, d in pairs])
+
+
+def make_engine(tmp_path, index_dir=None, query_cache=None, **kwargs):
+    """
+    Engine over a private copy of the committed index files (or over `index_dir` if given).
+    """
+    index_dir = index_dir or tmp_path / "indices"
+    if not index_dir.exists():
+        index_dir.mkdir(parents=True)
+        shutil.copy(METADATA_FILE, index_dir)
+        shutil.copy(EMBEDDINGS_FILE, index_dir)
+    cache = query_cache if query_cache is not None else \
+        SemanticQueryCache(cache_path=tmp_path / "query_cache.log", legacy_path=None, dim=384)
+    return SearchEngine(embedder=StubEmbedder(), cross_encoder=StubCrossEncoder(), query_cache=cache,
+                        index_dir=index_dir, **kwargs)
+
+
+def test_search_many_matches_individual_searches(tmp_path):
+    requests = [
+        {"query": "machine learning models", "k": 3},
+        {"query": "data storage", "k": 5, "alpha": 0.2},
+        {"query": "neural networks", "k": 4, "rerank": False},
+    ]
+    single = make_engine(tmp_path / "single")
+    expected = [single.search(**r) for r in requests]
+
+    batched = make_engine(tmp_path / "batched")
+    results = batched.search_many(requests)
+
+    assert [[r["id"] for r in res] for res in results] == [[r["id"] for r in res] for res in expected]
+    assert [len(res) for res in results] == [3, 5, 4]
+    # One embedding call and one Cross-Encoder call for the whole batch
+    assert batched.embedder.calls == [3]
+    assert len(batched.cross_encoder.calls) == 1
+
+    # Repeated queries are now served from the query cache
+    again = batched.search_many(requests[:1])
+    assert [r["id"] for r in again[0]] == [r["id"] for r in results[0]]
+    assert len(batched.cross_encoder.calls) == 1
+
+
+def test_search_batch_reports_cache_hits_in_order(tmp_path):
+    engine = make_engine(tmp_path)
+    first = engine.search("vector databases", k=3)
+
+    batch = engine.search_batch(["graph algorithms", "vector databases", "graph algorithms"], k=3)
+
+    assert [item["query"] for item in batch] == ["graph algorithms", "vector databases", "graph algorithms"]
+    assert [item["cache_hit"] for item in batch] == [False, True, False]
+    assert [r["id"] for r in batch[1]["results"]] == [r["id"] for r in first]
+    assert [r["id"] for r in batch[0]["results"]] == [r["id"] for r in batch[2]["results"]]
+    # The exact repeat skips the embedder; the rest are embedded together and
+    # the uncached ones re-ranked in one call
+    assert engine.embedder.calls == [1, 2]
+    assert len(engine.cross_encoder.calls) == 2
+
+
+def test_search_batch_stops_between_chunks_once_its_deadline_passes(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.core.search_engine.SEARCH_BATCH_CHUNK_SIZE", 2)
+    engine = make_engine(tmp_path)
+    run_batch = engine._run_batch
+
+    def slow_batch(requests):
+        time.sleep(0.05)
+        return run_batch(requests)
+
+    engine._run_batch = slow_batch
+    queries = ["graph algorithms", "vector databases", "data storage", "machine learning", "rockets"]
+    with pytest.raises(DeadlineExceeded):
+        engine.search_batch(queries, k=3, deadline=time.monotonic() + 0.01)
+    # Only the first chunk ran; the abandoned ones were never embedded
+    assert engine.embedder.calls == [2]
+
+
+def test_batch_misses_are_charged_their_share_of_the_batch(tmp_path):
+    engine = make_engine(tmp_path)
+    costs = []
+    add = engine.query_cache.add
+
+    def recording_add(*args, cost=1.0, **kwargs):
+        costs.append(cost)
+        return add(*args, cost=cost, **kwargs)
+
+    engine.query_cache.add = recording_add
+
+    start = time.perf_counter()
+    engine.search_batch(["graph algorithms", "vector databases", "space shuttle launch", "data storage"], k=3)
+    elapsed = time.perf_counter() - start
+    assert len(costs) == 4 and len(set(costs)) == 1
+    assert sum(costs) <= elapsed
+
+
+def test_document_writes_embed_outside_the_write_lock(tmp_path):
+    engine = make_engine(tmp_path, compact_min_changes=None)
+    held = []
+    embed = engine.embedder.embed_documents
+
+    def checking_embed(texts):
+        held.append(engine._write_lock.locked())
+        return embed(texts)
+
+    engine.embedder.embed_documents = checking_embed
+    engine.add_document("rockets.txt", "a new document about rocket engines")
+    engine.update_document("rockets.txt", "an updated document about rocket engines")
+    assert held == [False, False]
+
+
+def test_live_document_updates_survive_restart_and_compaction(tmp_path):
+    engine = make_engine(tmp_path, compact_min_changes=None)
+    base_count = len(engine.documents)
+    ids = engine.add_document("fresh.txt", "zyxwvut quokka habitat notes")
+    assert ids == [base_count]
+    assert engine.search("zyxwvut quokka", k=1, alpha=0.0, rerank=False)[0]["filename"] == "fresh.txt"
+
+    # A cached result that contains a changed chunk is invalidated
+    cached_query = "quokka habitat"
+    assert engine.search(cached_query, k=3, alpha=0.0)[0]["id"] == ids[0]
+    change = engine.update_document("fresh.txt", "zyxwvut wombat burrow notes")
+    assert change["removed"] == ids and change["added"] == [base_count + 1]
+    assert engine.query_cache.stats()["invalidations"] == 2 # Both cached searches returned the old chunk
+    assert all(r["id"] != ids[0] for r in engine.search(cached_query, k=3, alpha=0.0))
+
+    victim = engine.documents[0]["filename"]
+    removed = engine.delete_document(victim)
+    assert all(engine.documents[i] is None for i in removed)
+    assert all(r["id"] not in removed for r in engine.search(engine.documents[base_count + 1]["content"], k=10, rerank=False))
+    engine.documents.flush()
+
+    expected = engine.search("zyxwvut wombat", k=5, alpha=0.3, rerank=False)
+    # Restart: changes are replayed from the document log
+    reopened = make_engine(tmp_path / "restart", index_dir=tmp_path / "indices", compact_min_changes=None)
+    assert len(reopened.documents) == len(engine.documents)
+    assert [r["id"] for r in reopened.search("zyxwvut wombat", k=5, alpha=0.3, rerank=False)] == \
+        [r["id"] for r in expected]
+
+    engine.compact()
+    assert engine.documents.pending_changes == 0
+    assert not engine.index.has_changes and not engine.bm25.has_changes
+    assert [r["id"] for r in engine.search("zyxwvut wombat", k=5, alpha=0.3, rerank=False)] == \
+        [r["id"] for r in expected]
+    engine.documents.flush()
+
+    compacted = make_engine(tmp_path / "compacted", index_dir=tmp_path / "indices", compact_min_changes=None)
+    assert compacted.documents.base_count == base_count + 2
+    assert compacted.documents[ids[0]] is None and compacted.documents[base_count + 1]["filename"] == "fresh.txt"
+    assert [r["id"] for r in compacted.search("zyxwvut wombat", k=5, alpha=0.3, rerank=False)] == \
+        [r["id"] for r in expected]
+
+
+def test_repeated_query_text_skips_embedding(tmp_path):
+    engine = make_engine(tmp_path)
+    first = engine.search("Machine learning models", k=3)
+    again = engine.search("  machine   LEARNING models", k=3)
+
+    assert again == first
+    assert engine.embedder.calls == [1]
+    stats = engine.query_cache.stats()
+    assert stats["exact_hits"] == 1 and stats["semantic_hits"] == 0
+
+
+def test_rerank_scores_are_reused_and_depth_adapts(tmp_path):
+    shared = RerankScoreCache()
+    full = make_engine(tmp_path / "full", rerank_cache=shared, adaptive_rerank=False)
+    expected = full.search("machine learning models", k=3)
+    assert full.cross_encoder.calls == [20]
+
+    # A cold query cache, but every (query, chunk) pair was already scored
+    warm = make_engine(tmp_path / "warm", rerank_cache=shared, adaptive_rerank=False)
+    assert [r["id"] for r in warm.search("machine learning models", k=3)] == [r["id"] for r in expected]
+    assert warm.cross_encoder.calls == []
+    assert warm.rerank_stats()["pairs"] == {"scored": 0, "cached": 20, "pruned": 0}
+
+    adaptive = make_engine(tmp_path / "adaptive", adaptive_rerank=True)
+    results = adaptive.search("machine learning models", k=3)
+    pairs = adaptive.rerank_stats()["pairs"]
+    assert pairs["scored"] == adaptive.cross_encoder.calls[0] < 20
+    assert pairs["scored"] + pairs["pruned"] == 20
+    assert [r["id"] for r in results] == [r["id"] for r in expected]
+
+
+def test_default_rerank_matches_full_rerank(tmp_path):
+    full = make_engine(tmp_path / "full", adaptive_rerank=False)
+    default = make_engine(tmp_path / "default")
+    for query in ("machine learning models", "data storage", "space shuttle launch"):
+        for k in (1, 3, 10):
+            assert default.search(query, k=k) == full.search(query, k=k)
+    assert default.rerank_stats()["pairs"]["pruned"] == 0
+
+
+def test_cached_candidates_are_refused_for_other_parameters(tmp_path):
+    engine = make_engine(tmp_path / "cached")
+    engine.search("machine learning models", k=3)
+    fresh = make_engine(tmp_path / "fresh")
+
+    for params in [{"k": 8, "alpha": 0.2, "rerank": False}, {"k": 5, "alpha": 0.9}, {"k": 10, "alpha": 0.5}]:
+        [item] = engine.search_batch(["machine learning models"], **params)
+        assert item["cache_hit"]
+        expected = fresh.search("machine learning models", **params)
+        assert [(r["id"], r["score"]) for r in item["results"]] == [(r["id"], r["score"]) for r in expected]
+    assert engine.embedder.calls == [1]
+
+    # k=15 needs deeper retrieval than the cached entry has
+    [item] = engine.search_batch(["machine learning models"], k=15, rerank=False)
+    assert not item["cache_hit"] and len(item["results"]) == 15
+
+
+def test_query_cache_survives_reingest_with_moved_chunks(tmp_path):
+    engine = make_engine(tmp_path)
+    expected = engine.search("machine learning models", k=3, rerank=False)
+    engine.query_cache.close()
+
+    # "Re-ingest": same chunks in reverse order, so every chunk id changes
+    reordered = tmp_path / "reordered"
+    reordered.mkdir()
+    with open(METADATA_FILE) as f:
+        metadata = json.load(f)
+    with open(reordered / METADATA_FILE.name, "w") as f:
+        json.dump(metadata[::-1], f)
+    np.save(reordered / EMBEDDINGS_FILE.name, np.load(EMBEDDINGS_FILE)[::-1])
+
+    moved = make_engine(tmp_path, index_dir=reordered)
+    [item] = moved.search_batch(["machine learning models"], k=3, rerank=False)
+    assert item["cache_hit"]
+    assert [r["id"] for r in item["results"]] == [len(metadata) - 1 - r["id"] for r in expected]
+    assert [r["content"] for r in item["results"]] == [r["content"] for r in expected]
+    moved.query_cache.close()
+
+    # Editing one of the cached chunks invalidates the entry, and only that entry
+    edited = tmp_path / "edited"
+    shutil.copytree(reordered, edited)
+    metadata = metadata[::-1]
+    metadata[item["results"][0]["id"]]["content"] += " edited"
+    with open(edited / METADATA_FILE.name, "w") as f:
+        json.dump(metadata, f)
+    changed = make_engine(tmp_path, index_dir=edited)
+    assert changed.query_cache.invalidations == 1
+    assert not changed.search_batch(["machine learning models"], k=3, rerank=False)[0]["cache_hit"]
+
+
+def test_results_are_hydrated_with_selected_fields_only(tmp_path):
+    engine = make_engine(tmp_path)
+    full = engine.search("machine learning models", k=4)
+    slim = engine.search("machine learning models", k=4, fields=["content"], snippet_length=3)
+
+    assert [r["id"] for r in slim] == [r["id"] for r in full]
+    assert all(set(r) == {"id", "score", "content", "rerank_score"} for r in slim)
+    for r, f in zip(slim, full):
+        assert r["content"] == " ".join(f["content"].split()[:3])
+    cached = engine.query_cache.lookup_text("machine learning models")["results"]
+    assert all("content" not in record for record in cached) # The cache holds ids and scores only
+
+
+def test_base_indices_are_built_without_hydrating_chunks(tmp_path, monkeypatch):
+    engine = make_engine(tmp_path, compact_min_changes=None)
+    engine.delete_document(engine.documents[0]["filename"])
+    expected = engine.search("machine learning models", k=5, rerank=False)
+
+    hydrated = []
+    getitem = MetadataStore.__getitem__
+    monkeypatch.setattr(MetadataStore, "__getitem__", lambda store, row: hydrated.append(row) or getitem(store, row))
+    engine.compact() # Tombstoned rows are left out of the rebuilt indices
+    rows_written = len(hydrated) # Compaction copies each chunk into the new base once
+    assert rows_written <= len(engine.documents)
+    engine.documents.flush()
+    shutil.rmtree(tmp_path / "indices" / "snapshots") # Force the fallback build on restart
+
+    hydrated.clear()
+    reopened = make_engine(tmp_path / "restart", index_dir=tmp_path / "indices", compact_min_changes=None)
+    assert hydrated == []
+    assert [r["id"] for r in reopened.search("machine learning models", k=5, rerank=False)] == \
+        [r["id"] for r in expected]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from src.core.bm25 import BM25Index, tokenize
+from src.core.metadata_store import MetadataStore
+from src.core.shards import write_shards
+from tests.test_search_engine import make_engine
+
+QUERIES = ["machine learning models", "data storage", "space shuttle launch", "god religion belief"]
+
+
+def test_shard_bm25_uses_corpus_statistics():
+    corpus = [["apple", "banana"], ["apple"], ["cherry", "banana", "banana"], ["date"]]
+    full = BM25Index.from_corpus(corpus)
+    shard = BM25Index.from_corpus(corpus[::2]).with_global_stats(full) # Documents 0 and 2
+
+    np.testing.assert_allclose(shard.get_scores(["banana", "apple"]), full.get_scores(["banana", "apple"])[::2])
+
+
+def test_sharded_engine_matches_unsharded(tmp_path):
+    single = make_engine(tmp_path / "single")
+    index_dir = tmp_path / "sharded" / "indices"
+    make_engine(tmp_path / "sharded", index_dir=index_dir).query_cache.close()
+    corpus_bm25 = BM25Index.from_corpus(tokenize(doc["content"]) for doc in MetadataStore(index_dir / "metadata.bin"))
+    write_shards(index_dir / "metadata.bin", index_dir / "embeddings.npy", corpus_bm25, 3, index_dir / "shards")
+
+    sharded = make_engine(tmp_path / "sharded", index_dir=index_dir, shards=3)
+    try:
+        assert len(sharded.shards) == 3
+        assert sharded.index.ntotal == single.index.ntotal
+        for query in QUERIES:
+            for rerank in (False, True):
+                expected = single.search(query, k=5, rerank=rerank)
+                results = sharded.search(query, k=5, rerank=rerank)
+                assert [r["id"] for r in results] == [r["id"] for r in expected]
+                assert [r["score"] for r in results] == pytest.approx([r["score"] for r in expected])
+        with pytest.raises(RuntimeError):
+            sharded.delete_document(sharded.documents[0]["filename"])
+    finally:
+        sharded.shards.close()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from src.core.vector_index import build_vector_index, index_type_of, search
+
+
+def make_data(n=2000, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("index_type,params,knob", [
+    ("ivf_flat", {"nlist": 16}, {"nprobe": 16}),
+    ("ivf_pq", {"nlist": 8, "pq_m": 8, "pq_nbits": 4}, {"nprobe": 8}),
+    ("hnsw", {"hnsw_m": 16}, {"ef_search": 128}),
+])
+def test_approximate_indices_recall_against_flat(index_type, params, knob):
+    data = make_data()
+    queries = data[:20]
+    _, truth = search(build_vector_index(data, "flat"), queries, 10)
+
+    index = build_vector_index(data, index_type, **params)
+    assert index_type_of(index) == index_type
+    _, found = search(index, queries, 10, **knob)
+    recall = np.mean([len(set(f) & set(t)) / 10 for f, t in zip(found, truth)])
+    assert recall >= (0.5 if index_type == "ivf_pq" else 0.95)
+
+
+def test_per_request_knobs_do_not_change_index_defaults():
+    index = build_vector_index(make_data(), "ivf_flat", nlist=16)
+    default_nprobe = index.nprobe
+    _, narrow = search(index, make_data()[:5], 10, nprobe=1)
+    _, wide = search(index, make_data()[:5], 10, nprobe=16)
+    assert index.nprobe == default_nprobe
+    assert (narrow >= 0).all() and (wide >= 0).all()
+
+
+@pytest.mark.parametrize("index_type,params", [("flat", {}), ("ivf_flat", {"nlist": 16})])
+def test_index_is_built_in_batches_from_a_memory_mapped_matrix(tmp_path, index_type, params):
+    data = make_data() * 3.0 # Unnormalized on disk
+    np.save(tmp_path / "embeddings.npy", data)
+    mapped = np.load(tmp_path / "embeddings.npy", mmap_mode="r")
+    queries = make_data()[:20]
+    expected = search(build_vector_index(data, index_type, batch_size=len(data), **params), queries, 10)
+
+    batched = build_vector_index(mapped, index_type, batch_size=300, **params)
+    assert batched.ntotal == len(data)
+    assert np.array_equal(search(batched, queries, 10)[1], expected[1])
+    ids = np.arange(len(data)) + 1000
+    mapped_ids = build_vector_index(mapped, index_type, batch_size=300, ids=ids, **params)
+    assert set(search(mapped_ids, queries, 10)[1].ravel()) <= set(ids)
+
+
+def test_selected_rows_are_indexed_under_their_row_numbers(tmp_path):
+    data = make_data()
+    np.save(tmp_path / "embeddings.npy", data)
+    mapped = np.load(tmp_path / "embeddings.npy", mmap_mode="r")
+    rows = np.flatnonzero(np.arange(len(data)) % 3 != 1) # E.g. the live rows
+    queries = make_data()[:20]
+
+    expected = search(build_vector_index(data[rows], "ivf_flat", ids=rows, nlist=16), queries, 10)
+    found = search(build_vector_index(mapped, "ivf_flat", rows=rows, batch_size=250, nlist=16), queries, 10)
+    assert np.array_equal(found[1], expected[1])
+    assert set(found[1].ravel()) <= set(rows)